@@ -0,0 +1,271 @@
+"""
+Bulk analysis of 3x3 positions: for every legal move of a position, its
+game-theoretic value for the player making it (1 win, 0 draw, -1 loss) and
+how many moves, this one included, the game lasts with perfect play after it.
+Cells are numbered 0 to 8, row by row, as everywhere else in the game
+(engine.WIN_CASES, the screens' boards).
+
+analyze_positions() takes any iterable of positions and yields one result at
+a time, in input order, so arbitrarily large position files are processed with
+constant memory. Every position is looked up in solved data shared by all of
+them: the memory-mapped table of tablebase.py when a file is given (its pages
+are shared by every worker process), or else one fully solved solver.Solver
+per process. With workers > 1 the positions are analysed in chunks by a pool
+of processes, with a bounded number of chunks in flight.
+
+A position is an engine.Board, a sequence of cells played from the empty
+board ('x' first), or a string of 9 cells as 'x', 'o' and '.' (or '-', '_',
+' ') read row by row, where 'x' is to move when both have as many marks.
+
+Usage: python analysis.py positions.txt --workers 4 > analysis.jsonl
+    (one position per line, as a 9-cell string or as moves like "4 0 8")
+    (a line that is not a legal position gives {"line", "position", "error"} and the file goes on)
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from engine import Board, PLAYER1, PLAYER2, SYMBOLS
+from solver import Solver, check_classic
+
+# Characters accepted for an empty cell in a position string.
+EMPTY_CELLS = ".-_ "
+
+
+@lru_cache(maxsize=None)
+def shared_solver():
+    """Returns this process's solver.Solver, solving the whole game the first time it is needed."""
+    solver = Solver()
+    solver.solve_all()
+    return solver
+
+
+@lru_cache(maxsize=None)
+def shared_tablebase(path):
+    """Returns this process's memory-mapped tablebase.Tablebase of a file, opened on first use."""
+    from tablebase import Tablebase
+    return Tablebase(path)
+
+
+def parse_position(position):
+    """
+    Returns the engine.Board of a position. A Board is returned as it is.
+    Raises ValueError if the position is not a legal 3x3 position.
+    - position: A Board, a sequence of cells or a 9-cell string (see the module docstring).
+    """
+    if isinstance(position, Board):
+        check_classic(position)
+        return position
+    board = Board()
+    if isinstance(position, str):
+        text = position.strip("\n")
+        if len(text) != 9 or any(char not in "xo" + EMPTY_CELLS for char in text.lower()):
+            raise ValueError(f"a position string has 9 cells of 'x', 'o' or '.', got {position!r}")
+        text = text.lower()
+        cells = ([cell for cell, char in enumerate(text) if char == "x"],
+                 [cell for cell, char in enumerate(text) if char == "o"])
+        if len(cells[PLAYER1]) - len(cells[PLAYER2]) not in (0, 1):
+            raise ValueError(f"'x' must have as many marks as 'o' or one more, got {position!r}")
+        # Replay the marks alternately, 'x' first, so the board finds any completed line;
+        # the checks below reject what no game can reach.
+        for index in range(len(cells[PLAYER2])):
+            board.play(cells[PLAYER1][index])
+            board.play(cells[PLAYER2][index])
+        if len(cells[PLAYER1]) > len(cells[PLAYER2]):
+            board.play(cells[PLAYER1][-1])
+        lines = board.geometry.lines
+        if sum(any(board.bits[player] & mask == mask for mask in lines) for player in (PLAYER1, PLAYER2)) > 1:
+            raise ValueError(f"both players have a line in {position!r}")
+        if board.winner is not None and board.winner != board.turn ^ 1:
+            raise ValueError(f"{SYMBOLS[board.winner]} has won but {SYMBOLS[board.turn ^ 1]} moved last in {position!r}")
+        return board
+    for cell in position:
+        if not isinstance(cell, int) or not 0 <= cell < 9 or not board.is_free(cell) or board.is_over():
+            raise ValueError(f"illegal move {cell!r} after {board.moves}")
+        board.play(cell)
+    return board
+
+
+def position_string(board):
+    """Returns a board as 9 characters, 'x', 'o' or '.', row by row."""
+    return "".join(
+        SYMBOLS[PLAYER1] if board.bits[PLAYER1] >> cell & 1
+        else SYMBOLS[PLAYER2] if board.bits[PLAYER2] >> cell & 1 else "."
+        for cell in range(board.geometry.cells)
+    )
+
+
+class Analyzer:
+    """
+    Analyses positions with solved data.
+    - tablebase_path: A complete 3x3 table written by tablebase.build_tablebase,
+      looked up first; positions missing from it (or all of them, without a
+      file) are looked up in the process's shared solver.
+    """
+
+    def __init__(self, tablebase_path=None):
+        self.tablebase = shared_tablebase(tablebase_path) if tablebase_path else None
+
+    def score(self, board):
+        """Returns the solver score of a position that is not over, for the player to move."""
+        if self.tablebase is not None:
+            entry = self.tablebase.lookup(board)
+            if entry is not None:
+                return entry[1]
+        return shared_solver().solve(board)[0]
+
+    def move_outcome(self, board, cell):
+        """
+        Returns (value, distance) of a legal move: its value for the player making it
+        and the number of moves until the game ends with perfect play, this one included.
+        The board is modified with play()/undo() and left unchanged.
+        """
+        board.play(cell)
+        try:
+            free = 9 - (board.bits[0] | board.bits[1]).bit_count()
+            if board.winner is not None:
+                return 1, 1
+            if not free:
+                return 0, 1
+            # The opponent's score, with 1 + the empty cells left at the end for a decided game.
+            score = -self.score(board)
+        finally:
+            board.undo()
+        if score == 0:
+            # A draw ends on a full board.
+            return 0, 1 + free
+        return (1 if score > 0 else -1), 1 + free - (abs(score) - 1)
+
+    def analyze_or_error(self, position):
+        """
+        Returns the analysis of one position, or {"position", "error"} if it is not a
+        legal 3x3 position, so one bad line does not stop a whole file.
+        """
+        try:
+            return self.analyze(position)
+        except ValueError as error:
+            shown = position_string(position) if isinstance(position, Board) else position
+            return {"position": shown if isinstance(shown, str) else list(shown), "error": str(error)}
+
+    def analyze(self, position):
+        """
+        Returns the analysis of one position as a JSON-friendly dict:
+        "position" (9-cell string), "to_move" ('x' or 'o', or None once the game is over),
+        "value" and "distance" of the position for the player to move, "best"
+        (the cells reaching that value soonest if winning, latest if losing) and
+        "moves", a list of {"cell", "value", "distance"} for every legal move, by cell.
+        - position: Anything parse_position accepts.
+        """
+        board = parse_position(position)
+        result = {"position": position_string(board), "to_move": SYMBOLS[board.turn]}
+        if board.is_over():
+            # The player to move has lost, or nobody can move.
+            value = -1 if board.winner is not None else 0
+            return {**result, "to_move": None, "value": value, "distance": 0, "best": [], "moves": []}
+        moves = []
+        for cell in board.legal_moves():
+            value, distance = self.move_outcome(board, cell)
+            moves.append({"cell": cell, "value": value, "distance": distance})
+        # Win as soon as possible, lose as late as possible.
+        rank = lambda move: (move["value"], -move["distance"] if move["value"] > 0 else move["distance"])
+        top = max(rank(move) for move in moves)
+        best = [move for move in moves if rank(move) == top]
+        return {**result, "value": top[0], "distance": best[0]["distance"],
+                "best": [move["cell"] for move in best], "moves": moves}
+
+
+def analyze_chunk(positions, tablebase_path=None, errors=False):
+    """Analyses a list of positions in a worker process and returns the list of results."""
+    analyzer = Analyzer(tablebase_path)
+    analyze = analyzer.analyze_or_error if errors else analyzer.analyze
+    return [analyze(position) for position in positions]
+
+
+def analyze_positions(positions, workers=1, chunk_size=256, tablebase_path=None, errors=False):
+    """
+    Yields the analysis of every position (see Analyzer.analyze), in input order.
+    The input is read lazily: at most 2 * workers chunks are held at any time.
+    - positions: An iterable of positions, e.g. the lines of a file.
+    - workers: Number of worker processes; 1 analyses in this process, None uses every CPU core.
+    - chunk_size: Positions handed to a worker at a time.
+    - tablebase_path: The complete 3x3 table to look positions up in, if any.
+    - errors: If True, an illegal position yields {"position", "error"} (see
+      Analyzer.analyze_or_error) instead of raising ValueError and ending the stream.
+    """
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        analyzer = Analyzer(tablebase_path)
+        analyze = analyzer.analyze_or_error if errors else analyzer.analyze
+        for position in positions:
+            yield analyze(position)
+        return
+    iterator = iter(positions)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        while True:
+            # Keep every worker busy with one chunk and one more queued, no more.
+            while len(pending) < 2 * workers:
+                chunk = list(itertools.islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                pending.append(executor.submit(analyze_chunk, chunk, tablebase_path, errors))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+
+
+def read_positions(lines, numbered=False):
+    """
+    Yields the positions of a text file, one per line: a 9-cell string, or moves
+    separated by spaces or commas ("4 0 8", an empty line being the empty board).
+    Lines starting with '#' are skipped.
+    - numbered: If True, yields (line number, position) pairs, from 1.
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip("\n")
+        if line.startswith("#"):
+            continue
+        fields = line.replace(",", " ").split()
+        if all(field.isdigit() for field in fields):
+            position = [int(field) for field in fields]
+        else:
+            position = line
+        yield (number, position) if numbered else position
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse every legal move of 3x3 positions with perfect play.")
+    parser.add_argument("input", nargs="?", default="-", help="file of positions, one per line ('-' for stdin)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (0 for all cores)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="positions per worker task")
+    parser.add_argument("--tablebase", default=None, help="complete 3x3 table to look positions up in")
+    args = parser.parse_args(argv)
+    source = sys.stdin if args.input == "-" else open(args.input)
+    try:
+        # The line numbers wait in 'numbers' until their results come back: tee only
+        # buffers the positions in flight, so memory stays bounded.
+        numbers, positions = itertools.tee(read_positions(source, numbered=True))
+        results = analyze_positions((position for _, position in positions), args.workers or None,
+                                    args.chunk_size, args.tablebase, errors=True)
+        failed = 0
+        for (number, _), result in zip(numbers, results):
+            if "error" in result:
+                # A bad line is reported in the output and the file goes on.
+                result = {"line": number, **result}
+                failed += 1
+            sys.stdout.write(json.dumps(result, separators=(",", ":")) + "\n")
+        if failed:
+            print(f"{failed} lines could not be analysed (see their \"error\")", file=sys.stderr)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+Micro-benchmarks of the operations the game performs, on several board sizes:
+applying moves, the end-of-game check, restarting, the computer's decision with
+each strategy, the position estimates of the levels, whole simulated games
+and batch evaluation. With --ui the same
+paths are also timed through the Kivy screens (check_winner and restart of
+FirstScreen and SecondScreen, canvas redraw included).
+
+Results are written as JSON, one entry per benchmark and board, with the
+median and best time per operation in microseconds. Passing an earlier result
+file with --compare reports every benchmark that got slower than --threshold
+times its old median and exits with status 1, so it can run in CI.
+
+Example:
+    python bench.py --output bench.json
+    python bench.py --compare bench.json          (after a change)
+    SDL_VIDEODRIVER=offscreen python bench.py --ui
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from difficulty import evaluate, make_level
+from engine import Board, SYMBOLS
+from evaluator import FORMAT_VERSION, LearnedEvaluator, feature_count
+from hints import HintTracker
+from mcts import MCTS
+from players import greedy_move, heuristic_move, make_perfect
+from simulate import play_game
+
+# Boards benchmarked by default, as (size, win_length).
+SIZES = ((3, 3), (5, 4), (7, 5), (15, 5))
+# Playouts of the MCTS player per decision: a fixed budget so timings do not depend on a clock.
+MCTS_PLAYOUTS = 500
+# Positions the per-position benchmarks cycle through.
+POSITIONS = 16
+
+
+def random_game(size, win_length, seed):
+    """Returns the moves of a random game, from a fixed seed so every run times the same game."""
+    rng = random.Random(seed)
+    board = Board(size, win_length)
+    while not board.is_over():
+        board.play(rng.choice(board.legal_moves()))
+    return list(board.moves)
+
+
+def positions(size, win_length, count=POSITIONS):
+    """
+    Returns 'count' boards of games in progress (not over), with 0 to about half
+    the cells taken, each from its own seeded random game.
+    """
+    boards = []
+    for seed in range(count):
+        moves = random_game(size, win_length, seed)
+        board = Board(size, win_length)
+        for cell in moves[:min(seed % (size * size // 2 + 1), len(moves) - 1)]:
+            board.play(cell)
+        boards.append(board)
+    return boards
+
+
+def cycle(boards, function):
+    """Returns an operation calling function(board) on the next board of a list each time."""
+    state = {"next": 0}
+
+    def op():
+        board = boards[state["next"]]
+        state["next"] = (state["next"] + 1) % len(boards)
+        function(board)
+
+    return op
+
+
+# Every benchmark is a function (size, win_length) -> (op, operations per call of op),
+# or None when it does not apply to that board.
+
+def bench_play_undo(size, win_length):
+    """One move played and taken back, over a whole game."""
+    moves = random_game(size, win_length, 0)
+    board = Board(size, win_length)
+
+    def op():
+        for cell in moves:
+            board.play(cell)
+        for _ in moves:
+            board.undo()
+
+    return op, len(moves)
+
+
+def bench_check_winner(size, win_length):
+    """The result check both screens run after every move."""
+    return cycle(positions(size, win_length), lambda board: board.winner is not None or board.is_draw()), 1
+
+
+def bench_restart(size, win_length):
+    """Clearing a board in the middle of a game for a new one."""
+    moves = random_game(size, win_length, 0)
+    board = Board(size, win_length)
+
+    def op():
+        for cell in moves[:len(moves) // 2]:
+            board.play(cell)
+        board.reset()
+
+    return op, 1
+
+
+def bench_hints(size, win_length):
+    """Keeping the move hints up to date over a whole game, as the screens do after every move."""
+    moves = random_game(size, win_length, 0)
+    board = Board(size, win_length)
+    tracker = HintTracker(board)
+
+    def op():
+        for cell in moves:
+            board.play(cell)
+            tracker.played(board, cell)
+            tracker.hints(board)
+        for _ in moves:
+            tracker.undone(board, board.undo())
+
+    return op, len(moves)
+
+
+def bench_decide(choose_factory):
+    """Returns a benchmark of the decision time of a computer player."""
+
+    def bench(size, win_length):
+        choose = choose_factory(size, win_length)
+        if choose is None:
+            return None
+        return cycle(positions(size, win_length), choose), 1
+
+    return bench
+
+
+def tablebase_player(size, win_length):
+    """Builds the memory-mapped 3x3 table in a temporary file and returns its best_move."""
+    from tablebase import Tablebase, build_tablebase
+    if (size, win_length) != (3, 3):
+        return None
+    path = os.path.join(tempfile.mkdtemp(), "bench.tb")
+    build_tablebase(path)
+    return Tablebase(path).best_move
+
+
+def mcts_player(size, win_length):
+    """A fresh, seeded MCTS for every decision, so no tree is reused between calls."""
+    return lambda board: MCTS(time_limit=None, playouts=MCTS_PLAYOUTS, rng=random.Random(0)).choose(board)
+
+
+def level_player(name):
+    """A difficulty level at its full depth with a fresh evaluation cache for every decision, like mcts_player."""
+    return lambda size, win_length: lambda board: make_level(name, time_limit=None).choose(board)
+
+
+def learned_evaluator(size, win_length):
+    """A LearnedEvaluator with seeded random weights, shaped like training.py's default (16 hidden units)."""
+    rng = random.Random(0)
+    sizes = (feature_count(win_length), 16, 1)
+    layers = [{"weights": [[rng.gauss(0, 0.5) for _ in range(fan_in)] for _ in range(fan_out)],
+               "biases": [0.0] * fan_out}
+              for fan_in, fan_out in zip(sizes, sizes[1:])]
+    return LearnedEvaluator({"version": FORMAT_VERSION, "size": size, "win_length": win_length, "layers": layers})
+
+
+def bench_evaluate(evaluator_factory):
+    """Returns a benchmark of one position estimate, as the levels make at their depth limit."""
+    return lambda size, win_length: (cycle(positions(size, win_length), evaluator_factory(size, win_length)), 1)
+
+
+def bench_game(player_factory):
+    """Returns a benchmark of whole games between two copies of a player."""
+
+    def bench(size, win_length):
+        player = player_factory(size, win_length)
+        if player is None:
+            return None
+        board = Board(size, win_length)
+        return (lambda: play_game(board, (player, player))), 1
+
+    return bench
+
+
+def seeded_random_player(size, win_length):
+    """A player picking uniformly among the free cells, from a fixed seed."""
+    rng = random.Random(0)
+    return lambda board: rng.choice(board.legal_moves())
+
+
+def bench_evaluate_batch(size, win_length):
+    """Vectorized result check of one board in a batch of 10000 (needs NumPy)."""
+    try:
+        from vectorized import encode_boards, evaluate_boards
+    except ImportError:
+        return None
+    batch = encode_boards([board for board in positions(size, win_length, 64) for _ in range(157)])
+    return (lambda: evaluate_boards(batch, size, win_length)), len(batch)
+
+
+BENCHMARKS = {
+    "play_undo": bench_play_undo,
+    "check_winner": bench_check_winner,
+    "restart": bench_restart,
+    "hints": bench_hints,
+    "evaluate_builtin": bench_evaluate(lambda size, k: evaluate),
+    "evaluate_learned": bench_evaluate(learned_evaluator),
+    "decide_perfect": bench_decide(lambda size, k: make_perfect() if (size, k) == (3, 3) else None),
+    "decide_tablebase": bench_decide(tablebase_player),
+    "decide_greedy": bench_decide(lambda size, k: greedy_move),
+    "decide_heuristic": bench_decide(lambda size, k: heuristic_move),
+    "decide_mcts": bench_decide(mcts_player),
+    "decide_hard": bench_decide(level_player("hard")),
+    "game_random": bench_game(seeded_random_player),
+    "game_greedy": bench_game(lambda size, k: greedy_move),
+    "game_perfect": bench_game(lambda size, k: make_perfect() if (size, k) == (3, 3) else None),
+    "evaluate_batch": bench_evaluate_batch,
+}
+
+
+def ui_screen(kind, size, win_length):
+    """Builds FirstScreen ('pvp') or SecondScreen ('pvc') without a record log."""
+    import tic_tac_toe
+    if kind == "pvp":
+        return tic_tac_toe.FirstScreen(print, print, board_size=size, win_length=win_length)
+    return tic_tac_toe.SecondScreen(print, print, board_size=size, win_length=win_length, mcts_time_limit=0.01)
+
+
+def bench_ui_check_winner(kind):
+    """Returns a benchmark of a screen's check_winner in the middle of a game."""
+
+    def bench(size, win_length):
+        screen = ui_screen(kind, size, win_length)
+        moves = random_game(size, win_length, 0)
+        for cell in moves[:len(moves) // 2]:
+            screen.board.play(cell)
+        symbol = SYMBOLS[screen.board.turn ^ 1]
+        return (lambda: screen.check_winner(symbol)), 1
+
+    return bench
+
+
+def bench_ui_restart(kind):
+    """Returns a benchmark of a screen's restart on a half-full board, canvas redraw included."""
+
+    def bench(size, win_length):
+        screen = ui_screen(kind, size, win_length)
+        half = random_game(size, win_length, 0)
+        half = half[:len(half) // 2]
+
+        def op():
+            for cell in half:
+                screen.board_view.set_mark(cell, SYMBOLS[screen.board.turn], (0, 0, 0, 1))
+                screen.board.play(cell)
+            screen.board_view.redraw()
+            screen.restart(None)
+            screen.board_view.redraw()
+
+        return op, 1
+
+    return bench
+
+
+UI_BENCHMARKS = {
+    "ui_check_winner_pvp": bench_ui_check_winner("pvp"),
+    "ui_check_winner_pvc": bench_ui_check_winner("pvc"),
+    "ui_restart_pvp": bench_ui_restart("pvp"),
+    "ui_restart_pvc": bench_ui_restart("pvc"),
+}
+
+
+def measure(op, ops_per_call, min_time=0.05, rounds=5):
+    """
+    Times an operation and returns (median, best) seconds per operation.
+    Each round calls op enough times to last at least min_time seconds.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    times = [elapsed]
+    for _ in range(rounds - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        times.append(time.perf_counter() - start)
+    per_op = [elapsed / (number * ops_per_call) for elapsed in times]
+    return statistics.median(per_op), min(per_op)
+
+
+def run(benchmarks, sizes, min_time=0.05, rounds=5, pattern=None):
+    """
+    Runs benchmarks on every board size and returns the list of results.
+    - benchmarks: A dict of name -> benchmark function.
+    - sizes: The (size, win_length) pairs to run them on.
+    - pattern: Only benchmarks whose name contains this text are run.
+    """
+    results = []
+    for name, bench in benchmarks.items():
+        if pattern and pattern not in name:
+            continue
+        for size, win_length in sizes:
+            prepared = bench(size, win_length)
+            if prepared is None:
+                continue
+            median, best = measure(*prepared, min_time=min_time, rounds=rounds)
+            results.append({
+                "name": name,
+                "size": size,
+                "win_length": win_length,
+                "median_us": round(median * 1e6, 3),
+                "best_us": round(best * 1e6, 3),
+            })
+            board = f"{size}x{size}/{win_length}"
+            print(f"{name:22} {board:8} {median * 1e6:12.3f} us", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns the results more than 'threshold' times slower than in a baseline
+    result file, as (result, old median) pairs.
+    """
+    old = {(entry["name"], entry["size"], entry["win_length"]): entry["median_us"] for entry in baseline["results"]}
+    slower = []
+    for entry in results:
+        before = old.get((entry["name"], entry["size"], entry["win_length"]))
+        if before and entry["median_us"] > before * threshold:
+            slower.append((entry, before))
+    return slower
+
+
+def parse_size(text):
+    """Parses a board given as SIZE/WIN_LENGTH, e.g. 7/5."""
+    size, _, win_length = text.partition("/")
+    return int(size), int(win_length or size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the game's hot paths on several board sizes.")
+    parser.add_argument("--sizes", nargs="+", type=parse_size, default=list(SIZES),
+                        help="boards as SIZE/WIN_LENGTH (default: 3/3 5/4 7/5 15/5)")
+    parser.add_argument("--filter", default=None, help="only run benchmarks whose name contains this text")
+    parser.add_argument("--ui", action="store_true", help="also time the Kivy screens (needs a window)")
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per timing round")
+    parser.add_argument("--rounds", type=int, default=5, help="timing rounds per benchmark")
+    parser.add_argument("--output", default="-", help="JSON file to write the results to ('-' for stdout)")
+    parser.add_argument("--compare", default=None, help="earlier result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown factor reported as a regression (default: 1.25)")
+    args = parser.parse_args(argv)
+    benchmarks = dict(BENCHMARKS)
+    if args.ui:
+        os.environ.setdefault("KIVY_NO_ARGS", "1")
+        benchmarks.update(UI_BENCHMARKS)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": run(benchmarks, args.sizes, args.min_time, args.rounds, args.filter),
+    }
+    if args.output == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline:
+            slower = compare(report["results"], json.load(baseline), args.threshold)
+        for entry, before in slower:
+            print(f"regression: {entry['name']} {entry['size']}x{entry['size']}/{entry['win_length']} "
+                  f"{before} -> {entry['median_us']} us", file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
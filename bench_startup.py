@@ -0,0 +1,131 @@
+"""
+Cold-start benchmark of MyKivyApp. Every run starts a fresh Python process,
+so no module is already imported, and measures separately:
+- import: seconds to import tic_tac_toe (Kivy and the screen classes),
+- first_frame: seconds from the end of the import to the first frame drawn
+  (building the app, opening the window and drawing the initial screen),
+- logic_import: seconds to import the game logic alone (engine, solver, mcts,
+  records, tablebase), which must not pull in Kivy.
+The median, minimum and maximum of every measure over the runs are written
+as one JSON object.
+
+Example:
+    python bench_startup.py --runs 10 --output startup.json
+Without a display, run it with SDL_VIDEODRIVER=offscreen or under xvfb-run.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# The Kivy-free modules of the game, in import order.
+LOGIC_MODULES = ("engine", "symmetry", "solver", "mcts", "players", "records", "tablebase", "stats", "ultimate", "hints", "history", "evaluator")
+
+
+def measure_logic():
+    """Imports the game logic and returns {"logic_import": seconds, "kivy_loaded": bool}."""
+    start = time.perf_counter()
+    for name in LOGIC_MODULES:
+        __import__(name)
+    elapsed = time.perf_counter() - start
+    return {"logic_import": elapsed, "kivy_loaded": "kivy" in sys.modules}
+
+
+def measure_app():
+    """
+    Imports tic_tac_toe, runs the app until its first frame is on screen, stops it
+    and returns {"import": seconds, "first_frame": seconds}.
+    """
+    start = time.perf_counter()
+    import tic_tac_toe
+    imported = time.perf_counter()
+    result = {}
+
+    class StartupApp(tic_tac_toe.MyKivyApp):
+        def on_start(self):
+            from kivy.core.window import Window
+            Window.bind(on_flip=self.first_frame)
+
+        def first_frame(self, window):
+            # on_flip fires once a frame has been drawn and swapped to the screen.
+            if not result:
+                result["import"] = imported - start
+                result["first_frame"] = time.perf_counter() - imported
+                self.stop()
+
+    StartupApp().run()
+    return result
+
+
+def run_child(kind):
+    """
+    Runs one measure in a new Python process and returns its result.
+    - kind: "app" or "logic".
+    """
+    env = dict(os.environ, KIVY_NO_ARGS="1", KIVY_NO_CONSOLELOG="1")
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", kind],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True,
+    )
+    lines = process.stdout.strip().splitlines()
+    if process.returncode or not lines:
+        raise RuntimeError(f"startup run failed ({kind}):\n{process.stderr.strip()}")
+    return json.loads(lines[-1])
+
+
+def summarize(values):
+    """Returns the median, minimum and maximum of a list of seconds, rounded to 0.1 ms."""
+    return {
+        "median": round(statistics.median(values), 4),
+        "min": round(min(values), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def run(runs):
+    """
+    Measures the app and the game logic 'runs' times each and returns the summary.
+    - runs: The number of cold starts of each kind.
+    """
+    app = [run_child("app") for _ in range(runs)]
+    logic = [run_child("logic") for _ in range(runs)]
+    return {
+        "runs": runs,
+        "import": summarize([result["import"] for result in app]),
+        "first_frame": summarize([result["first_frame"] for result in app]),
+        "logic_import": summarize([result["logic_import"] for result in logic]),
+        "logic_imports_kivy": any(result["kivy_loaded"] for result in logic),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the cold start of the Tic-Tac-Toe app.")
+    parser.add_argument("--runs", type=int, default=5, help="number of cold starts to measure")
+    parser.add_argument("--output", default="-", help="JSON file to write the summary to ('-' for stdout)")
+    parser.add_argument("--child", choices=("app", "logic"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        # Inside a measured process: print one JSON line for the parent.
+        result = measure_app() if args.child == "app" else measure_logic()
+        print(json.dumps(result))
+        return
+    summary = run(args.runs)
+    if args.output == "-":
+        print(json.dumps(summary, indent=2))
+    else:
+        with open(args.output, "w") as output:
+            json.dump(summary, output, indent=2)
+    print(
+        f"import {summary['import']['median']}s, first frame {summary['first_frame']['median']}s, "
+        f"logic import {summary['logic_import']['median']}s (median of {args.runs})",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
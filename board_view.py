@@ -0,0 +1,159 @@
+"""
+The game board of the Kivy screens, drawn directly on one widget's canvas.
+Every cell is two canvas rectangles (a coloured background and its mark),
+created once with the widget and reused for every game, instead of one
+TextInput widget per cell. Changes to the cells are queued and applied
+together in a single redraw on the next frame, so restarting a game or
+highlighting a winning line costs one canvas update however many cells change.
+"""
+
+from kivy.clock import Clock
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import Color, Rectangle
+from kivy.uix.widget import Widget
+from kivy.utils import get_color_from_hex
+
+# Background of a plain cell.
+CELL_BACKGROUND = (1, 1, 1, 1)
+# Pixels left between cells, where the window's background shows as grid lines.
+CELL_GAP = 2
+
+# Rendered marks, shared by every board: (symbol, font size, colour) -> texture.
+_textures = {}
+
+
+def to_rgba(color):
+    """
+    Returns a colour as an (r, g, b, a) tuple.
+    - color: A tuple, or a hex string such as kivymd's colors["Blue"]["800"].
+    """
+    if isinstance(color, str):
+        return tuple(get_color_from_hex(color))
+    return tuple(color)
+
+
+def mark_texture(symbol, font_size, color):
+    """Returns the texture of a mark, rendering it the first time it is needed."""
+    key = (symbol, font_size, color)
+    texture = _textures.get(key)
+    if texture is None:
+        label = CoreLabel(text=symbol, font_size=font_size, color=color)
+        label.refresh()
+        texture = _textures[key] = label.texture
+    return texture
+
+
+class BoardView(Widget):
+    """
+    A size x size board of square cells. Cells are numbered like the engine's
+    board (row * size + column, row 0 at the top).
+    - board_size: The number of rows (and columns).
+    - cell_size: The width of a cell in pixels.
+    - on_cell: Called with the cell index when a cell is touched.
+    """
+
+    def __init__(self, board_size, cell_size, on_cell, **kwargs):
+        super().__init__(size_hint=(None, None), size=(board_size * cell_size, board_size * cell_size), **kwargs)
+        self.board_size = board_size
+        self.cell_size = cell_size
+        self.font_size = cell_size * 5 // 8
+        self.on_cell = on_cell
+        cells = board_size * board_size
+        # What every cell should show: its mark as (symbol, colour) or None, and its background.
+        self.marks = [None] * cells
+        self.backgrounds = [CELL_BACKGROUND] * cells
+        # Cells changed since the last redraw.
+        self.dirty = set(range(cells))
+        # Runs redraw() once on the next frame, however many times it is called before.
+        self.redraw_trigger = Clock.create_trigger(self.redraw)
+        # The canvas instructions of every cell, reused for the life of the widget.
+        self.background_colors = []
+        self.background_rects = []
+        self.mark_rects = []
+        with self.canvas:
+            for _ in range(cells):
+                self.background_colors.append(Color(*CELL_BACKGROUND))
+                self.background_rects.append(Rectangle())
+            # Marks keep the colour they were rendered with.
+            Color(1, 1, 1, 1)
+            for _ in range(cells):
+                self.mark_rects.append(Rectangle(size=(0, 0)))
+        # Moving the widget moves every cell.
+        self.bind(pos=self.invalidate)
+        self.redraw_trigger()
+
+    def set_mark(self, cell, symbol, color):
+        """
+        Shows a player's mark on a cell.
+        - symbol: The text of the mark ('x' or 'o').
+        - color: The colour of the mark.
+        """
+        self.marks[cell] = (symbol, to_rgba(color))
+        self.dirty.add(cell)
+        self.redraw_trigger()
+
+    def remove_mark(self, cell):
+        """Removes the mark of a cell, e.g. when a move is taken back."""
+        self.marks[cell] = None
+        self.dirty.add(cell)
+        self.redraw_trigger()
+
+    def set_backgrounds(self, cells, color):
+        """
+        Colours the background of several cells, e.g. to highlight a winning line.
+        - cells: The cell indices.
+        - color: The background colour.
+        """
+        color = to_rgba(color)
+        for cell in cells:
+            self.backgrounds[cell] = color
+            self.dirty.add(cell)
+        self.redraw_trigger()
+
+    def clear(self):
+        """Removes every mark and highlight, for a new game."""
+        for cell in range(len(self.marks)):
+            if self.marks[cell] is not None or self.backgrounds[cell] != CELL_BACKGROUND:
+                self.marks[cell] = None
+                self.backgrounds[cell] = CELL_BACKGROUND
+                self.dirty.add(cell)
+        self.redraw_trigger()
+
+    def invalidate(self, *args):
+        """Queues a redraw of every cell."""
+        self.dirty.update(range(len(self.marks)))
+        self.redraw_trigger()
+
+    def redraw(self, dt=None):
+        """Updates the canvas instructions of the cells changed since the last redraw."""
+        size = self.board_size
+        cell_size = self.cell_size
+        for cell in self.dirty:
+            row, col = divmod(cell, size)
+            x = self.x + col * cell_size
+            y = self.top - (row + 1) * cell_size
+            self.background_colors[cell].rgba = self.backgrounds[cell]
+            rect = self.background_rects[cell]
+            rect.pos = (x + CELL_GAP / 2, y + CELL_GAP / 2)
+            rect.size = (cell_size - CELL_GAP, cell_size - CELL_GAP)
+            mark = self.marks[cell]
+            mark_rect = self.mark_rects[cell]
+            if mark is None:
+                mark_rect.size = (0, 0)
+                continue
+            texture = mark_texture(mark[0], self.font_size, mark[1])
+            # Centre the mark in its cell.
+            mark_rect.texture = texture
+            mark_rect.size = texture.size
+            mark_rect.pos = (x + (cell_size - texture.width) / 2, y + (cell_size - texture.height) / 2)
+        self.dirty.clear()
+
+    def on_touch_down(self, touch):
+        """Reports a touch on a cell to on_cell."""
+        if not self.collide_point(*touch.pos):
+            return super().on_touch_down(touch)
+        col = int((touch.x - self.x) // self.cell_size)
+        row = int((self.top - touch.y) // self.cell_size)
+        if 0 <= row < self.board_size and 0 <= col < self.board_size:
+            self.on_cell(row * self.board_size + col)
+        return True
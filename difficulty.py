@@ -0,0 +1,341 @@
+"""
+Difficulty levels of the computer player, all played by one search engine: a
+negamax alpha-beta search with iterative deepening, limited by a depth, a
+time cap per move and optional noise on the scores of the candidate moves.
+Easy looks one move ahead and often misjudges, hard looks several moves
+ahead and never does, and perfect searches to the end of the game when time allows.
+
+Position scores are stored in an EvaluationCache, a bounded LRU table that
+outlives a single move, so several players (or levels) of a session can share
+it: positions reached again in a later game, or by another level, are looked up
+instead of searched.
+
+Scores are from the point of view of the player to move. A won game scores
+1 + the fraction of the board still empty (so faster wins score higher) and a
+lost one the opposite; undecided positions are estimated between -0.5 and 0.5
+from the lines still open to each player, by evaluate() or by a trained
+evaluator.LearnedEvaluator.
+"""
+
+import random
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from engine import cells_of
+
+# Search settings of each level: depth in moves (None: to the end of the game),
+# standard deviation of the noise added to the score of each candidate move,
+# and seconds per move (None: no limit).
+LEVELS = {
+    "easy": {"depth": 1, "noise": 0.5, "time_limit": 0.2},
+    "medium": {"depth": 2, "noise": 0.1, "time_limit": 0.5},
+    "hard": {"depth": 4, "noise": 0.0, "time_limit": 1.0},
+    "perfect": {"depth": None, "noise": 0.0, "time_limit": 2.0},
+}
+# Flags telling whether a cached score is exact or only a bound, as in solver.py.
+EXACT = 0
+LOWER = 1
+UPPER = 2
+# Larger than any score.
+INFINITY = 10.0
+# The clock and the stop event are only checked every this many nodes.
+CLOCK_INTERVAL = 256
+# On boards larger than this many cells, only free cells next to a mark are
+# searched: a move far from every other mark is almost never the best one.
+FULL_WIDTH_CELLS = 16
+
+
+class EvaluationCache:
+    """
+    A least-recently-used table of searched positions, shared by any number of
+    searches on any board size. Entries are (depth, score, flag, best move).
+    - maxsize: Entries kept; the least recently used one is dropped beyond it.
+    """
+
+    def __init__(self, maxsize=200_000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Returns the entry of a position, or None, and marks it as recently used."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        """Stores the entry of a position, dropping the oldest one if the table is full."""
+        entries = self.entries
+        entries[key] = entry
+        entries.move_to_end(key)
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+
+    def clear(self):
+        """Forgets every position."""
+        self.entries.clear()
+
+
+@lru_cache(maxsize=None)
+def neighbourhoods(size):
+    """
+    Returns, for each cell of a size x size board, the bitmask of the cells
+    around it (the 8 neighbours, within the board).
+    """
+    masks = []
+    for cell in range(size * size):
+        row, col = divmod(cell, size)
+        mask = 0
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                if (d_row or d_col) and 0 <= row + d_row < size and 0 <= col + d_col < size:
+                    mask |= 1 << (row + d_row) * size + col + d_col
+        masks.append(mask)
+    return masks
+
+
+def candidate_moves(board):
+    """
+    Returns the free cells worth searching: all of them on small boards, and on
+    larger ones those next to a mark (the center on an empty board).
+    - board: The engine.Board to move on.
+    """
+    geometry = board.geometry
+    taken = board.bits[0] | board.bits[1]
+    free = ~taken & geometry.full_mask
+    if geometry.cells > FULL_WIDTH_CELLS:
+        if not taken:
+            return [geometry.cells // 2]
+        around = 0
+        masks = neighbourhoods(board.size)
+        for cell in cells_of(taken):
+            around |= masks[cell]
+        free &= around
+    return cells_of(free)
+
+
+def evaluate(board):
+    """
+    Estimates a position that is not over, for the player to move, between -0.5 and 0.5.
+    Every line held by only one player is worth 4 ** (its marks) to that player.
+    - board: The engine.Board to evaluate.
+    """
+    player = board.turn
+    mine = board.line_counts[player]
+    theirs = board.line_counts[player ^ 1]
+    total = 0
+    for line in range(len(mine)):
+        if not theirs[line]:
+            if mine[line]:
+                total += 4 ** mine[line]
+        elif not mine[line]:
+            total -= 4 ** theirs[line]
+    scale = 4 ** board.win_length
+    return total / (abs(total) + scale) / 2
+
+
+def move_priority(board, cell):
+    """
+    Returns a quick estimate of a move used to search the most promising moves first:
+    lines through the cell that it extends for the player to move or blocks for the opponent.
+    """
+    player = board.turn
+    mine = board.line_counts[player]
+    theirs = board.line_counts[player ^ 1]
+    priority = 0
+    for line in board.geometry.line_ids_through[cell]:
+        if not theirs[line]:
+            priority += 4 ** mine[line]
+        if not mine[line]:
+            priority += 4 ** theirs[line]
+    return priority
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search when its time is up or it was cancelled."""
+
+
+class DepthLimitedSearch:
+    """
+    The computer player of every difficulty level. Call choose(board) to get a move.
+    - depth: Moves to look ahead, or None to search to the end of the game.
+    - noise: Standard deviation of the random noise added to the score of each
+      candidate move; 0 always plays the best move found.
+    - time_limit: Seconds per move, or None for no limit. Deeper iterations
+      are abandoned when it runs out; the first one, a single move deep, is
+      never timed or cancelled, so there is always a move to return.
+    - cache: The EvaluationCache to use, e.g. one shared by the whole session
+      (a new one by default).
+    - rng: The random.Random drawing the noise.
+    - evaluator: The function estimating positions at the depth limit, like evaluate()
+      (the default), e.g. an evaluator.LearnedEvaluator. A cache must only be shared
+      by searches using the same evaluator.
+    """
+
+    def __init__(self, depth=None, noise=0.0, time_limit=None, cache=None, rng=None, evaluator=None):
+        self.depth = depth
+        self.noise = noise
+        self.time_limit = time_limit
+        self.cache = EvaluationCache() if cache is None else cache
+        self.rng = rng or random.Random()
+        self.evaluate = evaluator or evaluate
+        # Positions visited, and cache lookups and hits, for tuning.
+        self.nodes = 0
+        self.lookups = 0
+        self.hits = 0
+        # The time and the threading.Event ending the current iteration early.
+        self.deadline = None
+        self.stop = None
+
+    def choose(self, board, stop=None):
+        """
+        Returns the move to play, or None if the game is over. The board is
+        modified with play()/undo() during the search and left unchanged.
+        - board: The engine.Board to move on.
+        - stop: An optional threading.Event; once set, the search returns the
+          best move of the last completed iteration.
+        """
+        if board.is_over():
+            return None
+        free = board.geometry.cells - (board.bits[0] | board.bits[1]).bit_count()
+        depth = free if self.depth is None else min(self.depth, free)
+        start = time.perf_counter()
+        scores = None
+        for iteration in range(1, depth + 1):
+            # The first iteration is never cut short, so there is always a move: it only
+            # evaluates the candidate moves, so it is quick even when the search was cancelled.
+            # (The node counter runs across iterations, so a clock check can fall in it.)
+            self.deadline = None
+            self.stop = stop if iteration > 1 else None
+            if iteration > 1 and self.time_limit is not None:
+                self.deadline = start + self.time_limit
+            try:
+                scores = self.score_moves(board, iteration)
+            except SearchTimeout:
+                break
+            # Once a forced win is found, or every move loses, looking deeper changes nothing.
+            best = max(scores.values())
+            if best >= 1 or best <= -1:
+                break
+        self.deadline = self.stop = None
+        if self.noise:
+            return max(scores, key=lambda cell: scores[cell] + self.rng.gauss(0, self.noise))
+        return max(scores, key=scores.get)
+
+    def score_moves(self, board, depth):
+        """
+        Returns {cell: score} for the candidate moves of the player to move, searched 'depth' moves deep.
+        Without noise only the best move needs an exact score, so the others are
+        searched with a narrowed window and may only be bounds.
+        """
+        scores = {}
+        alpha = -INFINITY
+        for cell in self.ordered_moves(board, depth):
+            board.play(cell)
+            try:
+                if self.noise:
+                    score = -self.negamax(board, depth - 1, -INFINITY, INFINITY)
+                else:
+                    score = -self.negamax(board, depth - 1, -INFINITY, -alpha)
+            finally:
+                board.undo()
+            scores[cell] = score
+            alpha = max(alpha, score)
+        return scores
+
+    def ordered_moves(self, board, depth):
+        """Returns the candidate moves, the cached best move first and then by move_priority."""
+        moves = sorted(candidate_moves(board), key=lambda cell: -move_priority(board, cell))
+        entry = self.cache.get(self.key(board))
+        if entry is not None and entry[3] in moves:
+            moves.remove(entry[3])
+            moves.insert(0, entry[3])
+        return moves
+
+    @staticmethod
+    def key(board):
+        """Returns the cache key of a position: the board and the cells of the player to move and of the opponent."""
+        return board.size, board.win_length, board.bits[board.turn], board.bits[board.turn ^ 1]
+
+    def negamax(self, board, depth, alpha, beta):
+        """
+        Returns the score of the position for the player to move, searched 'depth' moves deep.
+        Raises SearchTimeout once the deadline has passed or the stop event is set.
+        """
+        self.nodes += 1
+        if self.nodes % CLOCK_INTERVAL == 0:
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SearchTimeout()
+            if self.stop is not None and self.stop.is_set():
+                raise SearchTimeout()
+        cells = board.geometry.cells
+        taken = board.bits[0] | board.bits[1]
+        # The previous move won: the player to move has lost.
+        if board.winner is not None:
+            return -(1 + (cells - taken.bit_count()) / cells)
+        if taken == board.geometry.full_mask:
+            return 0.0
+        if depth == 0:
+            return self.evaluate(board)
+        key = self.key(board)
+        self.lookups += 1
+        entry = self.cache.get(key)
+        best_move = None
+        if entry is not None:
+            entry_depth, score, flag, best_move = entry
+            # A score searched at least as deep is as good as searching again.
+            if entry_depth >= depth:
+                self.hits += 1
+                if flag == EXACT:
+                    return score
+                if flag == LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+        alpha_orig = alpha
+        best = -INFINITY
+        moves = sorted(candidate_moves(board), key=lambda cell: -move_priority(board, cell))
+        # Try the best move from an earlier search first.
+        if best_move in moves:
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+        for cell in moves:
+            board.play(cell)
+            try:
+                score = -self.negamax(board, depth - 1, -beta, -alpha)
+            finally:
+                board.undo()
+            if score > best:
+                best = score
+                best_move = cell
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+        if best <= alpha_orig:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.cache.put(key, (depth, best, flag, best_move))
+        return best
+
+
+def make_level(name, cache=None, rng=None, evaluator=None, **overrides):
+    """
+    Builds the computer player of a difficulty level.
+    - name: A key of LEVELS.
+    - cache: The EvaluationCache to share, or None for a new one.
+    - rng: The random.Random drawing the level's noise.
+    - evaluator: The evaluation function of the level (evaluate() by default).
+    - overrides: Settings replacing the level's, e.g. time_limit=None for a fixed-depth player.
+    """
+    if name not in LEVELS:
+        raise ValueError(f"unknown level {name!r}, expected one of {', '.join(LEVELS)}")
+    return DepthLimitedSearch(cache=cache, rng=rng, evaluator=evaluator, **{**LEVELS[name], **overrides})
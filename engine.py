@@ -0,0 +1,242 @@
+"""
+Headless Tic-Tac-Toe rules, with no Kivy dependency.
+The board is stored as two bitboards (one integer per player): bit i is set
+when the player owns cell i. Boards can be any size N x N with a win length K
+(the classic game is 3x3 with 3 in a row, gomoku is 15x15 with 5 in a row).
+The screens, the computer player and any simulation tool all drive the game
+through the Board class defined here.
+"""
+
+from functools import lru_cache
+
+# Player indices, used to index Board.bits.
+PLAYER1 = 0
+PLAYER2 = 1
+# Symbols shown on the board for each player index.
+SYMBOLS = ("x", "o")
+
+# Define all possible winning combinations (rows, columns, diagonals).
+# Each set represents positions that form a winning line
+WIN_CASES = [
+    {0, 1, 2}, {3, 4, 5}, {6, 7, 8},# Horizontal wins
+    {0, 3, 6}, {1, 4, 7}, {2, 5, 8},# Vertical wins
+    {0, 4, 8}, {2, 4, 6}# Diagonal wins
+]
+# The same winning combinations as bitmasks (bit i set if cell i is in the line).
+WIN_MASKS = [sum(1 << i for i in case) for case in WIN_CASES]
+# Bitmask with all 9 cells set, used for the draw check.
+FULL_MASK = (1 << 9) - 1
+# Directions of a line as (row step, column step): horizontal, vertical and both diagonals.
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+def cells_of(bits):
+    """
+    Returns the list of cell indices set in a bitmask.
+    - bits: An integer such as a player's cells or a winning line.
+    """
+    cells = []
+    while bits:
+        low = bits & -bits
+        cells.append(low.bit_length() - 1)
+        bits ^= low
+    return cells
+
+
+class Geometry:
+    """
+    The fixed, precomputed layout of a board size: its winning lines and,
+    for each cell, the lines passing through it. Shared by all boards of that size.
+    """
+    __slots__ = ("size", "win_length", "cells", "full_mask", "lines", "lines_through", "line_ids_through")
+
+    def __init__(self, size, win_length):
+        if not 1 <= win_length <= size:
+            raise ValueError(f"win length must be between 1 and {size}, got {win_length}")
+        self.size = size
+        self.win_length = win_length
+        self.cells = size * size
+        self.full_mask = (1 << self.cells) - 1
+        # Every run of win_length cells along a row, column or diagonal, as a bitmask.
+        lines = []
+        for row in range(size):
+            for col in range(size):
+                for d_row, d_col in DIRECTIONS:
+                    end_row = row + d_row * (win_length - 1)
+                    end_col = col + d_col * (win_length - 1)
+                    if 0 <= end_row < size and 0 <= end_col < size:
+                        lines.append(sum(
+                            1 << (row + d_row * i) * size + col + d_col * i
+                            for i in range(win_length)
+                        ))
+        # With a win length of 1 every direction gives the same line; keep one copy.
+        self.lines = list(dict.fromkeys(lines))
+        # For each cell, the lines that contain it: at most 4 * win_length of them,
+        # whatever the board size. A move can only complete one of these.
+        self.line_ids_through = [
+            [line for line, mask in enumerate(self.lines) if mask >> cell & 1] for cell in range(self.cells)
+        ]
+        self.lines_through = [[self.lines[line] for line in ids] for ids in self.line_ids_through]
+
+
+@lru_cache(maxsize=None)
+def geometry(size=3, win_length=3):
+    """
+    Returns the shared Geometry for a board size, building it on first use.
+    - size: The number of rows (and columns) of the board.
+    - win_length: How many marks in a row win the game.
+    """
+    return Geometry(size, win_length)
+
+
+class Board:
+    """
+    The state of one game: the cells owned by each player and whose turn it is.
+    Each player also keeps a counter of their marks on every winning line.
+    Moves are applied with play() and taken back with undo(); both only update
+    the counters of the lines through the played cell, so they cost O(K)
+    whatever the board size.
+    """
+    __slots__ = ("geometry", "size", "win_length", "bits", "line_counts", "turn", "moves", "winner", "win_mask")
+
+    def __init__(self, size=3, win_length=3, turn=PLAYER1):
+        self.geometry = geometry(size, win_length)
+        self.size = size
+        self.win_length = win_length
+        self.reset(turn)
+
+    def reset(self, turn=PLAYER1):
+        """
+        Clears the board for a new game.
+        - turn: The index of the player who moves first.
+        """
+        # Cells owned by each player, as bitboards.
+        self.bits = [0, 0]
+        # line_counts[player][line] is how many marks the player has on geometry.lines[line].
+        self.line_counts = [[0] * len(self.geometry.lines), [0] * len(self.geometry.lines)]
+        self.turn = turn
+        # The cells played so far, in order. Needed by undo().
+        self.moves = []
+        # Index of the winning player and the line they completed, once decided.
+        self.winner = None
+        self.win_mask = 0
+
+    def copy(self):
+        """Returns an independent copy of the board, e.g. to search on another thread."""
+        board = Board.__new__(Board)
+        board.geometry = self.geometry
+        board.size = self.size
+        board.win_length = self.win_length
+        board.bits = list(self.bits)
+        board.line_counts = [list(self.line_counts[0]), list(self.line_counts[1])]
+        board.turn = self.turn
+        board.moves = list(self.moves)
+        board.winner = self.winner
+        board.win_mask = self.win_mask
+        return board
+
+    def is_free(self, cell):
+        """Returns True if no player has taken the given cell yet."""
+        return not (self.bits[0] | self.bits[1]) >> cell & 1
+
+    def legal_moves(self):
+        """Returns the free cells, or an empty list once the game is over."""
+        if self.winner is not None:
+            return []
+        return cells_of(~(self.bits[0] | self.bits[1]) & self.geometry.full_mask)
+
+    def play(self, cell):
+        """
+        Places the current player's mark on a cell and passes the turn.
+        The caller is responsible for checking the cell is free.
+        - cell: The cell index, row * size + column.
+        """
+        player = self.turn
+        self.bits[player] |= 1 << cell
+        self.moves.append(cell)
+        # Only the player who just moved, and only a line through this cell, can have won.
+        counts = self.line_counts[player]
+        win_length = self.win_length
+        for line in self.geometry.line_ids_through[cell]:
+            counts[line] += 1
+            if counts[line] == win_length and self.winner is None:
+                self.winner = player
+                self.win_mask = self.geometry.lines[line]
+        self.turn = player ^ 1
+
+    def undo(self):
+        """Takes back the last move and returns its cell index."""
+        cell = self.moves.pop()
+        self.turn ^= 1
+        # The cell is set in the mover's bitboard, so XOR-ing it out restores the bitboard.
+        self.bits[self.turn] ^= 1 << cell
+        counts = self.line_counts[self.turn]
+        for line in self.geometry.line_ids_through[cell]:
+            counts[line] -= 1
+        # A game stops at the first win, so undoing any move clears the result.
+        self.winner = None
+        self.win_mask = 0
+        return cell
+
+    def load(self, bits, moves, turn):
+        """
+        Sets the board to another position of the same game: its bitboards, the moves
+        that led to it and the player to move. The line counters and the result are
+        rebuilt from the bitboards, O(lines) however many moves apart the positions are.
+        - bits: The cells of PLAYER1 and of PLAYER2.
+        - moves: The cells played to reach the position, in order.
+        - turn: The index of the player to move.
+        """
+        self.bits = list(bits)
+        self.moves = list(moves)
+        self.turn = turn
+        self.winner = None
+        self.win_mask = 0
+        lines = self.geometry.lines
+        for player in (0, 1):
+            mine = self.bits[player]
+            self.line_counts[player] = [(mine & mask).bit_count() for mask in lines]
+        # A game stops at its first win, so only the last mover can have a line.
+        mover = turn ^ 1
+        if self.moves:
+            for line, count in enumerate(self.line_counts[mover]):
+                if count == self.win_length:
+                    self.winner = mover
+                    self.win_mask = lines[line]
+                    break
+
+    def playout(self, rng):
+        """
+        Plays uniformly random moves to the end of the game and returns the
+        winner's player index, or None for a draw. Used by Monte Carlo search.
+        The moves are played on local copies of the bitboards, so the board
+        itself is left unchanged and nothing needs undoing.
+        - rng: A random.Random instance.
+        """
+        if self.winner is not None:
+            return self.winner
+        free = cells_of(~(self.bits[0] | self.bits[1]) & self.geometry.full_mask)
+        rng.shuffle(free)
+        bits = [self.bits[0], self.bits[1]]
+        player = self.turn
+        lines_through = self.geometry.lines_through
+        for cell in free:
+            mine = bits[player] | 1 << cell
+            bits[player] = mine
+            for mask in lines_through[cell]:
+                if mine & mask == mask:
+                    return player
+            player ^= 1
+        return None
+
+    def is_full(self):
+        """Returns True if every cell has been taken."""
+        return self.bits[0] | self.bits[1] == self.geometry.full_mask
+
+    def is_draw(self):
+        """Returns True if the board is full and nobody has won."""
+        return self.winner is None and self.is_full()
+
+    def is_over(self):
+        """Returns True if the game has been won or drawn."""
+        return self.winner is not None or self.is_full()
@@ -0,0 +1,77 @@
+"""
+A learned evaluation function for the difficulty levels, with no Kivy or NumPy
+dependency: the weights are trained offline by training.py and exported to a
+JSON file, and evaluating a position takes a few hundred multiplications in
+plain Python, so the app can load them without NumPy.
+
+A position is described by line features: for k = 1 .. K-1, how many lines
+hold k marks of the player to move and none of the opponent's, then the same
+for the opponent, each as log(1 + count). They do not depend on the board
+size, so weights trained on one board can be tried on another, though they
+are best on the board they were trained on. The model is a small multilayer
+perceptron with tanh layers (a linear model when it has no hidden layer).
+"""
+
+import json
+import math
+from operator import mul
+
+# Version of the weight files written by training.py and read here.
+FORMAT_VERSION = 1
+
+
+def feature_count(win_length):
+    """Returns the number of features of a position with this win length."""
+    return 2 * (win_length - 1)
+
+
+def features(board):
+    """
+    Returns the features of a position that is not over, for the player to move.
+    - board: The engine.Board to describe.
+    """
+    win_length = board.win_length
+    mine = board.line_counts[board.turn]
+    theirs = board.line_counts[board.turn ^ 1]
+    counts = [0] * feature_count(win_length)
+    for line in range(len(mine)):
+        marks = mine[line]
+        if not theirs[line]:
+            if 0 < marks < win_length:
+                counts[marks - 1] += 1
+        elif not marks:
+            counts[win_length - 2 + theirs[line]] += 1
+    return [math.log1p(count) for count in counts]
+
+
+class LearnedEvaluator:
+    """
+    Estimates positions with trained weights. Called like difficulty.evaluate:
+    evaluator(board) returns a score between -0.5 and 0.5 for the player to move.
+    - weights: The dict of a weight file (see training.export_weights): "layers",
+      a list of {"weights": [[...] per output], "biases": [...]}, the last one
+      having a single output, and the board it was trained on.
+    """
+
+    def __init__(self, weights):
+        if weights.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported evaluator version {weights.get('version')!r}, expected {FORMAT_VERSION}")
+        self.size = weights["size"]
+        self.win_length = weights["win_length"]
+        self.layers = [(layer["weights"], layer["biases"]) for layer in weights["layers"]]
+        if len(self.layers[0][0][0]) != feature_count(self.win_length) or len(self.layers[-1][1]) != 1:
+            raise ValueError("the layers do not match the features of the board")
+
+    def __call__(self, board):
+        values = features(board)
+        for weights, biases in self.layers:
+            # Every layer, the output one included, is squashed by tanh.
+            values = [math.tanh(bias + sum(map(mul, row, values)))
+                      for row, bias in zip(weights, biases)]
+        return values[0] / 2
+
+
+def load_evaluator(path):
+    """Returns the LearnedEvaluator of a weight file written by training.py."""
+    with open(path) as file:
+        return LearnedEvaluator(json.load(file))
@@ -0,0 +1,177 @@
+"""
+Move hints for the player to move, with no Kivy dependency: the free cells
+that win at once, those that block an immediate win of the opponent, and
+those that create a fork: at least two different cells winning on the next
+move, which the opponent cannot both block.
+
+A HintTracker keeps, for each player and cell, how many lines through the
+cell are a threat (the player's marks one short of a win, no opposing mark)
+and how many are two short. It is told about every move played or taken back,
+and only the lines through that cell change, so an update costs O(K * K)
+whatever the board size. The wins and blocks are then a few bitmask
+operations. A cell on two lines two short is only a fork candidate: for K >= 4
+overlapping lines in the same direction can share the cell they would be
+completed on. Each candidate is confirmed by collecting the completing cells
+of its lines as a bitmask, O(K) lines per candidate.
+"""
+
+from functools import lru_cache
+
+from engine import cells_of
+
+# Kinds of hint, indexing the tuple returned by HintTracker.hints().
+WIN = 0
+BLOCK = 1
+FORK = 2
+# A line's part in the hints of one player: none, one mark short of a win, or two.
+OPEN_NONE = 0
+OPEN_THREAT = 1
+OPEN_TWO = 2
+
+
+@lru_cache(maxsize=None)
+def line_cells(geometry):
+    """Returns the cells of every line of an engine.Geometry, in the order of geometry.lines."""
+    return [cells_of(mask) for mask in geometry.lines]
+
+
+def line_state(win_length, mine, theirs):
+    """
+    Returns what a line means for a player's hints: OPEN_THREAT, OPEN_TWO or OPEN_NONE.
+    - mine, theirs: The marks of the player and of the opponent on the line.
+    """
+    if theirs:
+        return OPEN_NONE
+    if mine == win_length - 1:
+        return OPEN_THREAT
+    if mine == win_length - 2:
+        return OPEN_TWO
+    return OPEN_NONE
+
+
+def hint_changes(shown, hints):
+    """
+    Returns (mask, kind) pairs turning the highlighted cells 'shown' into 'hints':
+    kind None for the cells to clear, else the cells to colour for that kind.
+    Only cells whose hint changes are listed.
+    - shown, hints: Tuples of bitmasks indexed by WIN, BLOCK and FORK.
+    """
+    changes = []
+    cleared = (shown[WIN] | shown[BLOCK] | shown[FORK]) & ~(hints[WIN] | hints[BLOCK] | hints[FORK])
+    if cleared:
+        changes.append((cleared, None))
+    for kind, mask in enumerate(hints):
+        if mask & ~shown[kind]:
+            changes.append((mask & ~shown[kind], kind))
+    return changes
+
+
+class HintTracker:
+    """
+    The threats of both players on one engine.Board, kept up to date move by move.
+    Call played(board, cell) after each board.play(cell), undone(board, cell)
+    after each board.undo(), and reset(board) after anything else (a new game).
+    """
+
+    def __init__(self, board):
+        self.reset(board)
+
+    def reset(self, board):
+        """Recomputes everything from the board's line counters."""
+        geometry = board.geometry
+        cells = geometry.cells
+        self.win_length = board.win_length
+        self.lines = line_cells(geometry)
+        # threats[player][cell] and twos[player][cell] count the lines through the
+        # cell that are one or two marks short of a win for the player.
+        self.threats = [[0] * cells, [0] * cells]
+        self.twos = [[0] * cells, [0] * cells]
+        # The cells with at least one threat line, and with at least two lines
+        # two short (fork candidates, see is_fork), for each player.
+        self.threat_mask = [0, 0]
+        self.fork_mask = [0, 0]
+        counts = board.line_counts
+        for line in range(len(self.lines)):
+            for player in (0, 1):
+                state = line_state(self.win_length, counts[player][line], counts[player ^ 1][line])
+                if state != OPEN_NONE:
+                    self.count(player, line, state, 1)
+
+    def count(self, player, line, state, step):
+        """Adds 'step' (1 or -1) to the counter of 'state' of every cell of a line, updating the masks."""
+        if state == OPEN_THREAT:
+            threats = self.threats[player]
+            for cell in self.lines[line]:
+                threats[cell] += step
+                if threats[cell] == (1 if step > 0 else 0):
+                    self.threat_mask[player] ^= 1 << cell
+        else:
+            twos = self.twos[player]
+            for cell in self.lines[line]:
+                twos[cell] += step
+                if twos[cell] == (2 if step > 0 else 1):
+                    self.fork_mask[player] ^= 1 << cell
+
+    def update_lines(self, board, cell, mover, delta):
+        """
+        Moves the lines through a cell from their state before a move to their state now.
+        - mover: The player whose mark was placed (delta 1) or removed (delta -1).
+        """
+        counts = board.line_counts
+        win_length = self.win_length
+        for line in board.geometry.line_ids_through[cell]:
+            now = [counts[0][line], counts[1][line]]
+            before = list(now)
+            before[mover] -= delta
+            # Both players' states can change: the mover's line gets closer to (or further
+            # from) a win, and the opponent's line is blocked (or reopened).
+            for player in (0, 1):
+                old = line_state(win_length, before[player], before[player ^ 1])
+                new = line_state(win_length, now[player], now[player ^ 1])
+                if old != new:
+                    if old != OPEN_NONE:
+                        self.count(player, line, old, -1)
+                    if new != OPEN_NONE:
+                        self.count(player, line, new, 1)
+
+    def played(self, board, cell):
+        """Takes the move just played on a cell into account."""
+        self.update_lines(board, cell, board.turn ^ 1, 1)
+
+    def undone(self, board, cell):
+        """Takes the move just taken back from a cell into account."""
+        self.update_lines(board, cell, board.turn, -1)
+
+    def is_fork(self, board, player, cell):
+        """
+        Returns whether playing a free cell gives a player at least two different
+        winning cells: the last free cells of its lines through the cell that are two short.
+        """
+        mine = board.line_counts[player]
+        theirs = board.line_counts[player ^ 1]
+        lines = board.geometry.lines
+        free = ~(board.bits[0] | board.bits[1] | 1 << cell)
+        target = self.win_length - 2
+        winning = 0
+        for line in board.geometry.line_ids_through[cell]:
+            if mine[line] == target and not theirs[line]:
+                winning |= lines[line] & free
+        # More than one bit set.
+        return winning & (winning - 1) != 0
+
+    def hints(self, board):
+        """
+        Returns the hints of the player to move as bitmasks of free cells, indexed by
+        WIN, BLOCK and FORK; a cell is only in its most urgent kind. All empty once the game is over.
+        """
+        if board.is_over():
+            return 0, 0, 0
+        free = ~(board.bits[0] | board.bits[1]) & board.geometry.full_mask
+        player = board.turn
+        wins = self.threat_mask[player] & free
+        blocks = self.threat_mask[player ^ 1] & free & ~wins
+        forks = 0
+        for cell in cells_of(self.fork_mask[player] & free & ~wins & ~blocks):
+            if self.is_fork(board, player, cell):
+                forks |= 1 << cell
+        return wins, blocks, forks
@@ -0,0 +1,135 @@
+"""
+Move history of a game, with undo, redo and jumps to any move, with no Kivy
+dependency. A MoveHistory drives an engine.Board through play() and undo(),
+the same make/unmake moves the computer's searches use: a step back XORs the
+cell out of the mover's bitboard and decrements the counters of the lines
+through it, O(K) whatever the board size or the length of the game.
+
+It also keeps a snapshot of both bitboards after every move of the history,
+two ints per move. jump() uses them to go straight to any move: the cells that
+differ from the current position are one XOR per bitboard, the board takes the
+snapshot, and its line counters are rebuilt from it, O(lines) however far the
+jump. steps() walks there instead, one make/unmake move at a time, which is
+cheaper for short distances; walk_is_cheaper() tells which to use. (On 15x15,
+with a hints.HintTracker kept up to date, a jump costs as much as walking
+about 30 moves, most of it rebuilding the tracker.)
+"""
+
+
+class MoveHistory:
+    """
+    The moves of the game on a board: those played (board.moves) and those
+    taken back that can be played again.
+    - board: The engine.Board the moves are played on.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.clear()
+
+    def __len__(self):
+        """Returns the number of moves of the whole history, taken back ones included."""
+        return len(self.board.moves) + len(self.future)
+
+    def clear(self):
+        """Forgets the moves taken back, e.g. after the board was reset."""
+        # The moves taken back, the next one to play again last.
+        self.future = []
+        # positions[i] is (PLAYER1's bits, PLAYER2's bits) after i moves of the history.
+        bits = [0, 0]
+        player = self.first_player()
+        self.positions = [tuple(bits)]
+        for cell in self.board.moves:
+            bits[player] |= 1 << cell
+            player ^= 1
+            self.positions.append(tuple(bits))
+
+    def play(self, cell):
+        """
+        Plays a move. Playing the next move of the history keeps the rest of it;
+        any other move starts a new branch and forgets the moves taken back.
+        - cell: The cell index, row * size + column.
+        """
+        self.board.play(cell)
+        if self.future and self.future[-1] == cell:
+            self.future.pop()
+        else:
+            self.future.clear()
+            del self.positions[len(self.board.moves):]
+            self.positions.append(tuple(self.board.bits))
+
+    def undo(self):
+        """Takes back the last move played and returns its cell, or None at the start of the game."""
+        if not self.board.moves:
+            return None
+        cell = self.board.undo()
+        self.future.append(cell)
+        return cell
+
+    def redo(self):
+        """Plays the last move taken back again and returns its cell, or None at the end of the history."""
+        if not self.future:
+            return None
+        cell = self.future.pop()
+        self.board.play(cell)
+        return cell
+
+    def check_index(self, index):
+        """Raises ValueError unless 'index' is a move number of the history."""
+        if not 0 <= index <= len(self):
+            raise ValueError(f"move number must be between 0 and {len(self)}, got {index}")
+
+    def steps(self, index):
+        """
+        Moves the board to the position after 'index' moves of the history, one move
+        at a time, and yields (cell, forward) after each: forward is True for a move
+        played again and False for a move taken back. Callers can update anything
+        kept in step with the board (e.g. a hints.HintTracker) as the steps come.
+        Costs O(K) per move walked; see jump() for long distances.
+        - index: A move number between 0 and len(self).
+        """
+        self.check_index(index)
+        while len(self.board.moves) > index:
+            yield self.undo(), False
+        while len(self.board.moves) < index:
+            yield self.redo(), True
+
+    def walk_is_cheaper(self, index):
+        """
+        Returns whether steps() reaches move 'index' for less than jump(): walking costs
+        O(K) line updates per move and a jump rebuilds the counters of every line.
+        """
+        distance = abs(index - len(self.board.moves))
+        return distance * 4 * self.board.win_length < len(self.board.geometry.lines)
+
+    def jump(self, index):
+        """
+        Moves the board straight to the position after 'index' moves of the history,
+        from its snapshot, and returns the cells that changed as a bitmask. Anything
+        kept in step with the board must then be rebuilt (e.g. HintTracker.reset).
+        - index: A move number between 0 and len(self).
+        """
+        self.check_index(index)
+        board = self.board
+        old = board.bits
+        new = self.positions[index]
+        changed = (old[0] ^ new[0]) | (old[1] ^ new[1])
+        # Only the list of moves is split differently between played and taken back.
+        moves = board.moves
+        if index < len(moves):
+            self.future.extend(reversed(moves[index:]))
+            moves = moves[:index]
+        else:
+            start = len(self.future) - (index - len(moves))
+            moves = moves + self.future[start:][::-1]
+            del self.future[start:]
+        board.load(new, moves, self.turn_at(index))
+        return changed
+
+    def first_player(self):
+        """Returns the index of the player who made (or will make) the first move."""
+        return self.board.turn ^ len(self.board.moves) & 1
+
+    def turn_at(self, index):
+        """Returns the index of the player to move after 'index' moves of the history."""
+        return self.first_player() ^ index & 1
@@ -0,0 +1,208 @@
+"""
+Load-test client of server.py. Opens many connections, plays random games on
+each of them at the same time and reports the latency of every move: the time
+from sending a move to receiving its reply (including the computer's answer in
+PvC games). PvP games are played between pairs of the test's own connections.
+
+Example:
+    python server.py &
+    python load_test.py --clients 500 --games 20 --mode pvc
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+
+from engine import Board, SYMBOLS
+from metrics import percentile
+
+
+class Client:
+    """
+    One connection to the server. Replies are matched to requests by "id", and
+    events pushed for a game are queued for that game, so a connection can play
+    several games at once.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count()
+        self.pending = {}
+        self.events = {}
+        self.listener = asyncio.create_task(self.listen())
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 16)
+        return cls(reader, writer)
+
+    async def listen(self):
+        """Reads the server's messages until the connection closes."""
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if "id" in message:
+                self.pending.pop(message["id"]).set_result(message)
+            else:
+                self.event_queue(message["game"]).put_nowait(message)
+        for future in self.pending.values():
+            future.set_exception(ConnectionError("the server closed the connection"))
+
+    def event_queue(self, game):
+        """Returns the queue of events pushed for a game."""
+        queue = self.events.get(game)
+        if queue is None:
+            queue = self.events[game] = asyncio.Queue()
+        return queue
+
+    async def request(self, **message):
+        """Sends a request and returns its reply. Raises RuntimeError if the server refused it."""
+        message["id"] = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[message["id"]] = future
+        self.writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+        await self.writer.drain()
+        reply = await future
+        if not reply["ok"]:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.listener.cancel()
+
+
+async def play_game(client, opening, size, win_length, rng, latencies, on_open=None):
+    """
+    Plays one game with random moves and appends the latency of each move to 'latencies'.
+    Returns the final reply or event of the game.
+    - opening: The request starting the game ("new" or "join").
+    - on_open: Called with the game id once the server has opened the game.
+    """
+    board = Board(size, win_length)
+    state = await client.request(**opening)
+    game = state["game"]
+    if on_open is not None:
+        on_open(game)
+    events = client.event_queue(game)
+    for cell in state["moves"]:
+        board.play(cell)
+    while state["status"] != "over":
+        if state["status"] == "waiting" or state["turn"] != state["you"]:
+            # The opponent's turn (or no opponent yet): wait for the server's event.
+            state = await events.get()
+            if state.get("event") == "moved":
+                board.play(state["cell"])
+            continue
+        cell = rng.choice(board.legal_moves())
+        start = time.perf_counter()
+        state = await client.request(op="move", game=game, cell=cell)
+        latencies.append(time.perf_counter() - start)
+        for move in state["moves"]:
+            board.play(move)
+    client.events.pop(game, None)
+    return state
+
+
+async def run_client(host, port, games, size, win_length, seed, latencies, results):
+    """Connects, plays 'games' PvC games one after another and counts the results by winner symbol."""
+    client = await Client.connect(host, port)
+    rng = random.Random(seed)
+    opening = {"op": "new", "mode": "pvc", "size": size, "win_length": win_length}
+    try:
+        for _ in range(games):
+            state = await play_game(client, opening, size, win_length, rng, latencies)
+            results[state["winner"] or "draw"] += 1
+    finally:
+        await client.close()
+
+
+async def run_pair(host, port, games, size, win_length, seed, latencies, results):
+    """
+    Connects two clients and plays 'games' PvP games between them. The first opens
+    a private game and the second joins it, so pairs never wait on each other.
+    """
+    first = await Client.connect(host, port)
+    second = await Client.connect(host, port)
+    rng = random.Random(seed)
+    opening = {"op": "new", "mode": "pvp", "private": True, "size": size, "win_length": win_length}
+    try:
+        for _ in range(games):
+            opened = asyncio.Queue()
+
+            async def join():
+                game = await opened.get()
+                return await play_game(second, {"op": "join", "game": game}, size, win_length, rng, latencies)
+
+            state, _ = await asyncio.gather(
+                play_game(first, opening, size, win_length, rng, latencies, on_open=opened.put_nowait),
+                join(),
+            )
+            results[state["winner"] or "draw"] += 1
+    finally:
+        await first.close()
+        await second.close()
+
+
+async def run(host, port, clients, games, mode, size, win_length, seed=None):
+    """Runs the load test and returns its summary."""
+    latencies = []
+    results = {SYMBOLS[0]: 0, SYMBOLS[1]: 0, "draw": 0}
+    seeds = random.Random(seed)
+    start = time.perf_counter()
+    if mode == "pvp":
+        tasks = [run_pair(host, port, games, size, win_length, seeds.random(), latencies, results)
+                 for _ in range(clients // 2)]
+    else:
+        tasks = [run_client(host, port, games, size, win_length, seeds.random(), latencies, results)
+                 for _ in range(clients)]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "mode": mode,
+        "clients": clients,
+        "games": sum(results.values()),
+        "results": results,
+        "moves": len(latencies),
+        "elapsed": round(elapsed, 3),
+        "moves_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the Tic-Tac-Toe game server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--clients", type=int, default=100, help="concurrent connections")
+    parser.add_argument("--games", type=int, default=10, help="games played by each connection")
+    parser.add_argument("--mode", choices=("pvc", "pvp"), default="pvc")
+    parser.add_argument("--board-size", type=int, default=3, help="rows and columns of the board")
+    parser.add_argument("--win-length", type=int, default=3, help="marks in a row needed to win")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the random moves")
+    args = parser.parse_args(argv)
+    if args.mode == "pvp" and args.clients % 2:
+        parser.error("pvp needs an even number of clients, played in pairs")
+    summary = asyncio.run(run(args.host, args.port, args.clients, args.games, args.mode,
+                              args.board_size, args.win_length, args.seed))
+    print(json.dumps(summary))
+    print(
+        f"{summary['moves']} moves in {summary['elapsed']}s ({summary['moves_per_second']} moves/s): "
+        f"p50 {summary['p50_ms']} ms, p99 {summary['p99_ms']} ms",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
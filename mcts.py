@@ -0,0 +1,166 @@
+"""
+Monte Carlo Tree Search computer player, for boards too large to solve.
+The search is anytime: it runs random playouts until its time or playout
+budget is spent and then plays the most visited move found so far. The tree
+is kept between moves, so the part below the moves actually played is reused.
+
+It works on any board with the engine.Board interface (turn, winner, moves,
+legal_moves, play, undo, is_over and playout).
+"""
+
+import math
+import random
+import time
+
+# Exploration constant of the UCT formula (sqrt(2) in theory).
+EXPLORATION = 1.4
+# The clock is only read every this many playouts, to keep it off the hot path.
+CLOCK_INTERVAL = 64
+
+
+class Node:
+    """
+    One position in the search tree, reached by playing 'move'.
+    wins counts results from the point of view of the player who played 'move'
+    (a draw counts as half a win).
+    """
+    __slots__ = ("move", "player", "children", "untried", "visits", "wins")
+
+    def __init__(self, move, board, rng):
+        self.move = move
+        # The player who played 'move', i.e. not the one to move now.
+        self.player = board.turn ^ 1
+        self.children = {}
+        # Moves not expanded yet, in random order so pop() picks one at random.
+        self.untried = board.legal_moves()
+        rng.shuffle(self.untried)
+        self.visits = 0
+        self.wins = 0.0
+
+    def select_child(self):
+        """Returns the child with the best UCT score."""
+        log_visits = math.log(self.visits)
+        return max(
+            self.children.values(),
+            key=lambda child: child.wins / child.visits
+            + EXPLORATION * math.sqrt(log_visits / child.visits),
+        )
+
+
+class MCTS:
+    """
+    A Monte Carlo Tree Search player. Call choose(board) to get a move.
+    - time_limit: Seconds to search per move, or None for no limit.
+    - playouts: Number of playouts per move, or None for no limit.
+    At least one of the two budgets must be set.
+    """
+
+    def __init__(self, time_limit=1.0, playouts=None, rng=None):
+        if time_limit is None and playouts is None:
+            raise ValueError("MCTS needs a time limit or a playout budget")
+        self.time_limit = time_limit
+        self.playouts = playouts
+        self.rng = rng or random.Random()
+        self.root = None
+        # The moves leading to the root and the player who made the first one,
+        # used to find the root again in the next position.
+        self.root_moves = []
+        self.root_first_player = None
+        # Playouts run by the last call to choose(), for tuning.
+        self.last_playouts = 0
+        # Playouts run by every call, and how many calls looked for the position
+        # in the kept tree and how many found it there.
+        self.nodes = 0
+        self.lookups = 0
+        self.hits = 0
+
+    def _find_root(self, board):
+        """
+        Returns the node for the board's position, reusing the subtree of the
+        previous search when the board continues the same game.
+        """
+        first_player = board.turn ^ len(board.moves) & 1
+        root = self.root
+        self.lookups += 1
+        if (root is None or first_player != self.root_first_player
+                or board.moves[:len(self.root_moves)] != self.root_moves):
+            root = None
+        else:
+            for move in board.moves[len(self.root_moves):]:
+                root = root.children.get(move)
+                if root is None:
+                    break
+        if root is None:
+            root = Node(None, board, self.rng)
+        else:
+            self.hits += 1
+        # Nodes only point down the tree, so dropping the old root frees the discarded part at once.
+        self.root = root
+        self.root_moves = list(board.moves)
+        self.root_first_player = first_player
+        return root
+
+    def choose(self, board, stop=None):
+        """
+        Searches from the board's position within the budget and returns the
+        most visited move, or None if the game is over. The board is left unchanged.
+        - board: The board to move on.
+        - stop: An optional threading.Event; once set, the search ends early
+          and returns the best move found so far.
+        """
+        if board.is_over():
+            return None
+        root = self._find_root(board)
+        rng = self.rng
+        deadline = None if self.time_limit is None else time.perf_counter() + self.time_limit
+        count = 0
+        while self.playouts is None or count < self.playouts:
+            if count % CLOCK_INTERVAL == 0 and count:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+                if stop is not None and stop.is_set():
+                    break
+            node = root
+            # The nodes visited, root first, updated by the backpropagation.
+            path = [root]
+            # Selection: walk down fully expanded nodes.
+            while not node.untried and node.children:
+                node = node.select_child()
+                board.play(node.move)
+                path.append(node)
+            # Expansion: add one new child, unless the game is already decided.
+            if node.untried and board.winner is None:
+                move = node.untried.pop()
+                board.play(move)
+                child = Node(move, board, rng)
+                node.children[move] = child
+                node = child
+                path.append(node)
+            # Simulation: finish the game with random moves.
+            winner = board.playout(rng)
+            for _ in range(len(path) - 1):
+                board.undo()
+            # Backpropagation.
+            for node in path:
+                node.visits += 1
+                if winner is None:
+                    node.wins += 0.5
+                elif winner == node.player:
+                    node.wins += 1
+            count += 1
+        self.last_playouts = count
+        self.nodes += count
+        if not root.children:
+            return None
+        return max(root.children.values(), key=lambda child: child.visits).move
+
+    def root_value(self):
+        """
+        Returns how good the position of the last choose() is for the player to move
+        in it, from 0 (lost) to 1 (won): the win rate of its most visited move, a draw
+        counting half. Used to label positions for training. None before any search.
+        """
+        if self.root is None or not self.root.children:
+            return None
+        best = max(self.root.children.values(), key=lambda child: child.visits)
+        return best.wins / best.visits
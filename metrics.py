@@ -0,0 +1,170 @@
+"""
+Instrumentation of the game screens: how long each player move, computer move
+and result check takes, with the computer's node count and cache hit rate.
+Every measurement is a MoveStats, passed to the callbacks subscribed to a
+Metrics object and kept in a rolling window for summaries, e.g. to tune the
+AI budgets on a device or check that UI work fits in a frame.
+No Kivy dependency: the screens report into a Metrics object when given one.
+"""
+
+import functools
+import time
+from collections import deque
+
+# The instrumented operations.
+PLAYER_MOVE = "player_move"
+COMPUTER_MOVE = "computer_move"
+CHECK_WINNER = "check_winner"
+PHASES = (PLAYER_MOVE, COMPUTER_MOVE, CHECK_WINNER)
+# One frame at 60 frames per second.
+FRAME_BUDGET = 1 / 60
+
+
+class MoveStats:
+    """
+    One measured operation.
+    - phase: PLAYER_MOVE, COMPUTER_MOVE or CHECK_WINNER.
+    - seconds: Its wall time.
+    - ply: The number of moves on the board when it ended.
+    - nodes: Positions or playouts searched by the computer (0 for other phases).
+    - lookups, hits: Cache lookups by the computer (solver table, tablebase or
+      kept MCTS tree) and how many found the position.
+    """
+    __slots__ = ("phase", "seconds", "ply", "nodes", "lookups", "hits")
+
+    def __init__(self, phase, seconds, ply, nodes=0, lookups=0, hits=0):
+        self.phase = phase
+        self.seconds = seconds
+        self.ply = ply
+        self.nodes = nodes
+        self.lookups = lookups
+        self.hits = hits
+
+    @property
+    def hit_rate(self):
+        """The fraction of cache lookups that hit, or None without lookups."""
+        return self.hits / self.lookups if self.lookups else None
+
+    def as_dict(self):
+        """Returns the stats as a JSON-friendly dict."""
+        return {
+            "phase": self.phase,
+            "ms": round(self.seconds * 1000, 3),
+            "ply": self.ply,
+            "nodes": self.nodes,
+            "lookups": self.lookups,
+            "hits": self.hits,
+        }
+
+
+def percentile(sorted_values, fraction):
+    """
+    Returns the value below which the given fraction of a sorted list lies (nearest
+    rank), or None for an empty list. The one percentile of the repo's reports.
+    - sorted_values: The values, in increasing order.
+    - fraction: Between 0 and 1, e.g. 0.99 for the 99th percentile.
+    """
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def search_counters(*searchers):
+    """
+    Returns the (nodes, lookups, hits) totals of some computer players, e.g. a
+    solver.Solver, a tablebase.Tablebase and an mcts.MCTS. None and missing counters count as 0.
+    """
+    nodes = lookups = hits = 0
+    for searcher in searchers:
+        if searcher is not None:
+            nodes += getattr(searcher, "nodes", 0)
+            lookups += getattr(searcher, "lookups", 0)
+            hits += getattr(searcher, "hits", 0)
+    return nodes, lookups, hits
+
+
+class Metrics:
+    """
+    Receives MoveStats, passes each to the subscribed callbacks and keeps the last
+    'window' of them for summary().
+    - window: How many recent measurements are kept.
+    - frame_budget: Seconds an operation on the UI thread may take without
+      delaying a frame; longer ones are counted in the summary.
+    """
+
+    def __init__(self, window=1000, frame_budget=FRAME_BUDGET):
+        self.history = deque(maxlen=window)
+        self.frame_budget = frame_budget
+        self.callbacks = []
+
+    def subscribe(self, callback):
+        """Calls callback(stats) with every new MoveStats, on the thread that records it."""
+        self.callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        """Stops calling a subscribed callback."""
+        self.callbacks.remove(callback)
+
+    def record(self, stats):
+        """Stores a MoveStats and passes it to the callbacks."""
+        self.history.append(stats)
+        for callback in self.callbacks:
+            callback(stats)
+
+    def last(self, phase):
+        """Returns the most recent MoveStats of a phase, or None."""
+        for stats in reversed(self.history):
+            if stats.phase == phase:
+                return stats
+        return None
+
+    def summary(self):
+        """
+        Returns, for each phase measured in the window, the count, mean, 95th
+        percentile and maximum time in milliseconds, the number of operations
+        over the frame budget (None for computer moves, which run off the UI
+        thread), and the computer's total nodes and hit rate.
+        """
+        summary = {}
+        for phase in PHASES:
+            entries = [stats for stats in self.history if stats.phase == phase]
+            if not entries:
+                continue
+            times = sorted(stats.seconds for stats in entries)
+            lookups = sum(stats.lookups for stats in entries)
+            summary[phase] = {
+                "count": len(entries),
+                "mean_ms": round(sum(times) / len(times) * 1000, 3),
+                "p95_ms": round(percentile(times, 0.95) * 1000, 3),
+                "max_ms": round(times[-1] * 1000, 3),
+                "over_frame_budget": None if phase == COMPUTER_MOVE
+                else sum(1 for seconds in times if seconds > self.frame_budget),
+                "nodes": sum(stats.nodes for stats in entries),
+                "hit_rate": round(sum(stats.hits for stats in entries) / lookups, 4) if lookups else None,
+            }
+        return summary
+
+
+def instrumented(phase):
+    """
+    Decorates a screen method so each call is timed and recorded as a MoveStats
+    of the given phase, when the screen's 'metrics' attribute is a Metrics.
+    Without one the method runs untouched.
+    """
+
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if metrics is None:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                metrics.record(MoveStats(phase, time.perf_counter() - start, len(self.board.moves)))
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,159 @@
+"""
+Computer players. Each one is a function taking an engine.Board and returning
+the cell to play for the player to move (or None once the game is over).
+STRATEGIES maps a name to a factory building such a function, so tools such
+as the self-play simulator can create fresh players by name in every process.
+Each factory takes an optional seed: players that make random choices draw them
+from their own random.Random seeded with it (see seeding.py), and the others ignore it.
+"""
+
+import random
+from functools import lru_cache
+
+from difficulty import make_level
+from engine import cells_of
+from mcts import MCTS
+from solver import Solver
+
+
+def winning_cells(board, player):
+    """
+    Returns the free cells that would complete a line for the given player.
+    Only lines missing exactly one mark are looked at, found from the board's line counters.
+    - board: The engine.Board to look at.
+    - player: The player index (engine.PLAYER1 or engine.PLAYER2).
+    """
+    mine = board.line_counts[player]
+    theirs = board.line_counts[player ^ 1]
+    target = board.win_length - 1
+    cells = set()
+    for line, mask in enumerate(board.geometry.lines):
+        if mine[line] == target and not theirs[line]:
+            # The one cell of the line we do not own yet.
+            missing = mask & ~board.bits[player]
+            cells.add(missing.bit_length() - 1)
+    return cells
+
+
+def greedy_move(board):
+    """
+    Plays a winning move if there is one, blocks the opponent's winning move
+    otherwise, and else takes the cell on the most lines still open to the
+    player to move, preferring cells near the center.
+    - board: The engine.Board to move on.
+    """
+    moves = board.legal_moves()
+    if not moves:
+        return None
+    player = board.turn
+    for target in (player, player ^ 1):
+        cells = winning_cells(board, target)
+        if cells:
+            return min(cells)
+    theirs = board.bits[player ^ 1]
+    center = (board.size - 1) / 2
+
+    def score(cell):
+        row, col = divmod(cell, board.size)
+        open_lines = sum(1 for mask in board.geometry.lines_through[cell] if not theirs & mask)
+        return (open_lines, -abs(row - center) - abs(col - center))
+
+    return max(moves, key=score)
+
+
+def heuristic_move(board):
+    """
+    The computer player the game originally shipped with, kept as a baseline.
+    It takes the center if it is free; otherwise it picks a cell on the line
+    with the fewest cells not taken by the opponent, and finally overwrites
+    that choice with a winning cell if it has all but one cell of a line.
+    It does not block properly: a line the opponent is about to complete is ignored.
+    - board: The engine.Board to move on.
+    """
+    if board.is_over():
+        return None
+    mine = board.bits[board.turn]
+    theirs = board.bits[board.turn ^ 1]
+    # Each winning line without the opponent's cells (the old 'available_cases').
+    available_cases = [[i for i in cells_of(mask) if not theirs >> i & 1] for mask in board.geometry.lines]
+    # Prioritize taking the center position if it's available.
+    central_pos = board.geometry.cells // 2
+    if board.is_free(central_pos):
+        return central_pos
+    min_length = board.win_length # Start with maximum case length
+    choice = None
+    # Prefer lines with fewer open spots, hoping to block the opponent.
+    for case in available_cases:
+        if 0 < len(case) <= min_length:
+            for i in case:
+                if not mine >> i & 1:
+                    min_length = len(case)
+                    choice = i
+    # Take the last cell of a line holding all but one of our marks.
+    counts = board.line_counts[board.turn]
+    for line, mask in enumerate(board.geometry.lines):
+        if counts[line] == board.win_length - 1:
+            for i in cells_of(mask):
+                if board.is_free(i):
+                    choice = i
+    return choice
+
+
+def make_random(seed=None):
+    """
+    Builds a player that picks uniformly among the free cells.
+    - seed: The seed of the player's random.Random (None for an unseeded one).
+    """
+    rng = random.Random(seed)
+
+    def random_move(board):
+        moves = board.legal_moves()
+        return rng.choice(moves) if moves else None
+
+    return random_move
+
+
+@lru_cache(maxsize=None)
+def solved_solver():
+    """
+    Returns this process's fully solved solver.Solver, solving it the first time.
+    Once solved, best_move() only reads its table, so every perfect player can share it.
+    """
+    solver = Solver()
+    solver.solve_all()
+    return solver
+
+
+def make_perfect(seed=None):
+    """
+    Builds a perfect 3x3 player backed by the process's solved solver.Solver.
+    It never plays at random, so the seed is ignored.
+    """
+    return solved_solver().best_move
+
+
+# Computer players by name, as factories taking an optional seed, so each process builds its own state.
+# Deterministic players ignore the seed and cost nothing to build again.
+STRATEGIES = {
+    "perfect": make_perfect,
+    "random": make_random,
+    "heuristic": lambda seed=None: heuristic_move,
+    "greedy": lambda seed=None: greedy_move,
+    # A fixed playout budget rather than a time limit, so results do not depend on machine load.
+    "mcts": lambda seed=None: MCTS(time_limit=None, playouts=2000, rng=random.Random(seed)).choose,
+    # The difficulty levels at their full depth, without a time limit for the same reason.
+    "easy": lambda seed=None: make_level("easy", rng=random.Random(seed), time_limit=None).choose,
+    "medium": lambda seed=None: make_level("medium", rng=random.Random(seed), time_limit=None).choose,
+    "hard": lambda seed=None: make_level("hard", rng=random.Random(seed), time_limit=None).choose,
+}
+
+
+def make_player(name, seed=None):
+    """
+    Builds the computer player registered under a name in STRATEGIES.
+    - name: The strategy name, e.g. 'perfect' or 'random'.
+    - seed: The seed of the player's random choices (None for unseeded ones).
+    """
+    if name not in STRATEGIES:
+        raise ValueError(f"unknown strategy {name!r}, expected one of {', '.join(STRATEGIES)}")
+    return STRATEGIES[name](seed)
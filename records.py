@@ -0,0 +1,211 @@
+"""
+Compact game records: the move sequence of a game packed into a few bytes,
+appended to a rolling log file and replayed through the same move logic.
+
+A record is a 3-byte header followed by the packed moves:
+- byte 0: board size in the high 4 bits, win length in the low 4 bits.
+- byte 1: the player who moved first in bit 7, the game mode in bits 0-6.
+- byte 2: the number of moves.
+- then every move as a cell index on just enough bits for the board
+  (4 bits on 3x3, 8 bits on 15x15), packed little-endian.
+A full 3x3 game takes 8 bytes. Records are simply concatenated in the log,
+since the header gives each record's length.
+
+Usage: python records.py games.rec   (prints every game of a log)
+"""
+
+import os
+import sys
+
+from engine import Board, SYMBOLS
+
+# Game modes stored in a record.
+MODE_PVP = 0
+MODE_PVC = 1
+# Ultimate games follow the rules of ultimate.py, which a record cannot replay,
+# so the mode is only used by the statistics store.
+MODE_ULTIMATE = 2
+MODE_NAMES = {MODE_PVP: "pvp", MODE_PVC: "pvc", MODE_ULTIMATE: "ultimate"}
+HEADER_SIZE = 3
+# The largest board a record holds: its size is stored on 4 bits.
+MAX_SIZE = 15
+
+
+def move_width(size):
+    """Returns the number of bits needed to store a cell index of a size x size board."""
+    return max(1, (size * size - 1).bit_length())
+
+
+def can_record(size, win_length):
+    """Returns whether games on a size x size board with this win length fit in a record."""
+    return 1 <= size <= MAX_SIZE and 1 <= win_length <= size
+
+
+class GameRecord:
+    """
+    The moves of one game together with what is needed to replay them:
+    the board size, win length, first player and game mode.
+    """
+    __slots__ = ("size", "win_length", "first_player", "mode", "moves")
+
+    def __init__(self, size, win_length, first_player, mode, moves):
+        if not can_record(size, win_length):
+            raise ValueError(f"cannot record a {size}x{size} board with {win_length} in a row")
+        self.size = size
+        self.win_length = win_length
+        self.first_player = first_player
+        self.mode = mode
+        self.moves = list(moves)
+
+    @classmethod
+    def from_board(cls, board, mode):
+        """
+        Builds the record of the game played so far on an engine.Board.
+        - board: The board, usually at the end of a game.
+        - mode: MODE_PVP or MODE_PVC.
+        """
+        first_player = board.turn ^ len(board.moves) & 1
+        return cls(board.size, board.win_length, first_player, mode, board.moves)
+
+    def encode(self):
+        """Returns the record packed as bytes."""
+        width = move_width(self.size)
+        packed = 0
+        for i, cell in enumerate(self.moves):
+            packed |= cell << i * width
+        header = bytes((self.size << 4 | self.win_length, self.first_player << 7 | self.mode, len(self.moves)))
+        return header + packed.to_bytes((len(self.moves) * width + 7) // 8, "little")
+
+    @classmethod
+    def decode(cls, data, offset=0):
+        """
+        Unpacks one record from bytes and returns (record, offset of the next record).
+        - data: The bytes (or memoryview) holding one or more records.
+        - offset: Where the record starts.
+        """
+        if len(data) - offset < HEADER_SIZE:
+            raise ValueError("truncated game record header")
+        geometry_byte, flags, count = data[offset:offset + HEADER_SIZE]
+        size = geometry_byte >> 4
+        width = move_width(size)
+        start = offset + HEADER_SIZE
+        end = start + (count * width + 7) // 8
+        if end > len(data):
+            raise ValueError("truncated game record")
+        packed = int.from_bytes(data[start:end], "little")
+        mask = (1 << width) - 1
+        moves = [packed >> i * width & mask for i in range(count)]
+        return cls(size, geometry_byte & 15, flags >> 7, flags & 127, moves), end
+
+    def replay(self):
+        """
+        Plays the recorded moves on a new engine.Board and returns it.
+        Raises ValueError if a move is not legal, e.g. in a corrupted record.
+        """
+        board = Board(self.size, self.win_length, self.first_player)
+        for cell in self.moves:
+            if cell >= board.geometry.cells or not board.is_free(cell) or board.is_over():
+                raise ValueError(f"illegal move {cell} after {board.moves}")
+            board.play(cell)
+        return board
+
+
+def iter_records(data):
+    """
+    Yields every record stored back to back in a bytes object.
+    - data: The content of a log file.
+    """
+    offset = 0
+    while offset < len(data):
+        record, offset = GameRecord.decode(data, offset)
+        yield record
+
+
+def read_records(path):
+    """
+    Yields the records of a log file and of its rotated backups, oldest first.
+    - path: The path of the current log file.
+    """
+    backups = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        backups.append(f"{path}.{index}")
+        index += 1
+    names = backups[::-1]
+    if os.path.exists(path):
+        names.append(path)
+    for name in names:
+        with open(name, "rb") as log:
+            yield from iter_records(log.read())
+
+
+class RecordLog:
+    """
+    A rolling log of game records. Records are appended to 'path'; when the
+    file would grow past max_bytes it is renamed to path.1 (path.1 to path.2,
+    and so on) and a new file is started. At most 'backups' old files are kept.
+    """
+
+    def __init__(self, path, max_bytes=1 << 20, backups=5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = open(path, "ab")
+
+    def append(self, record):
+        """
+        Appends one GameRecord to the log, rotating the file first if it is full.
+        - record: The GameRecord to store.
+        """
+        data = record.encode()
+        if self.file.tell() + len(data) > self.max_bytes and self.file.tell():
+            self.rotate()
+        self.file.write(data)
+
+    def rotate(self):
+        """Closes the current file, shifts the backups and starts a new file."""
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, "ab")
+
+    def flush(self):
+        """Writes buffered records to disk."""
+        self.file.flush()
+
+    def close(self):
+        """Flushes and closes the log."""
+        self.file.close()
+
+
+def describe(record):
+    """Returns a one-line, human-readable summary of a record and its result."""
+    board = record.replay()
+    if board.winner is not None:
+        result = f"{SYMBOLS[board.winner]} wins"
+    elif board.is_full():
+        result = "draw"
+    else:
+        result = "unfinished"
+    moves = " ".join(str(cell) for cell in record.moves)
+    return (f"{record.size}x{record.size}/{record.win_length} {MODE_NAMES.get(record.mode, record.mode)} "
+            f"{SYMBOLS[record.first_player]} first: {moves} -> {result}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("usage: python records.py LOG_FILE", file=sys.stderr)
+        return 2
+    for record in read_records(argv[0]):
+        print(describe(record))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
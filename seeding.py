@@ -0,0 +1,29 @@
+"""
+Seeds of the computer players' random number generators, so that runs with a
+seed are reproducible bit for bit.
+
+Every random choice of a player (random moves, MCTS move ordering and
+playouts, the noise of the difficulty levels) is drawn from the player's own
+random.Random, never from the global random module, so players running in
+parallel threads or processes share no state. derive_seed() gives each player
+of each game its own stream from the run's seed, the game's index and the
+player, so one game of a large batch can be replayed alone, whatever the
+number of workers or the size of the chunks the batch was split into.
+"""
+
+import hashlib
+
+
+def derive_seed(seed, *keys):
+    """
+    Returns a 64-bit seed derived from a run's seed and any keys, e.g. a game index
+    and a player slot. The same arguments always give the same seed, on every
+    platform and Python version; different keys give unrelated seeds.
+    Returns None when seed is None, for an unseeded run.
+    - seed: The seed of the run, an int or a str.
+    - keys: Ints or strs identifying the stream.
+    """
+    if seed is None:
+        return None
+    text = ":".join(str(part) for part in (seed, *keys))
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
@@ -0,0 +1,329 @@
+"""
+Networked game server: hosts many concurrent Player vs. Player and Player vs.
+Computer games for clients on the same machine or the LAN, with the headless
+rules of engine.Board and the computer players of players.STRATEGIES.
+It does not import Kivy, so it can run as a backend on its own.
+
+Every message is one JSON object on one line. Requests may carry an "id",
+which is copied into their reply so a client can have several requests in flight.
+
+Requests:
+    {"op": "new", "mode": "pvc", "size": 3, "win_length": 3, "first": "you"}
+        Starts a game against the computer ("first": "computer" lets it open).
+    {"op": "new", "mode": "pvp", "size": 3, "win_length": 3}
+        Joins the oldest PvP game waiting for an opponent on that board,
+        or opens a new one and waits. With "private": true the new game is
+        not offered to others and only a "join" naming it can start it.
+    {"op": "join", "game": 7}
+        Takes the second seat of a waiting PvP game, e.g. a friend's private one.
+    {"op": "move", "game": 7, "cell": 4}
+        Plays a cell (row * size + column) in one of your games.
+    {"op": "leave", "game": 7}
+        Leaves a game; the opponent is told.
+Replies: {"ok": true, "game": 7, "you": "x", "status": ..., "turn": ..., "moves": [...], "winner": ...}
+    status is "waiting", "playing" or "over"; turn is the symbol to move, or null;
+    moves are the cells played by the request (your move, then the computer's reply);
+    winner is the winning symbol, or null (a draw once the status is "over").
+    A request that cannot be served gets {"ok": false, "error": "..."}.
+Events pushed to the other player of a PvP game, without "id":
+    {"event": "start", ...}, {"event": "moved", "cell": 4, ...} and {"event": "left", ...},
+    with the same game, status, turn and winner fields.
+
+Usage: python server.py --host 0.0.0.0 --port 8765 --computer perfect
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+
+from engine import Board, PLAYER1, PLAYER2, SYMBOLS
+from players import STRATEGIES, greedy_move
+
+logger = logging.getLogger(__name__)
+MODES = ("pvc", "pvp")
+# Longest request line in bytes; a longer one is answered with an error and ends the connection.
+LINE_LIMIT = 1 << 16
+# Largest board a client may ask for, as for game records.
+MAX_SIZE = 15
+# Strategies too slow to run on the event loop. They run on a worker thread,
+# with a player built for each move so no state is shared between threads.
+THREADED = {"mcts", "medium", "hard"}
+
+
+class Session:
+    """
+    One game hosted by the server: the board and the connection of each player
+    (None for the computer, or for a PvP seat not taken yet).
+    """
+    __slots__ = ("id", "mode", "board", "writers")
+
+    def __init__(self, game_id, mode, board):
+        self.id = game_id
+        self.mode = mode
+        self.board = board
+        self.writers = [None, None]
+
+    def state(self, player):
+        """
+        Returns the fields describing the game to one of its players.
+        - player: The player index of the receiver.
+        """
+        board = self.board
+        if self.mode == "pvp" and None in self.writers:
+            status = "waiting"
+        else:
+            status = "over" if board.is_over() else "playing"
+        return {
+            "game": self.id,
+            "you": SYMBOLS[player],
+            "status": status,
+            "turn": None if status == "over" else SYMBOLS[board.turn],
+            "winner": None if board.winner is None else SYMBOLS[board.winner],
+        }
+
+
+class RequestError(Exception):
+    """A request that cannot be served; its message is sent back to the client."""
+
+
+def is_int(value):
+    """Returns whether a JSON value is an integer (JSON true and false are not)."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def game_of(request):
+    """Returns the "game" id of a request, which must be a number or a string."""
+    game = request.get("game")
+    if not is_int(game) and not isinstance(game, str):
+        raise RequestError("game must be a game id")
+    return game
+
+
+def send(writer, message):
+    """Writes one JSON line to a client. Delivery is left to the connection's buffer."""
+    writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+
+class GameServer:
+    """
+    The games of every connected client.
+    - computer: The name of the computer player in players.STRATEGIES.
+      'perfect' only solves 3x3 boards; larger boards fall back to greedy_move.
+    """
+
+    def __init__(self, computer="perfect"):
+        if computer not in STRATEGIES:
+            raise ValueError(f"unknown strategy {computer!r}, expected one of {', '.join(STRATEGIES)}")
+        self.computer = computer
+        # The computer player of each (size, win_length), built on first use and shared by all games.
+        self.computers = {}
+        self.sessions = {}
+        self.game_ids = itertools.count(1)
+        # PvP games waiting for a second player, by (size, win_length), oldest first.
+        self.waiting = {}
+        # The ids of the games each connected client plays, left when it disconnects.
+        self.connections = {}
+
+    def computer_for(self, board):
+        """Returns the shared computer player for a board's size and win length."""
+        key = (board.size, board.win_length)
+        player = self.computers.get(key)
+        if player is None:
+            if self.computer == "perfect" and key != (3, 3):
+                player = greedy_move
+            else:
+                player = STRATEGIES[self.computer]()
+            self.computers[key] = player
+        return player
+
+    async def computer_move(self, session):
+        """Plays the computer's move in a PvC game and returns its cell."""
+        board = session.board
+        if self.computer in THREADED:
+            # A fresh player searches a copy of the board on a worker thread.
+            player = STRATEGIES[self.computer]()
+            cell = await asyncio.get_running_loop().run_in_executor(None, player, board.copy())
+        else:
+            cell = self.computer_for(board)(board)
+        board.play(cell)
+        return cell
+
+    def find(self, request, writer):
+        """Returns the session named by a request and the sender's player index in it."""
+        session = self.sessions.get(game_of(request))
+        if session is None or writer not in session.writers:
+            raise RequestError("no such game")
+        return session, session.writers.index(writer)
+
+    async def new_game(self, request, writer):
+        """Handles {"op": "new"}: starts a PvC game or joins or opens a PvP game."""
+        mode = request.get("mode", "pvc")
+        size = request.get("size", 3)
+        win_length = request.get("win_length", 3)
+        if mode not in MODES:
+            raise RequestError(f"mode must be one of {', '.join(MODES)}")
+        if not is_int(size) or not is_int(win_length) \
+                or not 1 <= size <= MAX_SIZE or not 1 <= win_length <= size:
+            raise RequestError(f"board must be 1 to {MAX_SIZE} cells wide, with a win length up to its size")
+        if mode == "pvp":
+            queue = self.waiting.setdefault((size, win_length), [])
+            if not request.get("private"):
+                # The oldest game waiting for an opponent, not counting the sender's own.
+                session = next((waiting for waiting in queue if waiting.writers[PLAYER1] is not writer), None)
+                if session is not None:
+                    return self.seat(session, writer)
+            session = Session(next(self.game_ids), mode, Board(size, win_length))
+            if not request.get("private"):
+                queue.append(session)
+        else:
+            session = Session(next(self.game_ids), mode, Board(size, win_length))
+        # In a PvC game the client plays 'x' and opens, unless the computer opens as 'x'.
+        player = PLAYER2 if mode == "pvc" and request.get("first") == "computer" else PLAYER1
+        session.writers[player] = writer
+        self.sessions[session.id] = session
+        self.connections[writer].add(session.id)
+        moves = []
+        if player == PLAYER2:
+            moves.append(await self.computer_move(session))
+        return {**session.state(player), "moves": moves}
+
+    def seat(self, session, writer):
+        """Gives the second seat of a waiting PvP game to a client, tells the first player and returns the reply."""
+        queue = self.waiting.get((session.board.size, session.board.win_length))
+        if queue and session in queue:
+            queue.remove(session)
+        session.writers[PLAYER2] = writer
+        self.connections[writer].add(session.id)
+        send(session.writers[PLAYER1], {"event": "start", **session.state(PLAYER1)})
+        return {**session.state(PLAYER2), "moves": []}
+
+    async def move(self, request, writer):
+        """Handles {"op": "move"}: plays the sender's cell, then the computer's or the opponent's turn."""
+        session, player = self.find(request, writer)
+        board = session.board
+        cell = request.get("cell")
+        if session.mode == "pvp" and None in session.writers:
+            raise RequestError("waiting for an opponent")
+        if board.is_over():
+            raise RequestError("the game is over")
+        if board.turn != player:
+            raise RequestError("not your turn")
+        if not is_int(cell) or not 0 <= cell < board.geometry.cells or not board.is_free(cell):
+            raise RequestError("illegal move")
+        board.play(cell)
+        moves = [cell]
+        if session.mode == "pvc":
+            if not board.is_over():
+                moves.append(await self.computer_move(session))
+        else:
+            opponent = player ^ 1
+            send(session.writers[opponent], {"event": "moved", "cell": cell, **session.state(opponent)})
+        if board.is_over():
+            self.close(session)
+        return {**session.state(player), "moves": moves}
+
+    def leave(self, session, player):
+        """Removes a player from a game, tells the opponent and ends the game."""
+        opponent = session.writers[player ^ 1]
+        if session.mode == "pvp" and opponent is not None and not session.board.is_over():
+            send(opponent, {"event": "left", **session.state(player ^ 1), "status": "over", "turn": None})
+        self.close(session)
+
+    def close(self, session):
+        """Forgets a finished or abandoned game."""
+        self.sessions.pop(session.id, None)
+        for writer in session.writers:
+            if writer is not None:
+                self.connections[writer].discard(session.id)
+        queue = self.waiting.get((session.board.size, session.board.win_length))
+        if queue and session in queue:
+            queue.remove(session)
+
+    async def dispatch(self, request, writer):
+        """Runs one request and returns its reply."""
+        if not isinstance(request, dict):
+            raise RequestError("a request must be a JSON object")
+        op = request.get("op")
+        if op == "new":
+            return await self.new_game(request, writer)
+        if op == "move":
+            return await self.move(request, writer)
+        if op == "join":
+            session = self.sessions.get(game_of(request))
+            if session is None or session.mode != "pvp" or session.writers[PLAYER2] is not None \
+                    or session.writers[PLAYER1] is writer:
+                raise RequestError("no such game waiting for an opponent")
+            return self.seat(session, writer)
+        if op == "leave":
+            session, player = self.find(request, writer)
+            self.leave(session, player)
+            return {"game": session.id, "status": "over"}
+        raise RequestError(f"unknown op {op!r}")
+
+    async def handle(self, reader, writer):
+        """Serves one client connection until it closes. A client may play any number of games."""
+        self.connections[writer] = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Over LINE_LIMIT: the rest of the line cannot be told from the next
+                    # request, so the connection is answered and closed.
+                    send(writer, {"ok": False, "error": "request too long"})
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    request = None
+                try:
+                    if request is None:
+                        raise RequestError("invalid JSON")
+                    reply = {"ok": True, **await self.dispatch(request, writer)}
+                except RequestError as error:
+                    reply = {"ok": False, "error": str(error)}
+                except Exception:
+                    # A bug or a failing computer player only fails this request, not
+                    # the other games of the connection.
+                    logger.exception("request %r failed", request)
+                    reply = {"ok": False, "error": "internal error"}
+                if isinstance(request, dict) and "id" in request:
+                    reply["id"] = request["id"]
+                send(writer, reply)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in list(self.connections[writer]):
+                session = self.sessions[game_id]
+                self.leave(session, session.writers.index(writer))
+            del self.connections[writer]
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        """Accepts clients until cancelled."""
+        server = await asyncio.start_server(self.handle, host, port, limit=LINE_LIMIT)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host networked Tic-Tac-Toe games over line-delimited JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (0.0.0.0 for the LAN)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port to listen on")
+    parser.add_argument("--computer", choices=sorted(STRATEGIES), default="perfect",
+                        help="computer player of PvC games")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(GameServer(args.computer).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
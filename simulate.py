@@ -0,0 +1,202 @@
+"""
+Headless self-play simulator, the command-line companion of MyKivyApp.
+Plays large numbers of games between two computer players from
+players.STRATEGIES without importing Kivy, spread over every CPU core,
+and streams the results to a JSONL file.
+
+With --seed, every game is reproducible on its own: its players are built
+afresh for it, with random choices seeded from the run's seed, the game's
+index and the player (see seeding.py), so results do not depend on the
+number of workers or the chunk size. Games that raise an error are listed
+by index in their chunk's line, and any game of the batch can be played
+again alone with --replay.
+
+Example:
+    python simulate.py perfect random --games 1000000 --output results.jsonl
+    python simulate.py mcts random --games 100000 --seed 7 --output results.jsonl
+    python simulate.py mcts random --seed 7 --replay 81234   (prints that game's moves)
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from engine import Board, PLAYER1
+from players import STRATEGIES, make_player
+from seeding import derive_seed
+
+
+def play_game(board, players):
+    """
+    Plays one game to the end on a cleared board and returns the winner's
+    player index, or None for a draw.
+    - board: The engine.Board to play on. It is reset first.
+    - players: The move functions of PLAYER1 and PLAYER2, in that order.
+    """
+    board.reset(PLAYER1)
+    while not board.is_over():
+        board.play(players[board.turn](board))
+    return board.winner
+
+
+def game_players(strategy_a, strategy_b, game, seed, alternate):
+    """
+    Builds the players of one seeded game and returns (players, a_index): the move
+    functions of PLAYER1 and PLAYER2, and the index of strategy A among them.
+    - game: The index of the game in the whole run.
+    - seed: The seed of the run.
+    """
+    player_a = make_player(strategy_a, derive_seed(seed, game, "a"))
+    player_b = make_player(strategy_b, derive_seed(seed, game, "b"))
+    a_index = game % 2 if alternate else 0
+    return ((player_a, player_b) if a_index == 0 else (player_b, player_a)), a_index
+
+
+def play_chunk(strategy_a, strategy_b, board_size, win_length, first, games, alternate, seed=None):
+    """
+    Plays a batch of games in a worker process and returns the counts as a dict.
+    Wins, draws and losses are counted from strategy A's point of view.
+    - strategy_a, strategy_b: Names of the two strategies in players.STRATEGIES.
+    - board_size, win_length: The board to play on.
+    - first: The index of the chunk's first game in the whole run.
+    - games: How many games to play.
+    - alternate: If True, A and B take turns at moving first; otherwise A always starts.
+    - seed: The seed of the run. With a seed the players are built again for every
+      game, which then depends on its index only; a game raising an error is
+      counted in "failed" by index instead of stopping the run.
+    """
+    if seed is None:
+        player_a = make_player(strategy_a)
+        player_b = make_player(strategy_b)
+    board = Board(board_size, win_length)
+    wins = draws = losses = moves = 0
+    failed = []
+    for game in range(first, first + games):
+        if seed is None:
+            # Index of A in the (PLAYER1, PLAYER2) order for this game.
+            a_index = game % 2 if alternate else 0
+            players = (player_a, player_b) if a_index == 0 else (player_b, player_a)
+            winner = play_game(board, players)
+        else:
+            players, a_index = game_players(strategy_a, strategy_b, game, seed, alternate)
+            try:
+                winner = play_game(board, players)
+            except Exception:
+                failed.append(game)
+                continue
+        moves += len(board.moves)
+        if winner is None:
+            draws += 1
+        elif winner == a_index:
+            wins += 1
+        else:
+            losses += 1
+    counts = {"games": games - len(failed), "wins": wins, "draws": draws, "losses": losses, "moves": moves}
+    if seed is not None:
+        counts["first"] = first
+        counts["failed"] = failed
+    return counts
+
+
+def replay_game(strategy_a, strategy_b, seed, game, board_size=3, win_length=3, alternate=True):
+    """
+    Plays one game of a seeded run again, alone, and returns its engine.Board:
+    the same moves as in the run, and the same error if it failed there.
+    - seed, game: The seed of the run and the index of the game in it.
+    The other arguments are those of the run.
+    """
+    players, _ = game_players(strategy_a, strategy_b, game, seed, alternate)
+    board = Board(board_size, win_length)
+    play_game(board, players)
+    return board
+
+
+def run(strategy_a, strategy_b, games, output, board_size=3, win_length=3,
+        workers=None, chunk_size=1000, alternate=True, seed=None):
+    """
+    Plays 'games' games between two strategies over a pool of worker processes.
+    Every finished chunk is written to 'output' as one JSON line as soon as it
+    arrives, followed by a summary line. Returns the summary dict.
+    - output: A text file object opened for writing.
+    - workers: Number of worker processes (defaults to every CPU core).
+    - chunk_size: Number of games handed to a worker at a time.
+    - seed: The seed making every game reproducible (see play_chunk), or None.
+    """
+    matchup = {"a": strategy_a, "b": strategy_b, "board_size": board_size, "win_length": win_length}
+    if seed is not None:
+        matchup["seed"] = seed
+    totals = {"games": 0, "wins": 0, "draws": 0, "losses": 0, "moves": 0}
+    failed = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [
+            executor.submit(play_chunk, strategy_a, strategy_b, board_size, win_length,
+                            first, min(chunk_size, games - first), alternate, seed)
+            for first in range(0, games, chunk_size)
+        ]
+        for future in as_completed(futures):
+            counts = future.result()
+            for key in totals:
+                totals[key] += counts[key]
+            failed.extend(counts.get("failed", ()))
+            output.write(json.dumps({**matchup, **counts}) + "\n")
+            output.flush()
+    elapsed = time.perf_counter() - start
+    summary = {
+        "summary": True,
+        **matchup,
+        **totals,
+        "elapsed": round(elapsed, 3),
+        "games_per_second": round(totals["games"] / elapsed, 1) if elapsed else None,
+    }
+    if seed is not None:
+        summary["failed"] = sorted(failed)
+    output.write(json.dumps(summary) + "\n")
+    output.flush()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play headless computer-vs-computer Tic-Tac-Toe games.")
+    parser.add_argument("a", choices=sorted(STRATEGIES), help="first strategy (results are from its point of view)")
+    parser.add_argument("b", choices=sorted(STRATEGIES), help="second strategy")
+    parser.add_argument("--games", type=int, default=10000, help="number of games to play")
+    parser.add_argument("--output", default="-", help="JSONL file to append results to ('-' for stdout)")
+    parser.add_argument("--board-size", type=int, default=3, help="rows and columns of the board")
+    parser.add_argument("--win-length", type=int, default=3, help="marks in a row needed to win")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="games per worker task")
+    parser.add_argument("--no-alternate", action="store_true", help="always let strategy A move first")
+    parser.add_argument("--seed", type=int, default=None, help="seed making every game reproducible")
+    parser.add_argument("--replay", type=int, default=None, metavar="GAME",
+                        help="play game number GAME of the seeded run again and print its moves")
+    args = parser.parse_args(argv)
+    if args.replay is not None:
+        if args.seed is None:
+            parser.error("--replay needs the --seed of the run")
+        board = replay_game(args.a, args.b, args.seed, args.replay, args.board_size, args.win_length,
+                            not args.no_alternate)
+        print(json.dumps({"game": args.replay, "seed": args.seed, "moves": board.moves, "winner": board.winner}))
+        return
+    output = sys.stdout if args.output == "-" else open(args.output, "a")
+    try:
+        summary = run(args.a, args.b, args.games, output, args.board_size, args.win_length,
+                      args.workers, args.chunk_size, not args.no_alternate, args.seed)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(
+        f"{args.a} vs {args.b}: {summary['wins']} wins, {summary['draws']} draws, "
+        f"{summary['losses']} losses in {summary['elapsed']}s "
+        f"({summary['games_per_second']} games/s)",
+        file=sys.stderr,
+    )
+    if summary.get("failed"):
+        print(f"{len(summary['failed'])} games failed, e.g. --replay {summary['failed'][0]}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
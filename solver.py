@@ -0,0 +1,173 @@
+"""
+Perfect-play computer player: a negamax search with alpha-beta pruning and a
+transposition table keyed by the symmetry-canonical board, so each position
+is stored once for all its rotations and reflections. The table can be filled for the whole game tree once
+(solve_all), after which every move is a dictionary lookup.
+
+Scores are from the point of view of the player to move: 0 for a draw, and
+for a decided game 1 + the number of cells still empty when it ends, positive
+if the player to move wins. Faster wins (and slower losses) therefore score
+better, and the distance to the end of the game can be read back from a score.
+"""
+
+from engine import Board, FULL_MASK
+from symmetry import canonical, from_canonical, to_canonical
+
+# Flags telling whether a stored score is exact or only a bound,
+# as produced by an alpha-beta search with a narrowed window.
+EXACT = 0
+LOWER = 1
+UPPER = 2
+# Cells tried first: center, then corners, then edges. Good ordering
+# makes alpha-beta cut off early.
+MOVE_ORDER = (4, 0, 2, 6, 8, 1, 3, 5, 7)
+# Larger than any reachable score.
+INFINITY = 100
+
+
+def board_key(board):
+    """
+    Returns (key, symmetry): the transposition table key of a position and the
+    symmetry that maps the real board onto the canonical one (see symmetry.canonical).
+    Keying on the player to move rather than on 'x'/'o' lets both sides share entries.
+    - board: An engine.Board.
+    """
+    return canonical(board.bits[board.turn], board.bits[board.turn ^ 1])
+
+
+def check_classic(board):
+    """
+    Raises ValueError unless the board is the classic 3x3, 3-in-a-row game,
+    the only one small enough to solve completely.
+    """
+    if (board.size, board.win_length) != (3, 3):
+        raise ValueError(
+            f"the solver only handles the 3x3 board, got {board.size}x{board.size} "
+            f"with {board.win_length} in a row"
+        )
+
+
+class Solver:
+    """
+    Negamax alpha-beta search over an engine.Board, with a transposition table
+    mapping board_key() to (score, flag, best move). The stored best move is in
+    the canonical orientation and is mapped back to the real board on lookup.
+    """
+
+    def __init__(self):
+        self.table = {}
+        # Number of positions visited by search(), and of table lookups and
+        # of those that found an entry, for tuning.
+        self.nodes = 0
+        self.lookups = 0
+        self.hits = 0
+
+    def search(self, board, alpha=-INFINITY, beta=INFINITY):
+        """
+        Returns the negamax score of the position for the player to move.
+        The board is modified with play()/undo() during the search and left unchanged.
+        - board: The engine.Board to search from.
+        - alpha, beta: The search window.
+        """
+        self.nodes += 1
+        taken = board.bits[0] | board.bits[1]
+        # The previous move won: the player to move has lost.
+        if board.winner is not None:
+            return -(9 - taken.bit_count() + 1)
+        if taken == FULL_MASK:
+            return 0
+        key, sym = board_key(board)
+        entry = self.table.get(key)
+        best_move = None
+        self.lookups += 1
+        if entry is not None:
+            self.hits += 1
+            score, flag, best_move = entry
+            best_move = from_canonical(best_move, sym)
+            if flag == EXACT:
+                return score
+            if flag == LOWER:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if alpha >= beta:
+                return score
+        alpha_orig = alpha
+        best = -INFINITY
+        # Try the best move from an earlier search first.
+        moves = [cell for cell in MOVE_ORDER if not taken >> cell & 1]
+        if best_move in moves:
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+        for cell in moves:
+            board.play(cell)
+            score = -self.search(board, -beta, -alpha)
+            board.undo()
+            if score > best:
+                best = score
+                best_move = cell
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+        if best <= alpha_orig:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table[key] = (best, flag, to_canonical(best_move, sym))
+        return best
+
+    def solve_all(self, board=None):
+        """
+        Stores an exact score and best move for every position reachable from
+        the given one (the empty board by default), so best_move() never searches.
+        - board: The engine.Board to start from. It is left unchanged.
+        """
+        if board is None:
+            board = Board()
+        check_classic(board)
+        seen = set()
+
+        def visit():
+            # Symmetric positions have symmetric subtrees, so one of them is enough.
+            key = board_key(board)[0]
+            if key in seen or board.is_over():
+                return
+            seen.add(key)
+            self.solve(board)
+            for cell in board.legal_moves():
+                board.play(cell)
+                visit()
+                board.undo()
+
+        visit()
+
+    def solve(self, board):
+        """
+        Returns (score, best move) for a position that is not over, searching it
+        with a full window if the table only holds a bound. The move is a cell of the real board.
+        - board: The engine.Board to solve. It is left unchanged.
+        """
+        check_classic(board)
+        key, sym = board_key(board)
+        entry = self.table.get(key)
+        self.lookups += 1
+        if entry is None or entry[1] != EXACT:
+            # Drop a bound left by an earlier narrow-window search, so the
+            # full-window search below stores an exact score.
+            self.table.pop(key, None)
+            self.search(board)
+            entry = self.table[key]
+        else:
+            self.hits += 1
+        return entry[0], from_canonical(entry[2], sym)
+
+    def best_move(self, board):
+        """
+        Returns the best cell for the player to move, or None if the game is over.
+        - board: The engine.Board to move on.
+        """
+        if board.is_over():
+            return None
+        return self.solve(board)[1]
@@ -0,0 +1,243 @@
+"""
+Persistent statistics of finished games: for every player of every game, the
+mode, board, result (win, loss or draw) and game length, in an SQLite file.
+Games are queued by record_game(), which never touches the disk, and written
+by a background thread in batches, one transaction per batch, so the UI
+thread never waits on a write. aggregate() and scores() answer queries such
+as wins per player and mode or the average game length.
+No Kivy dependency: the screens report their games to a StatsStore when given one.
+
+Usage: python stats.py stats.db   (prints the totals per mode and player)
+"""
+
+import logging
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+from engine import PLAYER1, PLAYER2
+from records import MODE_NAMES, MODE_PVC, MODE_PVP, MODE_ULTIMATE
+
+# Results stored for each player of a game.
+WIN = "win"
+LOSS = "loss"
+DRAW = "draw"
+# The stored names of the two players of each mode, by player index.
+PLAYER_NAMES = {
+    MODE_PVP: ("player1", "player2"),
+    MODE_PVC: ("player", "computer"),
+    MODE_ULTIMATE: ("player", "computer"),
+}
+logger = logging.getLogger(__name__)
+# Seconds flush() waits between checks that the writer thread is still running.
+WRITER_CHECK_INTERVAL = 0.5
+# Columns aggregate() may group or filter by.
+GROUP_COLUMNS = ("mode", "player", "size", "win_length")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    finished REAL NOT NULL,
+    mode TEXT NOT NULL,
+    player TEXT NOT NULL,
+    result TEXT NOT NULL,
+    moves INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    win_length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_mode_player ON results (mode, player);
+"""
+INSERT = "INSERT INTO results (finished, mode, player, result, moves, size, win_length) VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+
+def result_rows(board, mode, finished=None):
+    """
+    Returns the rows stored for a finished game: one per player, with the result from that player's side.
+    - board: The engine.Board (or ultimate.UltimateBoard) at the end of the game.
+    - mode: MODE_PVP, MODE_PVC or MODE_ULTIMATE.
+    - finished: When the game ended, in seconds since the epoch (default: now).
+    """
+    finished = time.time() if finished is None else finished
+    rows = []
+    for player in (PLAYER1, PLAYER2):
+        if board.winner is None:
+            result = DRAW
+        else:
+            result = WIN if board.winner == player else LOSS
+        rows.append((finished, MODE_NAMES[mode], PLAYER_NAMES[mode][player], result,
+                     len(board.moves), board.size, board.win_length))
+    return rows
+
+
+class StatsStore:
+    """
+    The statistics file and its writer thread.
+    - path: The SQLite file, created if missing.
+    - flush_interval: Longest time in seconds a queued game waits before it is written.
+    - batch_size: Queued rows that are written at once without waiting for the interval.
+    """
+
+    def __init__(self, path, flush_interval=2.0, batch_size=64):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        connection = sqlite3.connect(path)
+        # Write-ahead logging lets queries read while a batch is written, and syncs less often.
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        connection.close()
+        # Rows waiting for the writer thread, with the threading.Event of a flush()
+        # to set once they are written, or None to stop it.
+        self.pending = queue.Queue()
+        # The connection of the thread running the queries, opened on the first one.
+        self.reader = None
+        self.reader_lock = threading.Lock()
+        # Rows lost to write errors (a full or locked disk, a damaged file), which are logged.
+        self.dropped = 0
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    def record_game(self, board, mode):
+        """
+        Queues the result of a finished game for both of its players. Returns at once.
+        - board: The engine.Board (or ultimate.UltimateBoard) at the end of the game.
+        - mode: MODE_PVP, MODE_PVC or MODE_ULTIMATE.
+        """
+        for row in result_rows(board, mode):
+            self.pending.put(row)
+
+    def write_loop(self):
+        """Runs on the writer thread: writes the queued rows in batches until close()."""
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        stopping = False
+        while not stopping:
+            # Wait for a first row, then collect more until the batch is full, the interval
+            # has passed, or a flush() or close() asks for the rows queued so far.
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while isinstance(batch[-1], tuple) and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if isinstance(row, tuple)]
+            if rows:
+                # A failed batch is dropped and logged; the thread goes on with the next
+                # one, so later games are still written and flush() still returns.
+                try:
+                    with connection:
+                        connection.executemany(INSERT, rows)
+                except sqlite3.Error:
+                    self.dropped += len(rows)
+                    logger.exception("could not write %d statistics rows to %s, dropped", len(rows), self.path)
+            for marker in batch:
+                if marker is None:
+                    stopping = True
+                elif isinstance(marker, threading.Event):
+                    marker.set()
+        connection.close()
+
+    def flush(self, timeout=None):
+        """
+        Waits until every game queued so far is written, or dropped after a write error
+        (counted in self.dropped). Raises RuntimeError if the writer thread is not
+        running, and TimeoutError if the games are still queued after 'timeout' seconds.
+        - timeout: The longest wait in seconds, or None to wait as long as the writer runs.
+        """
+        written = threading.Event()
+        self.pending.put(written)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not written.wait(WRITER_CHECK_INTERVAL):
+            if not self.writer.is_alive():
+                raise RuntimeError(f"the statistics writer of {self.path} has stopped")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"statistics still queued after {timeout} seconds")
+
+    def close(self):
+        """Writes the queued games and stops the writer thread."""
+        self.pending.put(None)
+        self.writer.join()
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def query(self, sql, parameters=()):
+        """Runs a read-only query on the caller's thread and returns its rows."""
+        with self.reader_lock:
+            if self.reader is None:
+                self.reader = sqlite3.connect(self.path, check_same_thread=False)
+            return self.reader.execute(sql, parameters).fetchall()
+
+    def aggregate(self, group_by=("mode", "player"), **filters):
+        """
+        Returns the totals of the written games as a list of dicts, one per group, with
+        the group's columns and its games, wins, losses, draws and mean, shortest and
+        longest game length in moves. Call flush() first to include queued games.
+        - group_by: The columns to group by, among GROUP_COLUMNS (() for one overall total).
+        - filters: Only rows with these column values, e.g. mode="pvc", size=3.
+        """
+        for column in (*group_by, *filters):
+            if column not in GROUP_COLUMNS:
+                raise ValueError(f"unknown column {column!r}, expected one of {', '.join(GROUP_COLUMNS)}")
+        columns = ", ".join(group_by)
+        where = " AND ".join(f"{column} = ?" for column in filters)
+        sql = (f"SELECT {columns + ', ' if columns else ''}COUNT(*), SUM(result = 'win'), SUM(result = 'loss'), "
+               f"SUM(result = 'draw'), AVG(moves), MIN(moves), MAX(moves) FROM results"
+               f"{' WHERE ' + where if where else ''}{' GROUP BY ' + columns if columns else ''}"
+               f"{' ORDER BY ' + columns if columns else ''}")
+        totals = []
+        for row in self.query(sql, tuple(filters.values())):
+            games, wins, losses, draws, mean, shortest, longest = row[len(group_by):]
+            if not games:
+                continue
+            totals.append({
+                **dict(zip(group_by, row)),
+                "games": games,
+                "wins": wins,
+                "losses": losses,
+                "draws": draws,
+                "mean_moves": round(mean, 2),
+                "min_moves": shortest,
+                "max_moves": longest,
+            })
+        return totals
+
+    def scores(self, mode, size=None, win_length=None):
+        """
+        Returns the number of wins of each player of a mode, by player index, e.g. to
+        show the scores kept from earlier sessions. Call flush() first to include queued games.
+        - mode: MODE_PVP, MODE_PVC or MODE_ULTIMATE.
+        - size, win_length: Only count games on this board, when given.
+        """
+        filters = {"mode": MODE_NAMES[mode]}
+        if size is not None:
+            filters["size"] = size
+        if win_length is not None:
+            filters["win_length"] = win_length
+        wins = {total["player"]: total["wins"] for total in self.aggregate(("player",), **filters)}
+        return [wins.get(name, 0) for name in PLAYER_NAMES[mode]]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("usage: python stats.py STATS_FILE", file=sys.stderr)
+        return 2
+    store = StatsStore(argv[0])
+    try:
+        for total in store.aggregate(("mode", "player")):
+            print(f"{total['mode']} {total['player']:9} {total['games']:6} games: "
+                  f"{total['wins']} wins, {total['losses']} losses, {total['draws']} draws, "
+                  f"{total['mean_moves']} moves on average")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
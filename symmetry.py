@@ -0,0 +1,70 @@
+"""
+The 8 symmetries of the square board (4 rotations, each optionally mirrored),
+used to store every position once under a canonical orientation.
+The winning lines in engine.WIN_CASES map onto each other under all of them,
+so a position and its rotations/reflections have the same game value.
+"""
+
+from engine import FULL_MASK
+
+
+def dihedral_permutations(size=3):
+    """
+    Returns the 8 cell permutations of a size x size board.
+    perm[cell] is the cell it is moved to; the first one is the identity.
+    - size: The number of rows (and columns) of the board.
+    """
+    perms = []
+    for mirror in (False, True):
+        for quarter_turns in range(4):
+            perm = []
+            for cell in range(size * size):
+                row, col = divmod(cell, size)
+                if mirror:
+                    col = size - 1 - col
+                for _ in range(quarter_turns):
+                    row, col = col, size - 1 - row
+                perm.append(row * size + col)
+            perms.append(perm)
+    return perms
+
+
+# The symmetries of the 3x3 board, and for each the inverse permutation
+# used to map a stored move back to the real orientation.
+PERMUTATIONS = dihedral_permutations(3)
+INVERSES = [[perm.index(cell) for cell in range(9)] for perm in PERMUTATIONS]
+# TRANSFORM[s][bits] is the 9-bit set of cells 'bits' moved by symmetry s.
+# Precomputed so canonicalising a board costs 16 list lookups.
+TRANSFORM = [
+    [sum(1 << perm[i] for i in range(9) if bits >> i & 1) for bits in range(FULL_MASK + 1)]
+    for perm in PERMUTATIONS
+]
+
+
+def canonical(mine, theirs):
+    """
+    Returns (key, symmetry) for a position given as two 9-bit cell sets.
+    key packs the transformed 'mine' in the low 9 bits and 'theirs' above it,
+    and is the smallest such value over the 8 symmetries; symmetry is the
+    index of the transform that produced it.
+    - mine: The cells of the player to move.
+    - theirs: The cells of the opponent.
+    """
+    best_key = None
+    best_sym = 0
+    for sym, table in enumerate(TRANSFORM):
+        key = table[mine] | table[theirs] << 9
+        if best_key is None or key < best_key:
+            best_key = key
+            best_sym = sym
+    return best_key, best_sym
+
+
+def to_canonical(cell, sym):
+    """Maps a cell of the real board to the canonical orientation of symmetry sym."""
+    return PERMUTATIONS[sym][cell]
+
+
+def from_canonical(cell, sym):
+    """Maps a cell of the canonical orientation back to the real board."""
+    return INVERSES[sym][cell]
@@ -0,0 +1,249 @@
+"""
+Solved positions stored in a flat file that is memory-mapped, so looking up a
+move is one array read, many app instances share the same pages and startup
+pays no solver cost.
+
+Positions are numbered in base 3 from the point of view of the player to move:
+digit i (weight 3**i) is 0 if cell i is empty, 1 if the player to move owns it
+and 2 if the opponent does. Every entry is 2 bytes: the best cell (255 when
+there is none) and the score as a signed byte, in the solver's convention
+(0 for a draw, positive if the player to move wins, larger when sooner).
+
+The file starts with a 16-byte header: the magic b"TTTB", a format version,
+the board size, the win length, the layout and the number of entries.
+- DENSE: one entry for every index 0 .. 3**cells - 1, read directly by index.
+  Used for the complete 3x3 table (19683 entries, 39 KB).
+- SPARSE: entries sorted by index, each preceded by its index on a fixed number
+  of bytes, found by binary search. Used as a partial opening book on boards
+  too large to solve, where the score is 0 (unknown).
+
+Usage:
+    python tablebase.py solve tictactoe.tb
+    python tablebase.py book 7 5 book7.tb --depth 1 --playouts 5000
+"""
+
+import argparse
+import mmap
+import os
+import struct
+
+from engine import Board, cells_of
+from mcts import MCTS
+from solver import Solver
+
+MAGIC = b"TTTB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBBI4x")
+ENTRY = struct.Struct("<Bb")
+DENSE = 0
+SPARSE = 1
+# Stored in place of a move when the position has none (game over or unreachable).
+NO_MOVE = 255
+# BASE3[bits] is the base-3 number with digit 1 on every cell set in a 9-bit set.
+BASE3 = [sum(3 ** i for i in range(9) if bits >> i & 1) for bits in range(1 << 9)]
+
+
+def board_index(board):
+    """
+    Returns the base-3 number of a position, from the point of view of the player to move.
+    - board: An engine.Board.
+    """
+    mine = board.bits[board.turn]
+    theirs = board.bits[board.turn ^ 1]
+    if board.geometry.cells == 9:
+        return BASE3[mine] + 2 * BASE3[theirs]
+    return sum(3 ** cell for cell in cells_of(mine)) + sum(2 * 3 ** cell for cell in cells_of(theirs))
+
+
+def index_cells(index, cells):
+    """
+    Returns (mine, theirs), the bitboards of the player to move and of the opponent
+    in the position with the given base-3 number.
+    """
+    mine = theirs = 0
+    for cell in range(cells):
+        index, digit = divmod(index, 3)
+        if digit == 1:
+            mine |= 1 << cell
+        elif digit == 2:
+            theirs |= 1 << cell
+    return mine, theirs
+
+
+def index_bytes(cells):
+    """Returns the number of bytes needed to store a position index of a board with 'cells' cells."""
+    return ((3 ** cells - 1).bit_length() + 7) // 8
+
+
+def write_header(out, size, win_length, layout, count):
+    """Writes the 16-byte file header."""
+    out.write(HEADER.pack(MAGIC, VERSION, size, win_length, layout, count))
+
+
+def solve_entry(solver, mine, theirs):
+    """
+    Returns the (move, score) entry of a 3x3 position given as two bitboards,
+    or (NO_MOVE, 0) if no game can reach it with the player 'mine' to move.
+    """
+    board = Board()
+    lines = board.geometry.lines
+    mine_count = mine.bit_count()
+    theirs_count = theirs.bit_count()
+    # The player to move has as many marks as the opponent or one fewer.
+    if theirs_count - mine_count not in (0, 1) or any(mine & mask == mask for mask in lines):
+        return NO_MOVE, 0
+    if any(theirs & mask == mask for mask in lines):
+        # The opponent's last move won: a loss for the player to move.
+        return NO_MOVE, -(9 - mine_count - theirs_count + 1)
+    if mine_count + theirs_count == 9:
+        return NO_MOVE, 0
+    # Rebuild the position by alternating moves, starting with whoever has more marks
+    # (player index 0 stands for the player to move, 1 for the opponent).
+    # Neither player owns a line, so no intermediate position is over either.
+    order = [cells_of(mine), cells_of(theirs)]
+    board.reset(1 if theirs_count > mine_count else 0)
+    while order[0] or order[1]:
+        board.play(order[board.turn].pop())
+    score, move = solver.solve(board)
+    return move, score
+
+
+def build_tablebase(path, solver=None):
+    """
+    Solves every 3x3 position and writes the dense table to 'path'.
+    The file is written next to its destination and renamed into place, so
+    other processes never see a half-written table.
+    - solver: An optional solver.Solver whose table can be reused.
+    """
+    solver = solver or Solver()
+    count = 3 ** 9
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as out:
+        write_header(out, 3, 3, DENSE, count)
+        for index in range(count):
+            move, score = solve_entry(solver, *index_cells(index, 9))
+            out.write(ENTRY.pack(move, score))
+    os.replace(temp, path)
+
+
+def build_opening_book(path, size, win_length, depth, choose):
+    """
+    Writes a sparse opening book for a board too large to solve, covering
+    every position reachable within 'depth' moves of the empty board
+    (with either player starting).
+    - choose: A function taking an engine.Board and returning the move to store,
+      e.g. the choose method of an mcts.MCTS with a generous budget.
+    """
+    entries = {}
+    board = Board(size, win_length)
+
+    def visit(remaining):
+        index = board_index(board)
+        if index not in entries and not board.is_over():
+            entries[index] = choose(board)
+        if remaining and not board.is_over():
+            for cell in board.legal_moves():
+                board.play(cell)
+                visit(remaining - 1)
+                board.undo()
+
+    visit(depth)
+    key_bytes = index_bytes(board.geometry.cells)
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as out:
+        write_header(out, size, win_length, SPARSE, len(entries))
+        for index in sorted(entries):
+            out.write(index.to_bytes(key_bytes, "little"))
+            out.write(ENTRY.pack(entries[index], 0))
+    os.replace(temp, path)
+
+
+class Tablebase:
+    """
+    Read-only, memory-mapped view of a table or opening book file.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as source:
+            self.data = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, self.win_length, self.layout, self.count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} tablebase file")
+        cells = self.size * self.size
+        self.key_bytes = index_bytes(cells)
+        self.record_size = ENTRY.size if self.layout == DENSE else self.key_bytes + ENTRY.size
+        if len(self.data) != HEADER.size + self.count * self.record_size:
+            raise ValueError(f"{path} is truncated")
+        # Number of lookups, and of those that found the position, for tuning.
+        self.lookups = 0
+        self.hits = 0
+
+    def lookup(self, board):
+        """
+        Returns (move, score) for the board's position, with move None if it has
+        no move, or None if the position is not in the file.
+        - board: An engine.Board of the file's size and win length.
+        """
+        self.lookups += 1
+        if (board.size, board.win_length) != (self.size, self.win_length):
+            return None
+        index = board_index(board)
+        if self.layout == DENSE:
+            if index >= self.count:
+                return None
+            move, score = ENTRY.unpack_from(self.data, HEADER.size + index * ENTRY.size)
+        else:
+            offset = self._find(index)
+            if offset is None:
+                return None
+            move, score = ENTRY.unpack_from(self.data, offset + self.key_bytes)
+        self.hits += 1
+        return (None if move == NO_MOVE else move), score
+
+    def _find(self, index):
+        """Binary search of a sparse file; returns the offset of the record for index, or None."""
+        low, high = 0, self.count
+        key_bytes = self.key_bytes
+        while low < high:
+            middle = (low + high) // 2
+            offset = HEADER.size + middle * self.record_size
+            key = int.from_bytes(self.data[offset:offset + key_bytes], "little")
+            if key == index:
+                return offset
+            if key < index:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def best_move(self, board):
+        """Returns the stored move for the board's position, or None if there is none."""
+        entry = self.lookup(board)
+        return None if entry is None else entry[0]
+
+    def close(self):
+        """Unmaps the file."""
+        self.data.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build tablebase and opening book files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    solve = commands.add_parser("solve", help="solve every 3x3 position into a dense table")
+    solve.add_argument("path")
+    book = commands.add_parser("book", help="build an MCTS opening book for a larger board")
+    book.add_argument("size", type=int)
+    book.add_argument("win_length", type=int)
+    book.add_argument("path")
+    book.add_argument("--depth", type=int, default=1, help="number of opening moves covered")
+    book.add_argument("--playouts", type=int, default=5000, help="MCTS playouts per position")
+    args = parser.parse_args(argv)
+    if args.command == "solve":
+        build_tablebase(args.path)
+    else:
+        build_opening_book(args.path, args.size, args.win_length, args.depth,
+                           lambda board: MCTS(time_limit=None, playouts=args.playouts).choose(board))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
+import os
+import random
+import threading
+import time
 from kivy.app import App
-from kivy.uix.textinput import TextInput
-from kivy.core.window import Window
 from kivy.uix.label import Label
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.boxlayout import BoxLayout
@@ -9,10 +11,51 @@ from kivy.uix.button import Button
 from kivy.uix.widget import Widget
 from kivymd.color_definitions import colors
 from kivy.uix.popup import Popup
+from kivy.uix.slider import Slider
+from kivy.properties import BooleanProperty, NumericProperty, StringProperty
+from kivy.clock import Clock
+from kivy.logger import Logger
+from engine import Board, PLAYER1, PLAYER2, SYMBOLS, cells_of
+from records import GameRecord, RecordLog, MODE_PVP, MODE_PVC, MODE_ULTIMATE, MAX_SIZE, can_record
+from board_view import BoardView, CELL_BACKGROUND
+from hints import HintTracker, WIN, BLOCK, FORK, hint_changes
+from history import MoveHistory
+from stats import StatsStore
+from metrics import Metrics, PLAYER_MOVE, COMPUTER_MOVE, CHECK_WINNER, MoveStats, instrumented, search_counters
+# Importing kivy.uix.textinput opens the Kivy window, and the computer's AI
+# (solver, mcts, tablebase, evaluator, ultimate) is only used against the computer, so these
+# are imported where they are needed, when a game screen is first built.
+# Importing this module is then cheap and has no side effects on the window.
+
+# Background of the cells suggested by the move hints (see hints.py), by kind of hint.
+HINT_COLORS = {
+    WIN: colors["LightGreen"]["100"],
+    BLOCK: colors["Red"]["100"],
+    FORK: colors["Amber"]["100"],
+}
+
+
+def log_game(record_log, board, mode):
+    """
+    Appends a finished game to the record log. Boards larger than a record holds
+    (records.MAX_SIZE) are played but not logged, with a warning.
+    """
+    if not can_record(board.size, board.win_length):
+        Logger.warning(f"Records: {board.size}x{board.size} games are larger than {MAX_SIZE}x{MAX_SIZE}, not recorded")
+        return
+    record_log.append(GameRecord.from_board(board, mode))
+
+
+def redraw_cells(board_view, board, mask):
+    """Redraws the mark of the cells of a bitmask as they are on the board, e.g. after a MoveHistory jump."""
+    for cell in cells_of(mask):
+        if board.bits[PLAYER1] >> cell & 1:
+            board_view.set_mark(cell, SYMBOLS[PLAYER1], colors["Blue"]["800"])
+        elif board.bits[PLAYER2] >> cell & 1:
+            board_view.set_mark(cell, SYMBOLS[PLAYER2], colors["Pink"]["800"])
+        else:
+            board_view.remove_mark(cell)
 
-# Set a background color for the entire window
-Window.clearcolor = (0.9, 0.9, 0.9, 1) # A light gray color
-Window.size = (1000, 680) # Set the window size to 800x400 pixels
 
 # This class defines the layout and functionality for the initial screen.
 # It inherits from BoxLayout, arranging its children widgets vertically or horizontally.
@@ -21,8 +64,9 @@ class InitialScreen(BoxLayout):
     The initial screen widget that presents the user with game mode choices:
     - Player vs. Computer
     - Player vs. Player
+    - Ultimate (9x9) against the computer, when switch_ultimate_mode is given
     """
-    def __init__(self, switch_player_vs_player_mode, switch_player_computer_mode, **kwargs):
+    def __init__(self, switch_player_vs_player_mode, switch_player_computer_mode, switch_ultimate_mode=None, **kwargs):
         super().__init__(**kwargs)
         # Set the main layout to be vertical with significant padding and spacing
         # to center the content.
@@ -32,8 +76,8 @@ class InitialScreen(BoxLayout):
         # Use an AnchorLayout to center the button grid within the available space.
         self.anchorlayout = AnchorLayout(anchor_x='center', anchor_y='center')
         # A GridLayout to hold the mode selection buttons.
-        # It's configured with 3 columns to allow for spacing.
-        self.buttons_gridlayout = GridLayout(cols=3, size_hint_y=None, spacing=30)
+        # It's configured with a column per button and an empty one between buttons to allow for spacing.
+        self.buttons_gridlayout = GridLayout(cols=3 if switch_ultimate_mode is None else 5, size_hint_y=None, spacing=30)
         # first button
         play_vs_computer_mode_button = Button(
             text="player vs compute",
@@ -58,30 +102,101 @@ class InitialScreen(BoxLayout):
         # Binds the button's 'on_release' event to the function that switches to Player vs. Player mode.
         player_vs_player_mode_button.bind(on_release = switch_player_vs_player_mode)
         self.buttons_gridlayout.add_widget(player_vs_player_mode_button)
+        # third button, for the ultimate variant
+        if switch_ultimate_mode is not None:
+            self.buttons_gridlayout.add_widget(Widget())
+            ultimate_mode_button = Button(
+                text="ultimate",
+                size_hint=(None, None),
+                size=(140, 40),
+                background_normal="",
+                background_color=colors["DeepPurple"]["500"]
+            )
+            # Binds the button's 'on_release' event to the function that switches to the Ultimate mode.
+            ultimate_mode_button.bind(on_release = switch_ultimate_mode)
+            self.buttons_gridlayout.add_widget(ultimate_mode_button)
         # Add the grid of buttons to the anchor layout, and then the anchor layout to the main screen.
         self.anchorlayout.add_widget(self.buttons_gridlayout)
         self.add_widget(self.anchorlayout)
 
+# This class shows the latest instrumentation figures next to the score fields.
+class StatsOverlay(Label):
+    """
+    A small text overlay showing the last measured player move, result check
+    and computer move, with the computer's node count and cache hit rate.
+    - metrics: The metrics.Metrics to follow.
+    """
+    def __init__(self, metrics, **kwargs):
+        super().__init__(color=(0.3, 0.3, 0.3, 1), font_size=14, halign="left", valign="top",
+                         size_hint=(None, None), size=(170, 80), text_size=(170, 80), **kwargs)
+        # The last MoveStats of each phase, in display order.
+        self.latest = {PLAYER_MOVE: None, CHECK_WINNER: None, COMPUTER_MOVE: None}
+        metrics.subscribe(self.show)
+    def show(self, stats):
+        """Updates the text with a new measurement. Called on the UI thread."""
+        self.latest[stats.phase] = stats
+        lines = []
+        for phase, label in ((PLAYER_MOVE, "move"), (CHECK_WINNER, "check"), (COMPUTER_MOVE, "AI")):
+            latest = self.latest[phase]
+            if latest is not None:
+                lines.append(f"{label} {latest.seconds * 1000:.2f} ms")
+        computer = self.latest[COMPUTER_MOVE]
+        if computer is not None:
+            hit_rate = "-" if computer.hit_rate is None else f"{computer.hit_rate:.0%}"
+            lines.append(f"{computer.nodes} nodes, {hit_rate} hits")
+        self.text = "\n".join(lines)
+
 # This class defines the layout and game logic for the Player vs. Player mode.
 class FirstScreen(BoxLayout):
     """
     The main game screen widget for a two-player (human vs. human) game.
-    It handles the game board, player turns, win/draw detection, and game controls.
+    It handles the game board, player turns, win/draw detection, the move history
+    (undo, redo and jumps to any move) and game controls.
     """
-    def __init__(self, switch_game, switch_back, **kwargs):
+    def __init__(self, switch_game, switch_back, board_size=3, win_length=3, record_log=None,
+                 metrics=None, show_stats=False, stats_store=None, hints=False, **kwargs):
+        from kivy.uix.textinput import TextInput
         super().__init__(**kwargs)
+        # The metrics.Metrics that player moves and result checks are reported to (None to not measure).
+        self.metrics = metrics
         # Set the main layout to be horizontal, allowing the game board and scoreboard to be side-by-side.
         self.orientation = "horizontal"
         self.padding = 20
         self.spacing = 10
         # A vertical BoxLayout to contain the game grid and the control buttons below it.
-        self.game_boxlayout = BoxLayout(orientation = "vertical", padding = 50, spacing = 10)
-        # GridLayout for the 3x3 Tic-Tac-Toe board cells.
-        self.textInput_gridlayout = GridLayout(cols=3)
-        self.game_boxlayout.add_widget(self.textInput_gridlayout)
-        # GridLayout for the control buttons (restart, switch, back).
-        # It's configured with 3 columns.
-        self.buttons_gridlayout = GridLayout(cols=3, size_hint_y=None, height=50,padding=(30,10) ,spacing=10)
+        self.game_boxlayout = BoxLayout(orientation = "vertical", padding = (50, 25), spacing = 10)
+        # The game board, drawn on the canvas of a single widget. Touching a cell calls 'player_move'.
+        # The board area stays 480 pixels wide: 3 cells of 160 pixels on the classic board.
+        self.board_view = BoardView(board_size, 480 // board_size, self.player_move)
+        self.game_boxlayout.add_widget(self.board_view)
+        # The move history below the board, as wide as it: 'undo' and 'redo' step
+        # through it one move at a time, and the slider jumps to any move.
+        self.history_boxlayout = BoxLayout(size_hint=(None, None), size=(self.board_view.width, 40), spacing=10)
+        undo_button = Button(
+            text="undo",
+            size_hint=(None, None),
+            size=(80, 40),
+            background_normal="",
+            background_color=colors["Indigo"]["500"]
+        )
+        undo_button.bind(on_release = self.undo_move)
+        self.history_boxlayout.add_widget(undo_button)
+        self.history_slider = Slider(min=0, max=0, value=0, step=1)
+        self.history_slider.bind(value = self.on_history_slider)
+        self.history_boxlayout.add_widget(self.history_slider)
+        redo_button = Button(
+            text="redo",
+            size_hint=(None, None),
+            size=(80, 40),
+            background_normal="",
+            background_color=colors["Indigo"]["500"]
+        )
+        redo_button.bind(on_release = self.redo_move)
+        self.history_boxlayout.add_widget(redo_button)
+        self.game_boxlayout.add_widget(self.history_boxlayout)
+        # GridLayout for the control buttons (restart, hints, switch, back).
+        # It's configured with 4 columns.
+        self.buttons_gridlayout = GridLayout(cols=4, size_hint_y=None, height=50,padding=(30,10) ,spacing=10)
         # 'Restart' button to start a new game in the current mode.
         restart_button = Button(
             text="restart",
@@ -93,6 +208,16 @@ class FirstScreen(BoxLayout):
         # Binds the button's 'on_release' event to this class's 'restart' method.
         restart_button.bind(on_release = self.restart)
         self.buttons_gridlayout.add_widget(restart_button)
+        # Button turning the move hints on and off.
+        self.hints_button = Button(
+            text="hints on" if hints else "hints off",
+            size_hint=(None, None),
+            size=(80, 40),
+            background_normal="",
+            background_color=colors["Teal"]["600"]
+        )
+        self.hints_button.bind(on_release = self.toggle_hints)
+        self.buttons_gridlayout.add_widget(self.hints_button)
         # 'Switch' button to change to the other game mode (e.g., PvP to PvC).
         # The actual switch logic is handled by the main app class.
         switch_game_button = Button(
@@ -121,6 +246,10 @@ class FirstScreen(BoxLayout):
         self.add_widget(self.game_boxlayout)
         # An AnchorLayout to center the scoreboard on the right side of the screen.
         self.anchorlayout = AnchorLayout(anchor_x='center', anchor_y='center')
+        # The stats.StatsStore finished games are saved to (None to not keep statistics),
+        # and the wins of each player, by player index, kept from earlier sessions.
+        self.stats_store = stats_store
+        self.scores = stats_store.scores(MODE_PVP, board_size, win_length) if stats_store is not None else [0, 0]
         # A GridLayout to organize the score labels and text inputs.
         self.scours_gridlayout = GridLayout(cols=2, size_hint=(None, None), spacing=(90,0))
         # Label and TextInput for Player 1's score.
@@ -139,7 +268,7 @@ class FirstScreen(BoxLayout):
                 foreground_color=(0,0,1,3),
                 background_color=(.90, .90, .90, 1) # A very light gray
         )
-        self.player1_scour_textinput.text = "0"
+        self.player1_scour_textinput.text = str(self.scores[PLAYER1])
         self.scours_gridlayout.add_widget(self.player1_scour_textinput)
         # Label and TextInput for Player 2's score.
         self.player2_scour_labe = Label(text="Player 2 (O) Score", color=(0,0,1,3),font_size=22) # Black text
@@ -157,197 +286,322 @@ class FirstScreen(BoxLayout):
                 foreground_color=(0,0,1,3),
                 background_color=(.90, .90, .90, 1) # A very light gray
         )
-        self.player2_scour_textinput.text = "0"
+        self.player2_scour_textinput.text = str(self.scores[PLAYER2])
         self.scours_gridlayout.add_widget(self.player2_scour_textinput)
+        # Optionally, the latest timings below the scores.
+        if show_stats and metrics is not None:
+            self.scours_gridlayout.add_widget(Label(text="Stats", color=(0,0,1,3), font_size=22))
+            self.scours_gridlayout.add_widget(StatsOverlay(metrics))
         # Add the scoreboard layout to the anchor layout, and then to the main screen.
         self.anchorlayout.add_widget(self.scours_gridlayout)
         self.add_widget(self.anchorlayout)
-        # Define all possible winning combinations (rows, columns, diagonals).
-        # Each set represents positions that form a winning line
-        self.win_cases = [
-                     {0, 1, 2}, {3, 4, 5}, {6, 7, 8},# Horizontal wins
-                     {0, 3, 6}, {1, 4, 7}, {2, 5, 8},# Vertical wins
-                     {0, 4, 8}, {2, 4, 6}# Diagonal wins
-                    ]
-        # A list to track available positions on the board (0-8).
-        # When a cell is taken, its number is removed from this list.
-        self.available_cases = [0,1,2,3,4,5,6,7,8]
-        # A list to hold the 9 TextInput widgets that form the game grid.
-        self.listEntries = []
+        # The headless game state: cells owned by each player, whose turn it is and the result.
+        # Player 1 plays 'x' and Player 2 plays 'o'.
+        self.board = Board(board_size, win_length)
+        # Every move is played through the history, so moves can be taken back and played again.
+        self.history = MoveHistory(self.board)
         # A boolean flag to prevent moves after the game has concluded.
         self.gameOver = False
-        # Sets to track the moves made by each player.
-        self.player1_moves = set()
-        self.player2_moves = set()
         # Define symbols for each player.
-        self.player1_symbol = "x"
-        self.player2_symbol = "o"
-        # Keep track of whose turn it is, starting with player 1.
-        self.turn = self.player1_symbol
-        # Initialize the game board by creating and adding the TextInput cells.
-        self.display_board()
-    def display_board(self):
-        """
-        Creates and populates the 3x3 grid with TextInput widgets.
-        Each TextInput acts as a cell on the Tic-Tac-Toe board.
-        """
-        # Create 9 TextInput widgets for the 3x3 grid.
-        for _ in range(9):
-            txtInput = TextInput(
-                halign="center",
-                readonly=True,
-                size_hint=(None,None),
-                font_size=100,
-                size=(160,160),
-                cursor_color=(1, 1, 1, 1),
-                background_color=(1, 1, 1, 1), # White background for cells
-                multiline=False
-            )
-            # Binds the 'on_touch_down' event of each cell to the 'player_move' method.
-            # This is how the game registers a player's click.
-            txtInput.bind(on_touch_down=self.player_move) # Bind click event to player_move function
-            self.listEntries.append(txtInput) # Add to list for later reference
-            self.textInput_gridlayout.add_widget(txtInput)
-    def player_move(self,instance,touch):
-        """
-        Handles the logic when a player clicks on a cell.
-        - instance: The TextInput widget that was touched.
-        - touch: The touch event information (e.g., position).
-        """
-        # Ignore clicks if the game is over or if the click is not on a cell.
-        # Also ensures the touch is within the widget's boundaries.
-        if instance not in self.listEntries or self.gameOver:
+        self.player1_symbol = SYMBOLS[PLAYER1]
+        self.player2_symbol = SYMBOLS[PLAYER2]
+        # Optional hints for the player to move: cells that win, block the opponent's win or
+        # create a fork, kept up to date move by move, and the hints currently highlighted.
+        self.hints_on = hints
+        self.hint_tracker = HintTracker(self.board)
+        self.shown_hints = (0, 0, 0)
+        # The records.RecordLog finished games are appended to (None to not record),
+        # and a flag telling that the moves on the board come from a replayed record.
+        self.record_log = record_log
+        self.replaying = False
+        # The popup announcing the result, created for the first result and then reused,
+        # and the cells highlighted with the result and their colour.
+        self.result_popup = None
+        self.result_highlight = ((), CELL_BACKGROUND)
+    def player_move(self, cell):
+        """
+        Handles the logic when a player touches a cell of the board.
+        - cell: The index of the touched cell (row * N + column).
+        """
+        # Ignore touches if the game is over.
+        if self.gameOver:
             return
-        # Check if the touch event occurred within the bounds of the TextInput widget.
-        if instance.collide_point(*touch.pos):
-            # Find the index of this widget in our list (0-8 for the 3x3 grid)
-            player_choice = self.listEntries.index(instance)
-            # Ignore the move if the chosen cell is already taken.
-            if int(player_choice) not in self.available_cases :
-                return
-            # Handle Player 1's turn.
-            if self.turn == self.player1_symbol and int(player_choice) in self.available_cases:
-                 self.player1_moves.add(int(player_choice))
-                 # Update the visual representation of the move
-                 instance.readonly=False
-                 instance.text = self.player1_symbol
-                 instance.foreground_color = colors["Blue"]["800"] # Player 1 color
-                 instance.readonly=True
-                 # Remove the chosen cell from the list of available spots.
-                 self.available_cases.remove(int(player_choice))
-                 # Check if this move results in a win.
-                 self.check_winner(self.player1_symbol)
-                 # Switch the turn to Player 2.cursor_color=(1, 1, 1, 1)
-                 self.turn = self.player2_symbol
-                 return
-            # Handle Player 2's turn.
-            if self.turn == self.player2_symbol and int(player_choice) in self.available_cases:
-                 self.player2_moves.add(int(player_choice))
-                 # Update the visual representation of the move
-                 instance.readonly=False
-                 instance.text = self.player2_symbol
-                 instance.foreground_color = colors["Pink"]["800"] # Player 2 color
-                 instance.readonly=True
-                 # Remove the chosen cell from the list of available spots.
-                 self.available_cases.remove(int(player_choice))
-                 # Check if this move results in a win.
-                 self.check_winner(self.player2_symbol)
-                 # Switch the turn to Player 1.
-                 self.turn = self.player1_symbol
-                 return
-    def check_winner(self,player_symbol):
+        self.play_cell(cell)
+    @instrumented(PLAYER_MOVE)
+    def play_cell(self, player_choice):
+        """
+        Plays the current player's move on a cell. Used by touches and by automated input.
+        - player_choice: The cell index (row * N + column).
+        """
+        # Ignore the move if the game is over or the chosen cell is already taken.
+        if self.gameOver or not self.board.is_free(player_choice):
+            return
+        # Handle Player 1's turn.
+        if self.board.turn == PLAYER1:
+             # Record the move; the board also switches the turn to Player 2.
+             self.history.play(player_choice)
+             self.hint_tracker.played(self.board, player_choice)
+             # Update the visual representation of the move
+             self.board_view.set_mark(player_choice, self.player1_symbol, colors["Blue"]["800"]) # Player 1 color
+             # Update the hints before the result check, which may highlight the winning line over them.
+             self.refresh_hints()
+             # Check if this move results in a win.
+             self.check_winner(self.player1_symbol)
+             self.update_history_slider()
+             return
+        # Handle Player 2's turn.
+        if self.board.turn == PLAYER2:
+             # Record the move; the board also switches the turn to Player 1.
+             self.history.play(player_choice)
+             self.hint_tracker.played(self.board, player_choice)
+             # Update the visual representation of the move
+             self.board_view.set_mark(player_choice, self.player2_symbol, colors["Pink"]["800"]) # Player 2 color
+             # Update the hints before the result check, which may highlight the winning line over them.
+             self.refresh_hints()
+             # Check if this move results in a win.
+             self.check_winner(self.player2_symbol)
+             self.update_history_slider()
+             return
+    @instrumented(CHECK_WINNER)
+    def check_winner(self,player_symbol, record=True):
         """
         Checks if the most recent move resulted in a win or a draw.
-        - player_symbol: The symbol ('x' or 'o') of the player to check.
+        - player_symbol: The symbol ('x' or 'o') of the player who just moved.
+        - record: Whether to record a finished game; False when it is reached again from the history.
         """
-        # Check for a draw condition: if no cells are available and no one has won yet.
-        if len(self.available_cases) == 0:
+        # The board records the winner and the completed line as soon as a move wins.
+        if self.board.winner is not None:
+            # Highlight the winning combination of cells.
+            self.result_highlight = (cells_of(self.board.win_mask), colors["LightGreen"]["200"])
+            self.board_view.set_backgrounds(*self.result_highlight)
+            # Set the game over flag to prevent further moves.
+            self.gameOver = True
+            # Show a popup message announcing the winner.
+            self.show_result(f"{player_symbol} win!")
+            # Count the win and show the new score.
+            self.scores[self.board.winner] += 1
+            if player_symbol == self.player1_symbol:
+                self.player1_scour_textinput.readonly=False
+                self.player1_scour_textinput.text = str(self.scores[PLAYER1])
+                self.player1_scour_textinput.readonly=True
+            else:
+                self.player2_scour_textinput.readonly=False
+                self.player2_scour_textinput.text = str(self.scores[PLAYER2])
+                self.player2_scour_textinput.readonly=True
+            if record:
+                self.record_game()
+            return
+        # Check for a draw condition: all cells are taken and no one has won.
+        if self.board.is_draw():
             # Highlight all cells to indicate a draw.
-            for ent in self.listEntries:
-                ent.cursor_color = colors["LightBlue"]["200"]
-                ent.background_color = colors["LightBlue"]["200"] # Use a light green for draw
-            popup = Popup(
-                    title = "it's draw!",
-                    size_hint=(None,None),
-                    size=(200,100),
-                    # auto_dismiss=False
-            )
-            popup.open()
+            self.result_highlight = (range(self.board.geometry.cells), colors["LightBlue"]["200"])
+            self.board_view.set_backgrounds(*self.result_highlight)
+            self.gameOver = True
+            self.show_result("it's draw!")
+            if record:
+                self.record_game()
+    def take_back_result(self):
+        """
+        Un-counts the result of the finished game when its final position is left, so
+        moves can be taken back and the game played on. The game stays in the record
+        log and the statistics, which only ever append.
+        """
+        if self.board.winner is not None:
+            self.scores[self.board.winner] -= 1
+            score_textinput = (self.player1_scour_textinput, self.player2_scour_textinput)[self.board.winner]
+            score_textinput.readonly=False
+            score_textinput.text = str(self.scores[self.board.winner])
+            score_textinput.readonly=True
+        self.board_view.set_backgrounds(self.result_highlight[0], CELL_BACKGROUND)
+        self.result_highlight = ((), CELL_BACKGROUND)
+        self.gameOver = False
+    def toggle_hints(self, event=None):
+        """
+        Turns the move hints on or off.
+        - event: The event object passed from the button press, if any.
+        """
+        self.hints_on = not self.hints_on
+        self.hints_button.text = "hints on" if self.hints_on else "hints off"
+        self.refresh_hints()
+    def refresh_hints(self):
+        """
+        Highlights the hints of the player to move (see hints.py), or removes them when
+        hints are off or the game is over. Only the cells whose hint changed are recoloured.
+        """
+        hints = (0, 0, 0)
+        if self.hints_on and not self.board.is_over():
+            hints = self.hint_tracker.hints(self.board)
+        for mask, kind in hint_changes(self.shown_hints, hints):
+            self.board_view.set_backgrounds(cells_of(mask), CELL_BACKGROUND if kind is None else HINT_COLORS[kind])
+        self.shown_hints = hints
+    def undo_move(self, event=None):
+        """
+        Takes back the last move.
+        - event: The event object passed from the button press, if any.
+        """
+        self.jump_to_move(len(self.board.moves) - 1)
+    def redo_move(self, event=None):
+        """
+        Plays the last move taken back again.
+        - event: The event object passed from the button press, if any.
+        """
+        self.jump_to_move(len(self.board.moves) + 1)
+    def jump_to_move(self, index):
+        """
+        Shows the position after 'index' moves of the history, taking moves back or
+        playing them again one at a time when it is only a few moves away, else
+        restoring it from its snapshot (see history.MoveHistory.jump); only the
+        cells that change are redrawn.
+        Playing a new move from an earlier position forgets the moves after it.
+        A finished game can be taken back too: leaving its final position un-counts
+        the result (see take_back_result), so the players can play on from any earlier
+        position, and coming back to it counts the result again without recording
+        the game twice.
+        - index: The move number, 0 for the empty board (clamped to the history).
+        """
+        index = max(0, min(index, len(self.history)))
+        if index == len(self.board.moves):
             return
-        # Determine which player's moves to check.
-        if player_symbol == self.player2_symbol:
-            player_moves = self.player2_moves
-        else:
-            player_moves = self.player1_moves
-        # Iterate through all predefined winning combinations.
-        for case in self.win_cases:
-            # A win occurs if all positions in a winning case are in the player's moves.
-            if case <= player_moves:  # check if all elements of case are in player_moves
-                # Highlight the winning combination of cells.
-                for i in case:
-                    self.listEntries[i].cursor_color = colors["LightGreen"]["200"]
-                    self.listEntries[i].background_color = colors["LightGreen"]["200"]
-                # Set the game over flag to prevent further moves.
-                self.gameOver = True
-                # Show a popup message announcing the winner.
-                popup = Popup(
-                    title = f"{player_symbol} win!",
-                    size_hint=(None,None),
-                    size=(200,100),
-                    # auto_dismiss=False
-                )
-                popup.open()
-                if player_symbol == self.player1_symbol:
-                    self.player1_scour_textinput.readonly=False
-                    self.player1_scour_textinput.text = str(int(self.player1_scour_textinput.text) + 1)
-                    self.player1_scour_textinput.readonly=True
+        if self.gameOver:
+            self.take_back_result()
+        if self.history.walk_is_cheaper(index):
+            # A few moves away: take them back or play them again one at a time.
+            for cell, forward in self.history.steps(index):
+                if forward:
+                    self.hint_tracker.played(self.board, cell)
+                    symbol = SYMBOLS[self.board.turn ^ 1]
+                    self.board_view.set_mark(cell, symbol, colors["Blue"]["800"] if symbol == "x" else colors["Pink"]["800"])
                 else:
-                    self.player2_scour_textinput.readonly=False
-                    self.player2_scour_textinput.text = str(int(self.player2_scour_textinput.text) + 1)
-                    self.player2_scour_textinput.readonly=True
+                    self.hint_tracker.undone(self.board, cell)
+                    self.board_view.remove_mark(cell)
+        else:
+            # Further away: restore the position's snapshot and rebuild the hints from it.
+            redraw_cells(self.board_view, self.board, self.history.jump(index))
+            self.hint_tracker.reset(self.board)
+        self.refresh_hints()
+        # Only the last position of the history can be finished.
+        if self.board.is_over():
+            self.check_winner(SYMBOLS[self.board.turn ^ 1], record=False)
+        self.update_history_slider()
+    def update_history_slider(self):
+        """Sets the history slider to the current move, out of the moves of the whole history."""
+        self.history_slider.max = len(self.history)
+        self.history_slider.value = len(self.board.moves)
+    def on_history_slider(self, slider, value):
+        """Jumps to the move chosen with the history slider."""
+        if int(value) != len(self.board.moves):
+            self.jump_to_move(int(value))
+    def show_result(self, title):
+        """
+        Opens the popup announcing the result of the game.
+        - title: The message to show.
+        """
+        if self.result_popup is None:
+            self.result_popup = Popup(
+                size_hint=(None,None),
+                size=(200,100),
+                # auto_dismiss=False
+            )
+        self.result_popup.title = title
+        self.result_popup.open()
+    def record_game(self):
+        """
+        Appends the finished game to the record log and queues its result in the
+        statistics store, unless it is a replay. Either may be off (None).
+        """
+        if self.replaying:
+            return
+        if self.record_log is not None:
+            log_game(self.record_log, self.board, MODE_PVP)
+        if self.stats_store is not None:
+            # Only queued here; the store writes it on its own thread.
+            self.stats_store.record_game(self.board, MODE_PVP)
     def restart(self,event):
         """
         Resets the game to its initial state for a new match.
         - event: The event object passed from the button press.
         """
-        # Clear the text from all cells on the board.
-        for ent in self.listEntries:
-            ent.text = '' # Clear the 'x' or 'o'
-            ent.cursor_color = (1,1,1,1)
-            ent.background_color = (1,1,1,1) # Reset cell background to white
-        # Reset all game state variables to their initial values.
-        # This includes available spots, game over status, player moves, and whose turn it is.
-        self.available_cases = [0,1,2,3,4,5,6,7,8]
+        # Clear the marks and highlights from all cells, in a single redraw.
+        self.board_view.clear()
+        # The hints were cleared with the highlights.
+        self.shown_hints = (0, 0, 0)
         # Reset the game over flag.
         self.gameOver = False
-        # Clear the moves for both players.
-        self.player1_moves = set()
-        self.player2_moves = set()
-        self.player1_symbol = "x"
-        self.player2_symbol = "o"
-        self.turn = self.player1_symbol
+        # Clear the board and its history; Player 1 moves first.
+        self.board.reset(PLAYER1)
+        self.history.clear()
+        self.update_history_slider()
+        self.hint_tracker.reset(self.board)
+        self.refresh_hints()
+    def replay_record(self, record):
+        """
+        Clears the board and plays a recorded game again through play_cell,
+        e.g. to reproduce a bug report. The replayed game is not recorded again.
+        - record: A records.GameRecord of this board size.
+        """
+        self.restart(None)
+        self.board.reset(record.first_player)
+        self.history.clear()
+        self.replaying = True
+        try:
+            for cell in record.moves:
+                self.play_cell(cell)
+        finally:
+            self.replaying = False
 
 # This class defines the layout and game logic for the Player vs. Computer mode.
 class SecondScreen(BoxLayout):
     """
     The main game screen widget for a single-player (human vs. computer) game.
     It handles the game board, player input, computer AI moves, win/draw detection,
-    and game controls.
+    the move history (undo, redo and jumps to any move) and game controls.
     """
-    def __init__(self, switch_game, switch_back, **kwargs):
+    def __init__(self, switch_game, switch_back, board_size=3, win_length=3, mcts_time_limit=1.0,
+                 record_log=None, tablebase=None, metrics=None, show_stats=False, stats_store=None,
+                 difficulty="perfect", evaluations=None, hints=False, seed=None, evaluator=None, **kwargs):
+        from kivy.uix.textinput import TextInput
         super().__init__(**kwargs)
+        # The metrics.Metrics that player moves, computer moves and result checks
+        # are reported to (None to not measure).
+        self.metrics = metrics
         # Set the main layout to be horizontal, allowing the game board and scoreboard to be side-by-side.
         self.orientation = "horizontal"
         self.padding = 20
         self.spacing = 10
         # A vertical BoxLayout to contain the game grid and the control buttons below it.
-        self.game_boxlayout = BoxLayout(orientation = "vertical", padding = 50, spacing = 10)
-        # GridLayout for the 3x3 Tic-Tac-Toe board cells.
-        self.textInput_gridlayout = GridLayout(cols=3)
-        self.game_boxlayout.add_widget(self.textInput_gridlayout)
-        # GridLayout for the control buttons (restart, switch, back).
-        # It's configured with 3 columns.
-        self.buttons_gridlayout = GridLayout(cols=3, size_hint_y=None, height=50,padding=(30,10), spacing=10)
+        self.game_boxlayout = BoxLayout(orientation = "vertical", padding = (50, 25), spacing = 10)
+        # The game board, drawn on the canvas of a single widget. Touching a cell calls 'player_move'.
+        # The board area stays 480 pixels wide: 3 cells of 160 pixels on the classic board.
+        self.board_view = BoardView(board_size, 480 // board_size, self.player_move)
+        self.game_boxlayout.add_widget(self.board_view)
+        # The move history below the board, as wide as it: 'undo' and 'redo' step
+        # through it one move at a time, and the slider jumps to any move.
+        self.history_boxlayout = BoxLayout(size_hint=(None, None), size=(self.board_view.width, 40), spacing=10)
+        undo_button = Button(
+            text="undo",
+            size_hint=(None, None),
+            size=(80, 40),
+            background_normal="",
+            background_color=colors["Indigo"]["500"]
+        )
+        undo_button.bind(on_release = self.undo_move)
+        self.history_boxlayout.add_widget(undo_button)
+        self.history_slider = Slider(min=0, max=0, value=0, step=1)
+        self.history_slider.bind(value = self.on_history_slider)
+        self.history_boxlayout.add_widget(self.history_slider)
+        redo_button = Button(
+            text="redo",
+            size_hint=(None, None),
+            size=(80, 40),
+            background_normal="",
+            background_color=colors["Indigo"]["500"]
+        )
+        redo_button.bind(on_release = self.redo_move)
+        self.history_boxlayout.add_widget(redo_button)
+        self.game_boxlayout.add_widget(self.history_boxlayout)
+        # GridLayout for the control buttons (restart, level, hints, switch, back).
+        # It's configured with 5 columns.
+        self.buttons_gridlayout = GridLayout(cols=5, size_hint_y=None, height=50,padding=(30,10), spacing=10)
         # 'Restart' button to start a new game in this mode.
         restart_button = Button(
             text="restart",
@@ -359,6 +613,26 @@ class SecondScreen(BoxLayout):
         # Binds the button's 'on_release' event to this class's 'restart' method.
         restart_button.bind(on_release = self.restart)
         self.buttons_gridlayout.add_widget(restart_button)
+        # Button showing the computer's difficulty level; each press selects the next one.
+        self.difficulty_button = Button(
+            text=difficulty,
+            size_hint=(None, None),
+            size=(80, 40),
+            background_normal="",
+            background_color=colors["Green"]["600"]
+        )
+        self.difficulty_button.bind(on_release = self.next_difficulty)
+        self.buttons_gridlayout.add_widget(self.difficulty_button)
+        # Button turning the move hints on and off.
+        self.hints_button = Button(
+            text="hints on" if hints else "hints off",
+            size_hint=(None, None),
+            size=(80, 40),
+            background_normal="",
+            background_color=colors["Teal"]["600"]
+        )
+        self.hints_button.bind(on_release = self.toggle_hints)
+        self.buttons_gridlayout.add_widget(self.hints_button)
         # 'Switch' button to change to the other game mode (e.g., PvC to PvP).
         # The actual switch logic is handled by the main app class.
         switch_game_button = Button(
@@ -370,6 +644,8 @@ class SecondScreen(BoxLayout):
         )
         # Binds the button's 'on_release' event to the switch_game function from the main app.
         switch_game_button.bind(on_release = switch_game)
+        # Leaving the screen cancels the computer's search; it restarts when the screen is shown again.
+        switch_game_button.bind(on_release = self.cancel_computer_move)
         self.buttons_gridlayout.add_widget(switch_game_button)
 
         # 'Back' button to return to the initial mode selection screen.
@@ -382,12 +658,17 @@ class SecondScreen(BoxLayout):
         )
         # Binds the button's 'on_release' event to the switch_back function from the main app.
         back_button.bind(on_release = switch_back)
+        back_button.bind(on_release = self.cancel_computer_move)
         self.buttons_gridlayout.add_widget(back_button)
         # Add the grid of control buttons to the game layout.
         self.game_boxlayout.add_widget(self.buttons_gridlayout)
         self.add_widget(self.game_boxlayout)
         # An AnchorLayout to center the scoreboard on the right side of the screen.
         self.anchorlayout = AnchorLayout(anchor_x='center', anchor_y='center')
+        # The stats.StatsStore finished games are saved to (None to not keep statistics),
+        # and the wins of the player and the computer, by player index, kept from earlier sessions.
+        self.stats_store = stats_store
+        self.scores = stats_store.scores(MODE_PVC, board_size, win_length) if stats_store is not None else [0, 0]
         # A GridLayout to organize the score labels and text inputs
         self.scours_gridlayout = GridLayout(cols=2, size_hint=(None, None), spacing=(90,0))
         self.player_scour_labe = Label(text="Your Score:", color=(0,0,1,3),font_size=22)
@@ -405,7 +686,7 @@ class SecondScreen(BoxLayout):
                 foreground_color=(0,0,1,3),
                 background_color=(.90, .90, .90, 1) # A very light gray
         )
-        self.player_scour_textinput.text = "0"
+        self.player_scour_textinput.text = str(self.scores[PLAYER1])
         self.scours_gridlayout.add_widget(self.player_scour_textinput)
         # Label and TextInput for the computer's score.
         self.computer_scour_labe = Label(text="Computer Score:", color=(0,0,1,3),font_size=22) # Black text
@@ -423,253 +704,864 @@ class SecondScreen(BoxLayout):
                 foreground_color=(0,0,1,3),
                 background_color=(.90, .90, .90, 1) # A very light gray
         )
-        self.computer_scour_textinput.text = "0"
+        self.computer_scour_textinput.text = str(self.scores[PLAYER2])
         self.scours_gridlayout.add_widget(self.computer_scour_textinput)
+        # Optionally, the latest timings and AI figures below the scores.
+        if show_stats and metrics is not None:
+            self.scours_gridlayout.add_widget(Label(text="Stats", color=(0,0,1,3), font_size=22))
+            self.scours_gridlayout.add_widget(StatsOverlay(metrics))
         # Add the scoreboard layout to the anchor layout, and then to the main screen.
         self.anchorlayout.add_widget(self.scours_gridlayout)
         self.add_widget(self.anchorlayout)
-        # Define all possible winning combinations (rows, columns, diagonals).
-        # Each set represents positions that form a winning line
-        self.win_cases = [
-                     {0, 1, 2}, {3, 4, 5}, {6, 7, 8},# Horizontal wins
-                     {0, 3, 6}, {1, 4, 7}, {2, 5, 8},# Vertical wins
-                     {0, 4, 8}, {2, 4, 6}# Diagonal wins
-                    ]
-        # Track available positions for each winning case
-        # This nested list structure is used by the computer's AI to decide its moves.
-        self.available_cases = [
-                      [0, 1, 2], [3, 4, 5], [6, 7, 8],
-                      [0, 3, 6], [1, 4, 7], [2, 5, 8],
-                      [0, 4, 8], [2, 4, 6]
-        ]
-        # A list to hold the 9 TextInput widgets that form the game grid.
-        self.listEntries = []
         # A boolean flag to prevent moves after the game has concluded.
         self.gameOver = False
-        # Sets to track moves made by the computer and the human player.
-        self.computer_moves = set()
-        self.player_moves = set()
+        # The headless game state. The human player plays 'x' (PLAYER1)
+        # and the computer plays 'o' (PLAYER2).
+        self.board = Board(board_size, win_length)
+        # Every move is played through the history, so moves can be taken back and played again.
+        self.history = MoveHistory(self.board)
+        # Optional hints for the player when it is their turn: cells that win, block the
+        # computer's win or create a fork, kept up to date move by move, and the hints
+        # currently highlighted.
+        self.hints_on = hints
+        self.hint_tracker = HintTracker(self.board)
+        self.shown_hints = (0, 0, 0)
+        # The computer's AI. A tablebase.Tablebase file, if given, is looked up first:
+        # the complete solved table on 3x3, or an opening book on larger boards.
+        # Without a table, the 3x3 game tree is solved once here, so every computer
+        # move afterwards is a single lookup. Larger boards are too big to solve and
+        # use Monte Carlo Tree Search, which thinks for 'mcts_time_limit' seconds per move.
+        self.tablebase = tablebase
+        self.solver = None
+        self.mcts = None
+        # Every random choice of the computer (Monte Carlo playouts, the noise of the
+        # levels) is drawn from this generator, seeded with 'seed' when one is given.
+        # The same seed and the same player moves then give the same computer moves,
+        # as long as no search is cut short by its time limit.
+        self.rng = random.Random(seed)
+        if (board_size, win_length) != (3, 3):
+            from mcts import MCTS
+            self.mcts = MCTS(time_limit=mcts_time_limit, rng=self.rng)
+        elif tablebase is None:
+            from solver import Solver
+            self.solver = Solver()
+            self.solver.solve_all()
+        # Below the 'perfect' level the computer plays a difficulty.DepthLimitedSearch
+        # instead, with the level's depth, noise and time limit. Its evaluations are kept
+        # in 'evaluations' (a difficulty.EvaluationCache), which can be shared by the whole
+        # session so changing levels or starting a new game reuses them.
+        self.evaluations = evaluations
+        # The levels estimate positions at their depth limit with 'evaluator' (an
+        # evaluator.LearnedEvaluator trained by training.py) if given, else with
+        # difficulty.evaluate. 'evaluations' must then only hold this evaluator's scores.
+        self.evaluator = evaluator
+        self.search = None
+        self.set_difficulty(difficulty)
+        # The records.RecordLog finished games are appended to (None to not record),
+        # and a flag telling that the moves on the board come from a replayed record.
+        self.record_log = record_log
+        self.replaying = False
+        # The computer searches on a worker thread so the UI stays responsive.
+        # 'computer_thinking' locks player input meanwhile, and setting 'ai_stop'
+        # cancels the search in flight (on restart, switch or back).
+        self.computer_thinking = False
+        self.ai_thread = None
+        self.ai_stop = None
 
         self.computer_isWin = False
-
-        # Initialize the game board by creating and adding the TextInput cells.
-        self.display_board()
-    def display_board(self):
+        # The popup announcing the result, created for the first result and then reused,
+        # and the cells highlighted with the result and their colour.
+        self.result_popup = None
+        self.result_highlight = ((), CELL_BACKGROUND)
+    def player_move(self, cell):
         """
-        Creates and populates the 3x3 grid with TextInput widgets for the game board.
+        Handles the logic when the human player touches a cell of the board.
+        After the player's move, it triggers the computer's move.
+        - cell: The index of the touched cell (row * N + column).
         """
-        # Create 9 TextInput widgets for the 3x3 grid.
-        for _ in range(9):
-            txtInput = TextInput(
-                halign="center",
-                readonly=True,
-                size_hint=(None,None),
-                font_size=100,
-                size=(160,160),
-                cursor_color=(1, 1, 1, 1),
-                background_color=(1, 1, 1, 1), # White background for cells
-                multiline=False
-            )
-            # Binds the 'on_touch_down' event of each cell to the 'player_move' method.
-            txtInput.bind(on_touch_down=self.player_move)
-            self.listEntries.append(txtInput) # Add to list for later reference
-            self.textInput_gridlayout.add_widget(txtInput)
-    def player_move(self,instance,touch):
+        # Ignore touches if the game is over or if the computer is still thinking.
+        if self.gameOver or self.computer_thinking:
+            return
+        self.play_cell(cell)
+    @instrumented(PLAYER_MOVE)
+    def play_cell(self, player_choice):
         """
-        Handles the logic when the human player clicks on a cell.
-        After the player's move, it triggers the computer's move.
-        - instance: The TextInput widget that was touched.
-        - touch: The touch event information.
+        Plays the human player's move on a cell, then starts the computer's move.
+        Used by touches and by automated input.
+        - player_choice: The cell index (row * N + column).
         """
-        # Ignore clicks if the game is over or if the click is not on a cell.
-        if instance not in self.listEntries or self.gameOver:
+        # Ignore the move if it is not the player's turn or the chosen cell is already taken.
+        if self.gameOver or self.computer_thinking or not self.board.is_free(player_choice):
             return
-        # Check if the touch event occurred within the bounds of the TextInput widget.
-        if instance.collide_point(*touch.pos):
-            # Find the index of this widget in our list (0-8 for the 3x3 grid)
-            player_choice = self.listEntries.index(instance)
-            # Ignore the move if the chosen cell is already taken by either player.
-            if int(player_choice) in self.computer_moves or int(player_choice) in self.player_moves:
-                return
-            # Record the player's move
-            self.player_moves.add(int(player_choice))
-            # The computer's AI uses 'available_cases' to make decisions.
-            # We must remove the player's choice from these lists.
-            for case in self.available_cases:
-                if int(player_choice) in case:
-                    case.remove(int(player_choice))
-            # Update the visual representation of the move
-            instance.readonly=False # Allow editing
-            instance.foreground_color = colors["Blue"]["800"] # Player color
-            instance.text = "x" # Insert 'x' symbol
-            instance.readonly=True # Make read-only again
-            # Check if player won with this move
-            self.check_winner(self.player_moves, "x")
-            # If the game is still ongoing, let the computer make its move.
-            if not self.gameOver:
-                self.computer_move()
+        self.place_mark(player_choice)
+        # If the game is still ongoing, let the computer make its move.
+        if not self.gameOver:
+            self.computer_move()
+    def place_mark(self, cell):
+        """
+        Plays a move on a cell for whoever's turn it is (the player's 'x' or the computer's 'o'),
+        shows it and checks whether it ends the game.
+        - cell: The cell index (row * N + column).
+        """
+        symbol = SYMBOLS[self.board.turn]
+        # Record the move
+        self.history.play(cell)
+        self.hint_tracker.played(self.board, cell)
+        # Update the visual representation of the move, in the player's or the computer's color
+        self.board_view.set_mark(cell, symbol, colors["Blue"]["800"] if symbol == "x" else colors["Pink"]["800"])
+        # Update the hints before the result check, which may highlight the winning line over them.
+        self.refresh_hints()
+        # Check if this move won the game
+        self.check_winner(symbol)
+        self.update_history_slider()
     # Handle computer's move
     def computer_move(self):
         """
-        Determines and executes the computer's next move based on a simple AI strategy.
-        The strategy has a flaw: it finds a blocking move first, but then overwrites
-        it if a winning move is found, effectively prioritizing winning over blocking.
+        Starts the computer's search on a worker thread and locks player input.
+        The chosen move is applied on the UI thread by apply_computer_move.
         """
-        # Prioritize taking the center position if it's available.
-        central_pos = 4
-        if central_pos not in self.computer_moves and any(central_pos in case for case in self.available_cases):
-            computer_choice = central_pos
-        else:
-            min_length = 3 # Start with maximum case length
-            computer_choice = None
-            # --- AI Strategy 1: Find a "good" defensive or offensive move ---
-            # It iterates through the remaining possible win lines ('available_cases').
-            # It prefers lines with fewer open spots, hoping to block the player.
-            # This choice might be immediately overwritten by Strategy 2.
-            for case in self.available_cases:
-                if 0 < len(case) <= min_length:
-                    for i in range(len(case)):
-                        if case[i] not in self.computer_moves:
-                            min_length = len(case)
-                            computer_choice = case[i]
-            # --- AI Strategy 2: Check for an immediate win ---
-            # This is the highest priority. It checks if the computer has 2 out of 3 spots
-            # in any winning line and takes the 3rd spot if it's available.
-            for case in self.win_cases:
-                count = sum(1 for i in case if i in self.computer_moves)
-                if count == 2: # Computer has 2 out of 3 positions
-                    for i in case:
-                        # Find the empty position to complete the win
-                        if i not in self.computer_moves and i not in self.player_moves:
-                            computer_choice = i
+        self.computer_thinking = True
+        stop = threading.Event()
+        self.ai_stop = stop
+        previous = self.ai_thread
+        # The search works on its own copy, so the UI never sees a half-searched board.
+        board = self.board.copy()
+        def think():
+            # A cancelled search still running must finish before the AI is reused.
+            if previous is not None:
+                previous.join()
+            stats = None
+            try:
+                if self.metrics is None:
+                    computer_choice = self.choose_computer_move(board, stop)
+                else:
+                    # Measure the decision with the AI's node and cache counters.
+                    before = search_counters(self.solver, self.tablebase, self.mcts, self.search)
+                    start = time.perf_counter()
+                    computer_choice = self.choose_computer_move(board, stop)
+                    elapsed = time.perf_counter() - start
+                    after = search_counters(self.solver, self.tablebase, self.mcts, self.search)
+                    nodes, lookups, hits = (end - begin for begin, end in zip(before, after))
+                    stats = MoveStats(COMPUTER_MOVE, elapsed, len(board.moves) + 1, nodes, lookups, hits)
+            except Exception as error:
+                # A failed search must not leave the board locked: report it on the UI thread.
+                Clock.schedule_once(lambda dt, error=error: self.computer_move_failed(error, stop))
+                return
+            if not stop.is_set():
+                Clock.schedule_once(lambda dt: self.apply_computer_move(computer_choice, stop, stats))
+        self.ai_thread = threading.Thread(target=think, daemon=True)
+        self.ai_thread.start()
+    def computer_move_failed(self, error, stop):
+        """
+        Called on the UI thread when the computer's search raised: logs the error and
+        plays a greedy move (players.greedy_move) instead, which unlocks player input.
+        - error: The exception raised by the search.
+        - stop: The event of the failed search.
+        """
+        from players import greedy_move
+        if stop.is_set():
+            return
+        Logger.error(f"Computer: the {self.difficulty} search failed, playing a greedy move instead", exc_info=error)
+        self.apply_computer_move(greedy_move(self.board), stop)
+    def choose_computer_move(self, board, stop):
+        """
+        Returns the computer's move for a board. Runs on the worker thread.
+        Below the 'perfect' level the move comes from the level's search.
+        At the 'perfect' level, on the 3x3 board the move comes from the solved table or the solver, so the computer plays
+        perfectly: it takes a win when it has one, blocks the player otherwise, and never loses.
+        On larger boards it plays from the opening book while the position is in it,
+        then runs a Monte Carlo Tree Search within its time budget.
+        - board: A copy of the game board.
+        - stop: The threading.Event that cancels this search.
+        """
+        search = self.search
+        if search is not None:
+            return search.choose(board, stop)
+        computer_choice = None
+        if self.tablebase is not None:
+            computer_choice = self.tablebase.best_move(board)
+        if computer_choice is None and self.solver is not None:
+            computer_choice = self.solver.best_move(board)
+        if computer_choice is None and self.mcts is not None:
+            computer_choice = self.mcts.choose(board, stop)
+        return computer_choice
+    def set_difficulty(self, difficulty):
+        """
+        Selects the computer's level for its next move.
+        - difficulty: A key of difficulty.LEVELS ('easy', 'medium', 'hard' or 'perfect').
+        """
+        from difficulty import LEVELS, EvaluationCache, make_level
+        if difficulty not in LEVELS:
+            raise ValueError(f"unknown level {difficulty!r}, expected one of {', '.join(LEVELS)}")
+        self.difficulty = difficulty
+        self.difficulty_button.text = difficulty
+        if difficulty == "perfect":
+            self.search = None
+            return
+        if self.evaluations is None:
+            self.evaluations = EvaluationCache()
+        # A search still running keeps its own player; the new one is used from the next move.
+        self.search = make_level(difficulty, self.evaluations, self.rng, self.evaluator)
+    def next_difficulty(self, event=None):
+        """
+        Selects the level after the current one, back to the first after 'perfect'.
+        - event: The event object passed from the button press, if any.
+        """
+        from difficulty import LEVELS
+        names = list(LEVELS)
+        self.set_difficulty(names[(names.index(self.difficulty) + 1) % len(names)])
+    def apply_computer_move(self, computer_choice, stop, stats=None):
+        """
+        Plays the computer's move on the UI thread and unlocks player input.
+        - computer_choice: The cell chosen by the search.
+        - stop: The event of the search that produced the move.
+        - stats: The metrics.MoveStats of the search, reported here on the UI thread.
+        """
+        # The search may have been cancelled after it posted its result.
+        if stop.is_set():
+            return
+        self.computer_thinking = False
+        if stats is not None and self.metrics is not None:
+            self.metrics.record(stats)
         # --- Execute the chosen move ---
         if computer_choice is not None:
-            # Update visual representation
-            self.listEntries[int(computer_choice)].readonly=False # Allow editing
-            self.listEntries[int(computer_choice)].foreground_color = colors["Pink"]["800"] # Computer color
-            self.listEntries[int(computer_choice)].text = "o" # Insert 'o' symbol
-            self.listEntries[int(computer_choice)].readonly=True # Make read-only again
-            # Record the computer's move
-            self.computer_moves.add(int(computer_choice))
-        # Check if computer won with this move
-        self.check_winner(self.computer_moves, "o")
+            self.place_mark(computer_choice)
     # Check for win conditions or draw
-    def check_winner(self,player_moves, symbol):
+    @instrumented(CHECK_WINNER)
+    def check_winner(self, symbol, record=True):
         """
         Checks if the most recent move resulted in a win or a draw.
-        - player_moves: A set of moves for the player being checked.
-        - symbol: The symbol of the player ('x' or 'o').
-        - player_turn: The specific cell index of the last move. Used here to detect a draw.
+        - symbol: The symbol of the player who just moved ('x' or 'o').
+        - record: Whether to record a finished game; False when it is reached again from the history.
         """
-        # Check for draw condition (no more moves available) 
-        if self.computer_moves|self.player_moves == {i for i in range(9)}:  # no more moves left
+        # The board records the winner and the completed line as soon as a move wins.
+        if self.board.winner is not None:
+            if symbol == 'x': # Player wins
+                # Highlight winning combination with a light green background.
+                self.result_highlight = (cells_of(self.board.win_mask), colors["LightGreen"]["200"])
+                self.board_view.set_backgrounds(*self.result_highlight)
+                # Show a popup message for a player win.
+                self.show_result("You win!")
+                # Update the player's score.
+                self.scores[PLAYER1] += 1
+                self.player_scour_textinput.readonly=False
+                self.player_scour_textinput.text = str(self.scores[PLAYER1])
+                self.player_scour_textinput.readonly=True
+                self.computer_isWin = False
+            else: # Computer wins
+                # Highlight winning combination with a light red background.
+                self.result_highlight = (cells_of(self.board.win_mask), colors["Red"]["200"])
+                self.board_view.set_backgrounds(*self.result_highlight)
+                # Show a popup message for a computer win.
+                self.show_result("You lose!")
+                # Update the computer's score.
+                self.scores[PLAYER2] += 1
+                self.computer_scour_textinput.readonly=False
+                self.computer_scour_textinput.text = str(self.scores[PLAYER2])
+                self.computer_scour_textinput.readonly=True
+                self.computer_isWin = True
+            # End the game
+            self.gameOver = True
+            if record:
+                self.record_game()
+            return
+        # Check for draw condition (no more moves available)
+        if self.board.is_draw():
             # Highlight all cells to indicate a draw.
-            for ent in self.listEntries:
-                ent.cursor_color = colors["LightBlue"]["200"]
-                ent.background_color = colors["LightBlue"]["200"] # Set a light blue background for draw
-            
+            self.result_highlight = (range(self.board.geometry.cells), colors["LightBlue"]["200"])
+            self.board_view.set_backgrounds(*self.result_highlight)
             # Show a popup message for a draw.
-            popup = Popup(
-                    title = "It's a draw!",
-                    size_hint=(None,None),
-                    size=(200,100),
-                    # auto_dismiss=False
-                )
-            popup.open()
+            self.show_result("It's a draw!")
             self.gameOver = True
+            if record:
+                self.record_game()
+    def take_back_result(self):
+        """
+        Un-counts the result of the finished game when its final position is left, like
+        FirstScreen.take_back_result, so a player who lost can take their move back and play on.
+        """
+        if self.board.winner is not None:
+            self.scores[self.board.winner] -= 1
+            score_textinput = (self.player_scour_textinput, self.computer_scour_textinput)[self.board.winner]
+            score_textinput.readonly=False
+            score_textinput.text = str(self.scores[self.board.winner])
+            score_textinput.readonly=True
+        self.board_view.set_backgrounds(self.result_highlight[0], CELL_BACKGROUND)
+        self.result_highlight = ((), CELL_BACKGROUND)
+        # The computer only opens the next game if it wins this one in the end.
+        self.computer_isWin = False
+        self.gameOver = False
+    def toggle_hints(self, event=None):
+        """
+        Turns the move hints on or off.
+        - event: The event object passed from the button press, if any.
+        """
+        self.hints_on = not self.hints_on
+        self.hints_button.text = "hints on" if self.hints_on else "hints off"
+        self.refresh_hints()
+    def refresh_hints(self):
+        """
+        Highlights the player's hints (see hints.py) while it is their turn, and removes
+        them during the computer's turn, once the game is over or when hints are off.
+        Only the cells whose hint changed are recoloured.
+        """
+        hints = (0, 0, 0)
+        if self.hints_on and self.board.turn == PLAYER1 and not self.board.is_over():
+            hints = self.hint_tracker.hints(self.board)
+        for mask, kind in hint_changes(self.shown_hints, hints):
+            self.board_view.set_backgrounds(cells_of(mask), CELL_BACKGROUND if kind is None else HINT_COLORS[kind])
+        self.shown_hints = hints
+    def undo_move(self, event=None):
+        """
+        Takes back the player's last move, with the computer's reply to it if it was played.
+        - event: The event object passed from the button press, if any.
+        """
+        self.jump_to_move(len(self.board.moves) - 1, -1)
+    def redo_move(self, event=None):
+        """
+        Plays the player's next move again, with the computer's reply to it.
+        - event: The event object passed from the button press, if any.
+        """
+        self.jump_to_move(len(self.board.moves) + 1, 1)
+    def jump_to_move(self, index, direction=1):
+        """
+        Shows the position after 'index' moves of the history, like FirstScreen.jump_to_move.
+        The player is always the one to move afterwards: a position where the computer
+        is to move is skipped in 'direction' (1 to include the computer's recorded reply,
+        -1 to take back the player's move as well). A search in flight is cancelled, and
+        started again when the computer is to move at the end of the history.
+        - index: The move number, 0 for the empty board (clamped to the history).
+        - direction: 1 when moving forward, -1 when moving back.
+        """
+        index = max(0, min(index, len(self.history)))
+        if index < len(self.history) and self.history.turn_at(index) == PLAYER2:
+            index = index + direction if index + direction >= 0 else index + 1
+        if index == len(self.board.moves):
             return
-        # Iterate through all predefined winning combinations.
-        for case in self.win_cases:
-            # A win occurs if all positions in a winning case are in the player's moves.
-            if case <= player_moves:  # check if all elements of case are in player_moves
-                if symbol == 'x': # Player wins
-                    # Highlight winning combination with a light green background.
-                    for i in case:
-                        self.listEntries[i].cursor_color = colors["LightGreen"]["200"]
-                        self.listEntries[i].background_color = colors["LightGreen"]["200"]
-                    # Show a popup message for a player win.
-                    popup = Popup(
-                    title = "You win!",
-                    size_hint=(None,None),
-                    size=(200,100),
-                    # auto_dismiss=False
-                    )
-                    popup.open()
-                    # Update the player's score.
-                    self.player_scour_textinput.readonly=False
-                    self.player_scour_textinput.text = str(int(self.player_scour_textinput.text) + 1)
-                    self.player_scour_textinput.readonly=True
-                    self.computer_isWin = False
-                else: # Computer wins
-                    # Highlight winning combination with a light red background.
-                    for i in case:
-                        self.listEntries[i].cursor_color = colors["Red"]["200"]
-                        self.listEntries[i].background_color = colors["Red"]["200"]
-                    # Show a popup message for a computer win.
-                    popup = Popup(
-                    title = "You lose!",
-                    size_hint=(None,None),
-                    size=(200,100),
-                    # auto_dismiss=False
-                    )
-                    popup.open()
-                    # Update the computer's score.
-                    self.computer_scour_textinput.readonly=False
-                    self.computer_scour_textinput.text = str(int(self.computer_scour_textinput.text) + 1)
-                    self.computer_scour_textinput.readonly=True
-                    self.computer_isWin = True
-                # End the game
-                self.gameOver = True       
-                return
+        self.cancel_computer_move()
+        if self.gameOver:
+            self.take_back_result()
+        if self.history.walk_is_cheaper(index):
+            # A few moves away: take them back or play them again one at a time.
+            for cell, forward in self.history.steps(index):
+                if forward:
+                    self.hint_tracker.played(self.board, cell)
+                    symbol = SYMBOLS[self.board.turn ^ 1]
+                    self.board_view.set_mark(cell, symbol, colors["Blue"]["800"] if symbol == "x" else colors["Pink"]["800"])
+                else:
+                    self.hint_tracker.undone(self.board, cell)
+                    self.board_view.remove_mark(cell)
+        else:
+            # Further away: restore the position's snapshot and rebuild the hints from it.
+            redraw_cells(self.board_view, self.board, self.history.jump(index))
+            self.hint_tracker.reset(self.board)
+        self.refresh_hints()
+        # Only the last position of the history can be finished.
+        if self.board.is_over():
+            self.check_winner(SYMBOLS[self.board.turn ^ 1], record=False)
+        self.update_history_slider()
+        if not self.gameOver and not self.history.future and self.board.turn == PLAYER2:
+            self.computer_move()
+    def update_history_slider(self):
+        """Sets the history slider to the current move, out of the moves of the whole history."""
+        self.history_slider.max = len(self.history)
+        self.history_slider.value = len(self.board.moves)
+    def on_history_slider(self, slider, value):
+        """Jumps to the move chosen with the history slider."""
+        if int(value) != len(self.board.moves):
+            self.jump_to_move(int(value))
+    def show_result(self, title):
+        """
+        Opens the popup announcing the result of the game.
+        - title: The message to show.
+        """
+        if self.result_popup is None:
+            self.result_popup = Popup(
+                size_hint=(None,None),
+                size=(200,100),
+                # auto_dismiss=False
+            )
+        self.result_popup.title = title
+        self.result_popup.open()
+    def record_game(self):
+        """
+        Appends the finished game to the record log and queues its result in the
+        statistics store, unless it is a replay. Either may be off (None).
+        """
+        if self.replaying:
+            return
+        if self.record_log is not None:
+            log_game(self.record_log, self.board, MODE_PVC)
+        if self.stats_store is not None:
+            # Only queued here; the store writes it on its own thread.
+            self.stats_store.record_game(self.board, MODE_PVC)
     def restart(self,event):
         """
         Resets the game to its initial state for a new match.
         - event: The event object passed from the button press.
         """
-        # Clear the text from all cells on the board.
-        for ent in self.listEntries:
-            ent.text = ''
-            ent.cursor_color=(1, 1, 1, 1)
-            ent.background_color = (1, 1, 1, 1) # Reset cell background color to white
-        # Reset all game state variables to their initial values.
-        # This includes the computer's AI state, game over status, and both players' moves.
-        self.available_cases = [
-        [0, 1, 2], [3, 4, 5], [6, 7, 8],
-        [0, 3, 6], [1, 4, 7], [2, 5, 8],
-        [0, 4, 8], [2, 4, 6]
-        ]
-        # Reset the game over flag and player move sets.
+        # Clear the marks and highlights from all cells, in a single redraw.
+        self.board_view.clear()
+        # The hints were cleared with the highlights.
+        self.shown_hints = (0, 0, 0)
+        # Cancel the computer's search if it is still thinking about the old game.
+        self.cancel_computer_move()
+        # Reset the game over flag, the board and its history.
+        # The computer opens the next game if it won the last one.
         self.gameOver = False
-        self.computer_moves = set()
-        self.player_moves = set()
+        self.board.reset(PLAYER2 if self.computer_isWin else PLAYER1)
+        self.history.clear()
+        self.update_history_slider()
+        self.hint_tracker.reset(self.board)
         if self.computer_isWin:
             self.computer_move()
+        else:
+            self.refresh_hints()
+    def replay_record(self, record):
+        """
+        Clears the board and plays a recorded game again, both the player's and the
+        computer's moves, without asking the AI. The replayed game is not recorded again.
+        - record: A records.GameRecord of this board size.
+        """
+        self.cancel_computer_move()
+        self.computer_isWin = False
+        self.restart(None)
+        self.board.reset(record.first_player)
+        self.history.clear()
+        self.replaying = True
+        try:
+            for cell in record.moves:
+                if self.gameOver:
+                    break
+                self.place_mark(cell)
+        finally:
+            self.replaying = False
+    def cancel_computer_move(self, event=None):
+        """
+        Cancels the computer's search in flight, if any, and unlocks player input.
+        - event: The event object passed from a button press, if any.
+        """
+        if self.ai_stop is not None:
+            self.ai_stop.set()
+        self.computer_thinking = False
+    def on_parent(self, widget, parent):
+        """
+        Called by Kivy when the screen is shown or hidden. If the computer's search
+        was cancelled by leaving the screen, it is started again on return.
+        """
+        if parent is not None and not self.gameOver and not self.computer_thinking \
+                and self.board.turn == PLAYER2 and not self.board.is_over():
+            self.computer_move()
+
+# This class defines the layout and game logic for the Ultimate (9x9) mode against the computer.
+class UltimateScreen(BoxLayout):
+    """
+    The game screen of ultimate tic-tac-toe (see ultimate.py), the human player
+    ('x') against the computer ('o'). The sub-boards the next move may be played
+    in are highlighted, and won sub-boards take the colour of their winner.
+    """
+    def __init__(self, switch_back, metrics=None, show_stats=False, stats_store=None, **kwargs):
+        from kivy.uix.textinput import TextInput
+        from mcts import MCTS
+        from ultimate import MOVE_TIME_LIMIT, UltimateBoard
+        super().__init__(**kwargs)
+        # The metrics.Metrics that player moves, computer moves and result checks
+        # are reported to (None to not measure).
+        self.metrics = metrics
+        # Set the main layout to be horizontal, allowing the game board and scoreboard to be side-by-side.
+        self.orientation = "horizontal"
+        self.padding = 20
+        self.spacing = 10
+        # A vertical BoxLayout to contain the game grid and the control buttons below it.
+        self.game_boxlayout = BoxLayout(orientation = "vertical", padding = 50, spacing = 10)
+        # The 9x9 board, drawn on the canvas of a single widget. Touching a cell calls 'player_move'.
+        self.board_view = BoardView(9, 480 // 9, self.player_move)
+        self.game_boxlayout.add_widget(self.board_view)
+        # GridLayout for the control buttons (restart, back).
+        self.buttons_gridlayout = GridLayout(cols=2, size_hint_y=None, height=50,padding=(30,10), spacing=10)
+        # 'Restart' button to start a new game.
+        restart_button = Button(
+            text="restart",
+            size_hint=(None, None),
+            size=(80, 40),
+            background_normal="",
+            background_color=colors["Red"]["500"]
+        )
+        restart_button.bind(on_release = self.restart)
+        self.buttons_gridlayout.add_widget(restart_button)
+        # 'Back' button to return to the initial mode selection screen.
+        back_button = Button(
+            text="back",
+            size_hint=(None, None),
+            size=(80, 40),
+            background_normal="",
+            background_color=colors["Gray"]["600"]
+        )
+        back_button.bind(on_release = switch_back)
+        back_button.bind(on_release = self.cancel_computer_move)
+        self.buttons_gridlayout.add_widget(back_button)
+        # Add the grid of control buttons to the game layout.
+        self.game_boxlayout.add_widget(self.buttons_gridlayout)
+        self.add_widget(self.game_boxlayout)
+        # An AnchorLayout to center the scoreboard on the right side of the screen.
+        self.anchorlayout = AnchorLayout(anchor_x='center', anchor_y='center')
+        # The stats.StatsStore finished games are saved to (None to not keep statistics),
+        # and the wins of the player and the computer, by player index, kept from earlier sessions.
+        self.stats_store = stats_store
+        self.scores = stats_store.scores(MODE_ULTIMATE) if stats_store is not None else [0, 0]
+        # A GridLayout to organize the score labels and text inputs
+        self.scours_gridlayout = GridLayout(cols=2, size_hint=(None, None), spacing=(90,0))
+        self.score_textinputs = []
+        for label, score in (("Your Score:", self.scores[PLAYER1]), ("Computer Score:", self.scores[PLAYER2])):
+            self.scours_gridlayout.add_widget(Label(text=label, color=(0,0,1,3),font_size=22))
+            score_textinput = TextInput(
+                    halign="center",
+                    readonly=True,
+                    size_hint=(None,None),
+                    font_size=27,
+                    size=(70,50),
+                    background_normal='',
+                    background_active='',
+                    multiline=False,
+                    cursor_color = (1,1,1,1),
+                    foreground_color=(0,0,1,3),
+                    background_color=(.90, .90, .90, 1) # A very light gray
+            )
+            score_textinput.text = str(score)
+            self.scours_gridlayout.add_widget(score_textinput)
+            self.score_textinputs.append(score_textinput)
+        # Optionally, the latest timings and AI figures below the scores.
+        if show_stats and metrics is not None:
+            self.scours_gridlayout.add_widget(Label(text="Stats", color=(0,0,1,3), font_size=22))
+            self.scours_gridlayout.add_widget(StatsOverlay(metrics))
+        # Add the scoreboard layout to the anchor layout, and then to the main screen.
+        self.anchorlayout.add_widget(self.scours_gridlayout)
+        self.add_widget(self.anchorlayout)
+        # A boolean flag to prevent moves after the game has concluded.
+        self.gameOver = False
+        # The headless game state. The human player plays 'x' (PLAYER1) and moves first.
+        self.board = UltimateBoard()
+        # The computer's AI: Monte Carlo Tree Search, within the time budget of ultimate.py.
+        self.mcts = MCTS(time_limit=MOVE_TIME_LIMIT)
+        # The computer searches on a worker thread so the UI stays responsive.
+        # 'computer_thinking' locks player input meanwhile, and setting 'ai_stop'
+        # cancels the search in flight (on restart or back).
+        self.computer_thinking = False
+        self.ai_thread = None
+        self.ai_stop = None
+        # The popup announcing the result, created for the first result and then reused.
+        self.result_popup = None
+        self.show_sub_boards()
+    def show_sub_boards(self):
+        """
+        Colours the sub-boards: won ones in their winner's colour, the ones the next
+        move may be played in highlighted, the others alternately white and light gray.
+        """
+        from ultimate import GLOBAL_CELL
+        playable = self.board.open_sub_boards()
+        for sub in range(9):
+            winner = self.board.sub_board_winner(sub)
+            if winner is not None:
+                color = colors["Blue"]["100"] if winner == PLAYER1 else colors["Pink"]["100"]
+            elif sub in playable:
+                color = colors["Yellow"]["100"]
+            elif self.board.closed >> sub & 1:
+                color = colors["Gray"]["300"]
+            else:
+                color = (1, 1, 1, 1) if sub % 2 == 0 else colors["Gray"]["100"]
+            self.board_view.set_backgrounds(GLOBAL_CELL[sub], color)
+    def player_move(self, cell):
+        """
+        Handles the logic when the human player touches a cell of the board.
+        After the player's move, it triggers the computer's move.
+        - cell: The index of the touched cell (row * 9 + column).
+        """
+        # Ignore touches if the game is over or if the computer is still thinking.
+        if self.gameOver or self.computer_thinking:
+            return
+        self.play_cell(cell)
+    @instrumented(PLAYER_MOVE)
+    def play_cell(self, player_choice):
+        """
+        Plays the human player's move on a cell, then starts the computer's move.
+        Used by touches and by automated input.
+        - player_choice: The cell index (row * 9 + column).
+        """
+        # Ignore the move if it is not the player's turn or the cell may not be played.
+        if self.gameOver or self.computer_thinking or not self.board.is_legal(player_choice):
+            return
+        self.place_mark(player_choice)
+        # If the game is still ongoing, let the computer make its move.
+        if not self.gameOver:
+            self.computer_move()
+    def place_mark(self, cell):
+        """
+        Plays a move on a cell for whoever's turn it is, shows it and checks whether it ends the game.
+        - cell: The cell index (row * 9 + column).
+        """
+        symbol = SYMBOLS[self.board.turn]
+        self.board.play(cell)
+        self.board_view.set_mark(cell, symbol, colors["Blue"]["800"] if symbol == "x" else colors["Pink"]["800"])
+        self.check_winner(symbol)
+        if not self.gameOver:
+            self.show_sub_boards()
+    def computer_move(self):
+        """
+        Starts the computer's search on a worker thread and locks player input.
+        The chosen move is applied on the UI thread by apply_computer_move.
+        """
+        self.computer_thinking = True
+        stop = threading.Event()
+        self.ai_stop = stop
+        previous = self.ai_thread
+        # The search works on its own copy, so the UI never sees a half-searched board.
+        board = self.board.copy()
+        def think():
+            # A cancelled search still running must finish before the tree is reused.
+            if previous is not None:
+                previous.join()
+            stats = None
+            try:
+                if self.metrics is None:
+                    computer_choice = self.mcts.choose(board, stop)
+                else:
+                    # Measure the decision with the search's playout and tree reuse counters.
+                    before = search_counters(self.mcts)
+                    start = time.perf_counter()
+                    computer_choice = self.mcts.choose(board, stop)
+                    elapsed = time.perf_counter() - start
+                    nodes, lookups, hits = (end - begin for begin, end in zip(before, search_counters(self.mcts)))
+                    stats = MoveStats(COMPUTER_MOVE, elapsed, len(board.moves) + 1, nodes, lookups, hits)
+            except Exception as error:
+                # A failed search must not leave the board locked: report it on the UI thread.
+                Clock.schedule_once(lambda dt, error=error: self.computer_move_failed(error, stop))
+                return
+            if not stop.is_set():
+                Clock.schedule_once(lambda dt: self.apply_computer_move(computer_choice, stop, stats))
+        self.ai_thread = threading.Thread(target=think, daemon=True)
+        self.ai_thread.start()
+    def computer_move_failed(self, error, stop):
+        """
+        Called on the UI thread when the computer's search raised: logs the error and
+        plays a random legal move instead, which unlocks player input.
+        - error: The exception raised by the search.
+        - stop: The event of the failed search.
+        """
+        if stop.is_set():
+            return
+        Logger.error("Computer: the ultimate search failed, playing a random move instead", exc_info=error)
+        moves = self.board.legal_moves()
+        self.apply_computer_move(random.choice(moves) if moves else None, stop)
+    def apply_computer_move(self, computer_choice, stop, stats=None):
+        """
+        Plays the computer's move on the UI thread and unlocks player input.
+        - computer_choice: The cell chosen by the search.
+        - stop: The event of the search that produced the move.
+        - stats: The metrics.MoveStats of the search, reported here on the UI thread.
+        """
+        # The search may have been cancelled after it posted its result.
+        if stop.is_set():
+            return
+        self.computer_thinking = False
+        if stats is not None and self.metrics is not None:
+            self.metrics.record(stats)
+        if computer_choice is not None:
+            self.place_mark(computer_choice)
+    @instrumented(CHECK_WINNER)
+    def check_winner(self, symbol):
+        """
+        Checks if the most recent move won the meta-board or drew the game.
+        - symbol: The symbol of the player who just moved ('x' or 'o').
+        """
+        from ultimate import GLOBAL_CELL
+        if self.board.winner is not None:
+            winner = self.board.winner
+            # Highlight the sub-boards of the winning meta line.
+            highlight = colors["LightGreen"]["200"] if winner == PLAYER1 else colors["Red"]["200"]
+            self.board_view.set_backgrounds(
+                [cell for sub in cells_of(self.board.win_mask) for cell in GLOBAL_CELL[sub]], highlight)
+            self.show_result("You win!" if winner == PLAYER1 else "You lose!")
+            # Update the winner's score.
+            self.scores[winner] += 1
+            self.score_textinputs[winner].text = str(self.scores[winner])
+            self.gameOver = True
+            self.record_game()
+            return
+        if self.board.is_draw():
+            self.board_view.set_backgrounds(range(81), colors["LightBlue"]["200"])
+            self.show_result("It's a draw!")
+            self.gameOver = True
+            self.record_game()
+    def show_result(self, title):
+        """
+        Opens the popup announcing the result of the game.
+        - title: The message to show.
+        """
+        if self.result_popup is None:
+            self.result_popup = Popup(
+                size_hint=(None,None),
+                size=(200,100),
+            )
+        self.result_popup.title = title
+        self.result_popup.open()
+    def record_game(self):
+        """Queues the result of the finished game in the statistics store, if there is one."""
+        if self.stats_store is not None:
+            self.stats_store.record_game(self.board, MODE_ULTIMATE)
+    def restart(self, event):
+        """
+        Resets the game to its initial state for a new match; the player moves first.
+        - event: The event object passed from the button press.
+        """
+        self.cancel_computer_move()
+        self.board_view.clear()
+        self.gameOver = False
+        self.board.reset(PLAYER1)
+        self.show_sub_boards()
+    def cancel_computer_move(self, event=None):
+        """
+        Cancels the computer's search in flight, if any, and unlocks player input.
+        - event: The event object passed from a button press, if any.
+        """
+        if self.ai_stop is not None:
+            self.ai_stop.set()
+        self.computer_thinking = False
+    def on_parent(self, widget, parent):
+        """
+        Called by Kivy when the screen is shown or hidden. If the computer's search
+        was cancelled by leaving the screen, it is started again on return.
+        """
+        if parent is not None and not self.gameOver and not self.computer_thinking \
+                and self.board.turn == PLAYER2 and not self.board.is_over():
+            self.computer_move()
 
 # This is the main Kivy App class. It's the entry point of the application.
 class MyKivyApp(App):
     """
     The main application class that orchestrates the different screens (widgets).
     It is responsible for building the initial UI and managing the transitions
-    between the InitialScreen, FirstScreen (PvP), and SecondScreen (PvC).
+    between the InitialScreen, FirstScreen (PvP), SecondScreen (PvC) and UltimateScreen.
+    The board size and win length of both game screens can be set when creating
+    the app, e.g. MyKivyApp(board_size=15, win_length=5) for gomoku.
+    The computer's level can be chosen with MyKivyApp(difficulty="easy") or on its screen.
+    Both game screens can highlight move hints, from MyKivyApp(hints=True) or their "hints" button.
+    MyKivyApp(seed=1) seeds the computer's random choices, for reproducible games.
+    A weight file of training.py in the data folder (evaluator_<size>x<size>_<win length>.json)
+    replaces the built-in evaluation function of the computer's levels on that board.
+    Every finished game is saved to app.stats_store (a stats.StatsStore), whose
+    totals give the scores shown when the app starts again.
+    Move timings and AI figures are collected in app.metrics (a metrics.Metrics,
+    see metrics.Metrics.subscribe); MyKivyApp(show_stats=True) also shows them on screen.
     """
+    # Number of rows (and columns) of the board, and how many marks in a row win.
+    board_size = NumericProperty(3)
+    win_length = NumericProperty(3)
+    # Whether the game screens show the latest timings next to the scores.
+    show_stats = BooleanProperty(False)
+    # The computer's level when the Player vs. Computer screen opens (see difficulty.LEVELS).
+    difficulty = StringProperty("perfect")
+    # Whether the game screens open with the move hints on (see hints.py).
+    hints = BooleanProperty(False)
+    # The seed of the computer's random choices, for reproducible games (None for a random one).
+    seed = NumericProperty(None, allownone=True)
     def build(self):
-        # Instantiate the different screens, passing the necessary screen-switching methods as callbacks.
-        self.first_screen = FirstScreen(self.switch_second_screen,self.switch_back_initial_screen)
-        self.second_screen = SecondScreen(self.switch_first_screen,self.switch_back_initial_screen)
-        self.initial_screen = InitialScreen(self.switch_first_screen,self.switch_second_screen)
+        from kivy.core.window import Window
+        # Set a background color for the entire window
+        Window.clearcolor = (0.9, 0.9, 0.9, 1) # A light gray color
+        Window.size = (1000, 680) # Set the window size to 1000x680 pixels
+        # Every finished game of both modes is appended to a rolling log in the app's data folder.
+        self.record_log = RecordLog(os.path.join(self.user_data_dir, "games.rec"))
+        # Wins, losses, draws and game lengths of both modes, kept across sessions.
+        self.stats_store = StatsStore(os.path.join(self.user_data_dir, "stats.db"))
+        # Timings of the moves and result checks of both game screens.
+        self.metrics = Metrics()
+        # Only the initial screen is built before the first frame. Each game screen
+        # (and the computer's table) is built the first time it is opened.
+        self.first_screen = None
+        self.second_screen = None
+        self.tablebase = None
+        self.evaluations = None
+        self.evaluator = None
+        self.ultimate_screen = None
+        self.initial_screen = InitialScreen(self.switch_first_screen,self.switch_second_screen,self.switch_ultimate_screen)
         # The root layout that will hold the currently active screen.
         self.root_layout = BoxLayout()
         # Start by showing the initial screen for mode selection.
         self.root_layout.add_widget(self.initial_screen)
         return self.root_layout
+    def on_stop(self):
+        """
+        Called by Kivy when the app closes: writes the buffered game records and
+        statistics to disk and unmaps the table.
+        """
+        self.record_log.close()
+        self.stats_store.close()
+        if self.second_screen is not None and self.tablebase is not None:
+            # Stop a computer move that may still be reading the table.
+            self.second_screen.cancel_computer_move()
+            if self.second_screen.ai_thread is not None:
+                self.second_screen.ai_thread.join()
+            self.tablebase.close()
+    def open_tablebase(self):
+        """
+        Returns the computer's table, memory-mapped from the data folder: the solved 3x3 table
+        (built there on the very first run) or an opening book for the current board size,
+        or None if there is no book for that size.
+        """
+        from tablebase import Tablebase, build_tablebase
+        board_size, win_length = int(self.board_size), int(self.win_length)
+        if (board_size, win_length) == (3, 3):
+            tablebase_path = os.path.join(self.user_data_dir, "tictactoe.tb")
+            if not os.path.exists(tablebase_path):
+                build_tablebase(tablebase_path)
+        else:
+            tablebase_path = os.path.join(self.user_data_dir, f"opening_{board_size}x{board_size}_{win_length}.tb")
+        return Tablebase(tablebase_path) if os.path.exists(tablebase_path) else None
+    def open_evaluator(self):
+        """
+        Returns the learned evaluation function of the computer's levels for the current
+        board size, from a weight file of training.py in the data folder
+        (evaluator_<size>x<size>_<win length>.json), or None to use the built-in one.
+        """
+        from evaluator import load_evaluator
+        board_size, win_length = int(self.board_size), int(self.win_length)
+        evaluator_path = os.path.join(self.user_data_dir, f"evaluator_{board_size}x{board_size}_{win_length}.json")
+        return load_evaluator(evaluator_path) if os.path.exists(evaluator_path) else None
     def switch_first_screen(self,instance=None):
-        """Clears the root layout and adds the Player vs. Player screen (FirstScreen)."""
+        """Clears the root layout and adds the Player vs. Player screen (FirstScreen), building it on first use."""
+        if self.first_screen is None:
+            # Pass the necessary screen-switching methods as callbacks.
+            self.first_screen = FirstScreen(self.switch_second_screen,self.switch_back_initial_screen,
+                                            board_size=int(self.board_size), win_length=int(self.win_length),
+                                            record_log=self.record_log, stats_store=self.stats_store,
+                                            hints=self.hints, metrics=self.metrics, show_stats=self.show_stats)
         self.root_layout.clear_widgets()
         self.root_layout.add_widget(self.first_screen)
     def switch_second_screen(self,instance=None):
-        """Clears the root layout and adds the Player vs. Computer screen (SecondScreen)."""
+        """Clears the root layout and adds the Player vs. Computer screen (SecondScreen), building it on first use."""
+        if self.second_screen is None:
+            from difficulty import EvaluationCache
+            self.tablebase = self.open_tablebase()
+            # Evaluations of the computer's levels, kept for the rest of the session.
+            self.evaluations = EvaluationCache()
+            self.evaluator = self.open_evaluator()
+            self.second_screen = SecondScreen(self.switch_first_screen,self.switch_back_initial_screen,
+                                              board_size=int(self.board_size), win_length=int(self.win_length),
+                                              record_log=self.record_log, tablebase=self.tablebase,
+                                              stats_store=self.stats_store, difficulty=self.difficulty,
+                                              evaluations=self.evaluations, hints=self.hints, seed=self.seed,
+                                              evaluator=self.evaluator,
+                                              metrics=self.metrics, show_stats=self.show_stats)
         self.root_layout.clear_widgets()
         self.root_layout.add_widget(self.second_screen)
+    def switch_ultimate_screen(self,instance=None):
+        """Clears the root layout and adds the Ultimate screen (UltimateScreen), building it on first use."""
+        if self.ultimate_screen is None:
+            self.ultimate_screen = UltimateScreen(self.switch_back_initial_screen,
+                                                  metrics=self.metrics, show_stats=self.show_stats,
+                                                  stats_store=self.stats_store)
+        self.root_layout.clear_widgets()
+        self.root_layout.add_widget(self.ultimate_screen)
     def switch_back_initial_screen(self,instance=None):
         """Clears the root layout and adds the initial mode selection screen (InitialScreen)."""
         self.root_layout.clear_widgets()
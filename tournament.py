@@ -0,0 +1,375 @@
+"""
+Headless round-robin tournament between computer players from
+players.STRATEGIES, without Kivy. Every pair of strategies plays the same
+number of games, half with each colour, spread over every CPU core. The
+results give each strategy an Elo rating with a confidence interval, and the
+mean and 99th percentile of its decision time, to pick the strongest player
+that fits a latency budget.
+
+Ratings are relative to a baseline strategy, rated 0: by default 'heuristic',
+the computer player the game originally shipped with. They are the maximum
+likelihood ratings of the Bradley-Terry model (a draw counts half a win for
+each side) over all the results so far, computed again every time a chunk of
+games arrives, so they do not depend on the order the chunks finish in. Each
+pair also gets one virtual draw, so a strategy that never loses keeps a
+finite rating. The confidence intervals come from the curvature of the
+likelihood at its maximum.
+
+Decision times are measured in the worker processes, which share the
+machine: pass --workers 1 for times as on an idle machine. Each process first
+makes one untimed decision with every strategy it plays, so one-off setup
+(solving the perfect player's table, first calls) is not counted as a move.
+
+Example:
+    python tournament.py --games 200 --output tournament.jsonl
+    python tournament.py --board-size 7 --win-length 5 --field greedy mcts easy medium --budget 50
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+from engine import Board
+from metrics import percentile
+from players import STRATEGIES, make_player
+from seeding import derive_seed
+from simulate import play_game
+
+# Rating differences are computed in natural units and reported in Elo points.
+ELO_SCALE = 400 / math.log(10)
+# Normal quantile of the two-sided 95% confidence intervals.
+Z_95 = 1.96
+
+
+def applicable(name, board_size, win_length):
+    """Returns whether a strategy can play on a board: the perfect player only solves 3x3."""
+    return name != "perfect" or (board_size, win_length) == (3, 3)
+
+
+def timed(player, times):
+    """Returns a player appending the seconds of each of its decisions to 'times'."""
+
+    def move(board):
+        start = time.perf_counter()
+        cell = player(board)
+        times.append(time.perf_counter() - start)
+        return cell
+
+    return move
+
+
+@lru_cache(maxsize=None)
+def warm_up(strategy, board_size, win_length):
+    """
+    Makes one untimed decision on an empty board with a throwaway player of a strategy,
+    once per process and board, so the setup done on first use is not timed with the games.
+    """
+    try:
+        make_player(strategy, 0)(Board(board_size, win_length))
+    except Exception:
+        # A strategy that cannot move is reported by its games.
+        pass
+
+
+def play_pairing_chunk(strategy_a, strategy_b, board_size, win_length, first, games, seed=None):
+    """
+    Plays a batch of games between two strategies in a worker process and returns the
+    counts as a dict, from A's point of view, with the decision times of both strategies.
+    A moves first in even games and B in odd ones.
+    - strategy_a, strategy_b: Names of the two strategies in players.STRATEGIES.
+    - first: The index of the chunk's first game in the pairing.
+    - games: How many games to play.
+    - seed: The seed of the run. With a seed the players are built again for every
+      game, from the pairing and the game's index, so the results do not depend on
+      the chunks; a game raising an error is counted in "failed" instead of stopping the run.
+    """
+    warm_up(strategy_a, board_size, win_length)
+    warm_up(strategy_b, board_size, win_length)
+    times = {"a": [], "b": []}
+    if seed is None:
+        player_a = timed(make_player(strategy_a), times["a"])
+        player_b = timed(make_player(strategy_b), times["b"])
+    board = Board(board_size, win_length)
+    wins = draws = losses = 0
+    failed = []
+    for game in range(first, first + games):
+        if seed is not None:
+            player_a = timed(make_player(strategy_a, derive_seed(seed, strategy_a, strategy_b, game, "a")), times["a"])
+            player_b = timed(make_player(strategy_b, derive_seed(seed, strategy_a, strategy_b, game, "b")), times["b"])
+        a_index = game % 2
+        players = (player_a, player_b) if a_index == 0 else (player_b, player_a)
+        try:
+            winner = play_game(board, players)
+        except Exception:
+            if seed is None:
+                raise
+            failed.append(game)
+            continue
+        if winner is None:
+            draws += 1
+        elif winner == a_index:
+            wins += 1
+        else:
+            losses += 1
+    return {"a": strategy_a, "b": strategy_b, "first": first, "games": games - len(failed),
+            "wins": wins, "draws": draws, "losses": losses, "failed": failed,
+            "times_a": times["a"], "times_b": times["b"]}
+
+
+def solve(matrix, vector):
+    """Returns x with matrix @ x = vector, by Gauss-Jordan elimination (matrix is small and invertible)."""
+    size = len(vector)
+    rows = [list(row) + [value] for row, value in zip(matrix, vector)]
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda row: abs(rows[row][column]))
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        scale = rows[column][column]
+        rows[column] = [value / scale for value in rows[column]]
+        for row in range(size):
+            if row != column and rows[row][column]:
+                factor = rows[row][column]
+                rows[row] = [value - factor * pivot_value for value, pivot_value in zip(rows[row], rows[column])]
+    return [row[-1] for row in rows]
+
+
+class Ratings:
+    """
+    Elo ratings of a field of strategies from the games between them, relative to a baseline.
+    - names: The strategies of the field.
+    - baseline: The strategy rated 0 (the first of the field by default).
+    - prior_draws: Virtual draws added to every pair that has played, keeping ratings finite.
+    """
+
+    def __init__(self, names, baseline=None, prior_draws=1.0):
+        self.names = list(names)
+        self.baseline = self.names.index(baseline if baseline is not None else self.names[0])
+        self.prior_draws = prior_draws
+        size = len(self.names)
+        # games[i][j] and score[i][j]: games between i and j, and the points i scored in them.
+        self.games = [[0.0] * size for _ in range(size)]
+        self.score = [[0.0] * size for _ in range(size)]
+
+    def add(self, a, b, wins, draws, losses):
+        """Counts results of strategy a against strategy b, from a's point of view."""
+        i, j = self.names.index(a), self.names.index(b)
+        games = wins + draws + losses
+        self.games[i][j] += games
+        self.games[j][i] += games
+        self.score[i][j] += wins + draws / 2
+        self.score[j][i] += losses + draws / 2
+
+    def connected(self):
+        """Returns the indexes of the strategies linked to the baseline by games played, the baseline first."""
+        reached = [self.baseline]
+        for i in reached:
+            for j, games in enumerate(self.games[i]):
+                if games and j not in reached:
+                    reached.append(j)
+        return reached
+
+    def derivatives(self, ratings, rated):
+        """
+        Returns the gradient of the log-likelihood at 'ratings' and its information matrix
+        (the negated Hessian), over the strategies 'rated', with the virtual draws added.
+        """
+        gradient = [0.0] * len(rated)
+        information = [[0.0] * len(rated) for _ in rated]
+        for (k, i), (l, j) in itertools.combinations(enumerate(rated), 2):
+            if not self.games[i][j]:
+                continue
+            games = self.games[i][j] + self.prior_draws
+            score = self.score[i][j] + self.prior_draws / 2
+            expected = 1 / (1 + math.exp(ratings[l] - ratings[k]))
+            gradient[k] += score - games * expected
+            gradient[l] -= score - games * expected
+            curvature = games * expected * (1 - expected)
+            information[k][k] += curvature
+            information[l][l] += curvature
+            information[k][l] -= curvature
+            information[l][k] -= curvature
+        return gradient, information
+
+    def solve(self, iterations=50):
+        """
+        Returns {name: (elo, margin)}: each rating and the half-width of its 95% confidence
+        interval, both in Elo points (the baseline's margin is 0). Strategies not linked to
+        the baseline by games yet get (None, None). Ratings are found by Newton's method on
+        the log-likelihood, with the baseline held at 0.
+        """
+        rated = self.connected()
+        ratings = [0.0] * len(rated)
+        for _ in range(iterations):
+            if len(rated) == 1:
+                break
+            gradient, information = self.derivatives(ratings, rated)
+            # Row and column 0 (the baseline) are left out, holding its rating at 0.
+            step = solve([row[1:] for row in information[1:]], gradient[1:])
+            for k, delta in enumerate(step, 1):
+                ratings[k] += delta
+            if max(abs(delta) for delta in step) < 1e-9:
+                break
+        result = dict.fromkeys(self.names, (None, None))
+        result[self.names[self.baseline]] = (0.0, 0.0)
+        if len(rated) > 1:
+            _, information = self.derivatives(ratings, rated)
+            reduced = [row[1:] for row in information[1:]]
+            for k in range(1, len(rated)):
+                # The variance of a rating is a diagonal entry of the inverse information matrix.
+                unit = [1.0 if index == k - 1 else 0.0 for index in range(len(rated) - 1)]
+                variance = solve(reduced, unit)[k - 1]
+                result[self.names[rated[k]]] = (round(ratings[k] * ELO_SCALE, 1),
+                                                round(Z_95 * math.sqrt(variance) * ELO_SCALE, 1))
+        return result
+
+
+def latency(times):
+    """Returns (mean, p99) of a list of decision times in milliseconds, or (None, None) if empty."""
+    if not times:
+        return None, None
+    ordered = sorted(times)
+    return round(sum(ordered) / len(ordered) * 1000, 3), round(percentile(ordered, 0.99) * 1000, 3)
+
+
+def standings(ratings, times, points, played):
+    """
+    Returns the field as a list of dicts, strongest first: rating, margin, games,
+    score (fraction of the points) and the mean and p99 decision time in milliseconds.
+    """
+    rows = []
+    for name, (elo, margin) in ratings.solve().items():
+        mean_ms, p99_ms = latency(times[name])
+        rows.append({"strategy": name, "elo": elo, "margin": margin, "games": played[name],
+                     "score": round(points[name] / played[name], 3) if played[name] else None,
+                     "mean_ms": mean_ms, "p99_ms": p99_ms})
+    # Strategies without a rating yet come last.
+    rows.sort(key=lambda row: -math.inf if row["elo"] is None else row["elo"], reverse=True)
+    return rows
+
+
+def strongest_within(rows, budget_ms):
+    """Returns the strongest strategy of the standings whose p99 decision time fits the budget, or None."""
+    for row in rows:
+        if row["p99_ms"] is not None and row["p99_ms"] <= budget_ms:
+            return row["strategy"]
+    return None
+
+
+def run(field, games, output, board_size=3, win_length=3, workers=None, chunk_size=50,
+        seed=None, baseline="heuristic", on_update=None):
+    """
+    Plays a round robin between the strategies of 'field' over a pool of worker processes:
+    'games' games per pair, half with each colour. Every finished chunk is written to
+    'output' as one JSON line as soon as it arrives, followed by a summary line with the
+    final standings. Returns the summary dict.
+    - output: A text file object opened for writing.
+    - workers: Number of worker processes (defaults to every CPU core).
+    - chunk_size: Number of games of a pair handed to a worker at a time.
+    - seed: The seed making every game reproducible (see play_pairing_chunk), or None.
+    - baseline: The strategy rated 0, if in the field (else the first one).
+    - on_update: Called with the standings (see standings()) after every chunk, if given.
+    """
+    field = list(field)
+    ratings = Ratings(field, baseline if baseline in field else None)
+    times = {name: [] for name in field}
+    points = dict.fromkeys(field, 0.0)
+    played = dict.fromkeys(field, 0)
+    failed = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [
+            executor.submit(play_pairing_chunk, a, b, board_size, win_length,
+                            first, min(chunk_size, games - first), seed)
+            for a, b in itertools.combinations(field, 2)
+            for first in range(0, games, chunk_size)
+        ]
+        for future in as_completed(futures):
+            counts = future.result()
+            a, b = counts["a"], counts["b"]
+            ratings.add(a, b, counts["wins"], counts["draws"], counts["losses"])
+            times[a].extend(counts.pop("times_a"))
+            times[b].extend(counts.pop("times_b"))
+            points[a] += counts["wins"] + counts["draws"] / 2
+            points[b] += counts["losses"] + counts["draws"] / 2
+            played[a] += counts["games"]
+            played[b] += counts["games"]
+            failed.extend((a, b, game) for game in counts["failed"])
+            output.write(json.dumps({"board_size": board_size, "win_length": win_length, **counts}) + "\n")
+            output.flush()
+            if on_update is not None:
+                on_update(standings(ratings, times, points, played))
+    summary = {
+        "summary": True,
+        "board_size": board_size,
+        "win_length": win_length,
+        "games_per_pair": games,
+        "baseline": ratings.names[ratings.baseline],
+        "standings": standings(ratings, times, points, played),
+        "elapsed": round(time.perf_counter() - start, 3),
+    }
+    if seed is not None:
+        summary["seed"] = seed
+        summary["failed"] = [list(game) for game in failed]
+    output.write(json.dumps(summary) + "\n")
+    output.flush()
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rate computer players in a headless round-robin tournament.")
+    parser.add_argument("--field", nargs="+", choices=sorted(STRATEGIES), default=None,
+                        help="strategies taking part (default: all that can play on the board)")
+    parser.add_argument("--games", type=int, default=100, help="games per pair of strategies")
+    parser.add_argument("--output", default="-", help="JSONL file to append results to ('-' for stdout)")
+    parser.add_argument("--board-size", type=int, default=3, help="rows and columns of the board")
+    parser.add_argument("--win-length", type=int, default=3, help="marks in a row needed to win")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=50, help="games of a pair per worker task")
+    parser.add_argument("--seed", type=int, default=None, help="seed making every game reproducible")
+    parser.add_argument("--baseline", default="heuristic", help="strategy rated 0")
+    parser.add_argument("--budget", type=float, default=None, metavar="MS",
+                        help="also report the strongest strategy whose p99 decision time fits MS milliseconds")
+    args = parser.parse_args(argv)
+    field = args.field or [name for name in STRATEGIES if applicable(name, args.board_size, args.win_length)]
+    unfit = [name for name in field if not applicable(name, args.board_size, args.win_length)]
+    if unfit:
+        parser.error(f"{', '.join(unfit)} cannot play on a {args.board_size}x{args.board_size} board")
+    if len(field) < 2:
+        parser.error("the field needs at least two strategies")
+
+    def progress(rows):
+        leaders = ", ".join(f"{row['strategy']} {row['elo']:+.0f}" for row in rows[:3] if row["elo"] is not None)
+        print(f"{sum(row['games'] for row in rows) // 2} games: {leaders}", file=sys.stderr)
+
+    output = sys.stdout if args.output == "-" else open(args.output, "a")
+    try:
+        summary = run(field, args.games, output, args.board_size, args.win_length, args.workers,
+                      args.chunk_size, args.seed, args.baseline, progress)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    def shown(value, spec):
+        # A strategy whose games all failed has no rating, score or times.
+        return "-" if value is None else format(value, spec)
+
+    print(f"{'strategy':<12}{'elo':>8}{'95% ci':>10}{'games':>8}{'score':>8}{'mean ms':>10}{'p99 ms':>10}",
+          file=sys.stderr)
+    for row in summary["standings"]:
+        margin = "" if row["margin"] is None else f"±{row['margin']:.0f}"
+        print(f"{row['strategy']:<12}{shown(row['elo'], '+.0f'):>8}{margin:>10}{row['games']:>8}"
+              f"{shown(row['score'], '.3f'):>8}{shown(row['mean_ms'], '.3f'):>10}{shown(row['p99_ms'], '.3f'):>10}",
+              file=sys.stderr)
+    if args.budget is not None:
+        best = strongest_within(summary["standings"], args.budget)
+        print(f"strongest within {args.budget:g} ms (p99): {best or 'none'}", file=sys.stderr)
+    if summary.get("failed"):
+        print(f"{len(summary['failed'])} games failed, e.g. {summary['failed'][0]}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
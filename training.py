@@ -0,0 +1,274 @@
+"""
+Training pipeline of the learned evaluation function (evaluator.py) for the
+difficulty levels on large boards. CPU only, on NumPy, without Kivy.
+
+1. Positions: self-play games between greedy players (players.greedy_move)
+   that play a random move now and then, so the positions are varied. Each
+   game is seeded from the run's seed and its index (see seeding.py), and a
+   fraction of its positions is kept.
+2. Labels: every kept position is searched by MCTS with a fixed playout
+   budget, and labelled with the win rate of its best move for the player to
+   move, mapped from [0, 1] to [-1, 1].
+3. Training: the labelled positions arrive as a stream, are shuffled through
+   a bounded buffer and cut into mini-batches, each used once for a step of
+   Adam on the mean squared error. Memory stays bounded whatever the number
+   of games; more games mean more steps, not more memory.
+
+Games are played and labelled by a pool of worker processes, with a bounded
+number of chunks in flight, and the stream is in game order whatever the
+number of workers, so a run is reproducible from its seed. The trained
+weights are exported as JSON for evaluator.load_evaluator.
+
+Usage: python training.py --board-size 7 --win-length 5 --games 2000 --workers 4 \\
+           --output evaluator_7x7_5.json
+    (copy the file to the app's data folder to use it against the computer)
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from engine import Board
+from evaluator import FORMAT_VERSION, feature_count, features
+from mcts import MCTS
+from players import greedy_move
+from seeding import derive_seed
+
+
+def game_positions(size, win_length, seed, game, epsilon=0.3, sample_rate=0.25):
+    """
+    Plays one self-play game and yields the board at each kept position (not over).
+    The same board is played on after each yield, so use it before asking for the next.
+    - seed, game: The seed of the run and the index of the game.
+    - epsilon: The probability of playing a random move instead of the greedy one.
+    - sample_rate: The probability of keeping a position.
+    """
+    rng = random.Random(derive_seed(seed, game, "play"))
+    board = Board(size, win_length)
+    while not board.is_over():
+        if board.moves and rng.random() < sample_rate:
+            yield board
+        if rng.random() < epsilon:
+            board.play(rng.choice(board.legal_moves()))
+        else:
+            board.play(greedy_move(board))
+
+
+def label_chunk(size, win_length, seed, first, games, playouts=256, epsilon=0.3, sample_rate=0.25):
+    """
+    Plays and labels a batch of games in a worker process.
+    Returns (features, labels): a (P, F) float32 array and a (P,) float32 array.
+    - first, games: The index of the first game and the number of games.
+    - playouts: The MCTS budget per position.
+    """
+    rows = []
+    labels = []
+    for game in range(first, first + games):
+        # One search per game, so its tree is reused from one position to the next.
+        mcts = MCTS(time_limit=None, playouts=playouts, rng=random.Random(derive_seed(seed, game, "label")))
+        for board in game_positions(size, win_length, seed, game, epsilon, sample_rate):
+            mcts.choose(board)
+            rows.append(features(board))
+            labels.append(2 * mcts.root_value() - 1)
+    return (np.array(rows, dtype=np.float32).reshape(-1, feature_count(win_length)),
+            np.array(labels, dtype=np.float32))
+
+
+def labelled_positions(size, win_length, games, workers=1, chunk_size=16, seed=0,
+                       playouts=256, epsilon=0.3, sample_rate=0.25):
+    """
+    Yields (features, label) for the kept positions of 'games' self-play games, in game order.
+    Chunks of games are labelled lazily: at most 2 * workers chunks are held at any time.
+    - workers: Number of worker processes; 1 labels in this process, None uses every CPU core.
+    - chunk_size: Games handed to a worker at a time.
+    The other arguments are those of label_chunk.
+    """
+    workers = workers or os.cpu_count()
+    settings = (playouts, epsilon, sample_rate)
+    chunks = ((first, min(chunk_size, games - first)) for first in range(0, games, chunk_size))
+    if workers == 1:
+        for first, count in chunks:
+            yield from zip(*label_chunk(size, win_length, seed, first, count, *settings))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        while True:
+            # Keep every worker busy with one chunk and one more queued, no more.
+            for first, count in itertools.islice(chunks, 2 * workers - len(pending)):
+                pending.append(executor.submit(label_chunk, size, win_length, seed, first, count, *settings))
+            if not pending:
+                return
+            yield from zip(*pending.popleft().result())
+
+
+def batches(samples, batch_size=256, buffer_size=4096, seed=0):
+    """
+    Yields (X, y) mini-batches from a stream of (features, label), shuffled through a
+    buffer of at most 'buffer_size' samples: each new sample takes the place of a
+    random one of the buffer, which goes to the current batch.
+    - samples: An iterable of (features, label), e.g. labelled_positions().
+    """
+    rng = random.Random(seed)
+    buffer = []
+    batch = []
+    for sample in samples:
+        if len(buffer) < buffer_size:
+            buffer.append(sample)
+            continue
+        index = rng.randrange(buffer_size)
+        batch.append(buffer[index])
+        buffer[index] = sample
+        if len(batch) == batch_size:
+            yield stack(batch)
+            batch = []
+    # The stream is over: empty the buffer in random order.
+    rng.shuffle(buffer)
+    batch.extend(buffer)
+    for start in range(0, len(batch), batch_size):
+        yield stack(batch[start:start + batch_size])
+
+
+def stack(samples):
+    """Returns a list of (features, label) as an (X, y) pair of float arrays."""
+    return (np.array([sample[0] for sample in samples], dtype=np.float64),
+            np.array([sample[1] for sample in samples], dtype=np.float64))
+
+
+class MLP:
+    """
+    A multilayer perceptron with tanh on every layer, the output one included,
+    trained with Adam on the mean squared error. The same model as evaluator.LearnedEvaluator.
+    - inputs: The number of features.
+    - hidden: The sizes of the hidden layers; () for a linear model.
+    - learning_rate: The step size of Adam.
+    - seed: The seed of the initial weights.
+    """
+
+    def __init__(self, inputs, hidden=(16,), learning_rate=0.01, seed=0):
+        rng = np.random.default_rng(seed)
+        sizes = [inputs, *hidden, 1]
+        # weights[i] is (outputs, inputs), as in the weight files.
+        self.weights = [rng.normal(0, 1 / np.sqrt(fan_in), (fan_out, fan_in))
+                        for fan_in, fan_out in zip(sizes, sizes[1:])]
+        self.biases = [np.zeros(fan_out) for fan_out in sizes[1:]]
+        self.learning_rate = learning_rate
+        # Adam's moment estimates of every parameter, and the number of steps taken.
+        self.moments = [np.zeros_like(param) for param in self.weights + self.biases]
+        self.squares = [np.zeros_like(param) for param in self.weights + self.biases]
+        self.steps = 0
+
+    def forward(self, x):
+        """Returns the activations of every layer for a batch, the inputs first."""
+        activations = [x]
+        for weights, biases in zip(self.weights, self.biases):
+            activations.append(np.tanh(activations[-1] @ weights.T + biases))
+        return activations
+
+    def predict(self, x):
+        """Returns the model's output, between -1 and 1, for each row of a batch."""
+        return self.forward(x)[-1][:, 0]
+
+    def step(self, x, y):
+        """Takes one step of Adam on a batch and returns its mean squared error before the step."""
+        activations = self.forward(x)
+        error = activations[-1][:, 0] - y
+        # Gradient of the loss with respect to the output, then back through every layer.
+        grad = (2 * error / len(y))[:, None]
+        weight_grads = []
+        bias_grads = []
+        for layer in reversed(range(len(self.weights))):
+            grad = grad * (1 - activations[layer + 1] ** 2)
+            weight_grads.append(grad.T @ activations[layer])
+            bias_grads.append(grad.sum(axis=0))
+            grad = grad @ self.weights[layer]
+        grads = weight_grads[::-1] + bias_grads[::-1]
+        self.steps += 1
+        beta1, beta2 = 0.9, 0.999
+        for param, grad, moment, square in zip(self.weights + self.biases, grads, self.moments, self.squares):
+            moment *= beta1
+            moment += (1 - beta1) * grad
+            square *= beta2
+            square += (1 - beta2) * grad ** 2
+            corrected = moment / (1 - beta1 ** self.steps)
+            param -= self.learning_rate * corrected / (np.sqrt(square / (1 - beta2 ** self.steps)) + 1e-8)
+        return float(np.mean(error ** 2))
+
+
+def train(batch_stream, model, validation_batches=4, report=None):
+    """
+    Trains a model on a stream of mini-batches, using each one once.
+    The first 'validation_batches' batches are kept aside and never trained on.
+    Returns {"batches", "samples", "validation_mse", "baseline_mse"}, where the baseline
+    is the error of always predicting 0 on the same held-out positions.
+    - batch_stream: An iterable of (X, y), e.g. batches().
+    - model: The MLP to train.
+    - report: Called with (batch number, loss) after every step, if given.
+    """
+    batch_stream = iter(batch_stream)
+    held_out = list(itertools.islice(batch_stream, validation_batches))
+    count = samples = 0
+    for x, y in batch_stream:
+        loss = model.step(x, y)
+        count += 1
+        samples += len(y)
+        if report is not None:
+            report(count, loss)
+    result = {"batches": count, "samples": samples, "validation_mse": None, "baseline_mse": None}
+    if held_out:
+        x = np.concatenate([batch[0] for batch in held_out])
+        y = np.concatenate([batch[1] for batch in held_out])
+        result["validation_mse"] = round(float(np.mean((model.predict(x) - y) ** 2)), 5)
+        result["baseline_mse"] = round(float(np.mean(y ** 2)), 5)
+    return result
+
+
+def export_weights(model, size, win_length, path):
+    """Writes a trained model as a weight file for evaluator.load_evaluator."""
+    weights = {
+        "version": FORMAT_VERSION,
+        "size": size,
+        "win_length": win_length,
+        "layers": [{"weights": weights.tolist(), "biases": biases.tolist()}
+                   for weights, biases in zip(model.weights, model.biases)],
+    }
+    with open(path, "w") as file:
+        json.dump(weights, file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train an evaluation function on labelled self-play positions.")
+    parser.add_argument("--board-size", type=int, default=7, help="rows and columns of the board")
+    parser.add_argument("--win-length", type=int, default=5, help="marks in a row needed to win")
+    parser.add_argument("--games", type=int, default=1000, help="self-play games to learn from")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (0 for all cores)")
+    parser.add_argument("--chunk-size", type=int, default=16, help="games per worker task")
+    parser.add_argument("--playouts", type=int, default=256, help="MCTS playouts labelling each position")
+    parser.add_argument("--hidden", type=int, nargs="*", default=[16], help="hidden layer sizes (none: linear)")
+    parser.add_argument("--batch-size", type=int, default=256, help="positions per training step")
+    parser.add_argument("--buffer-size", type=int, default=4096, help="positions held by the shuffle buffer")
+    parser.add_argument("--learning-rate", type=float, default=0.01, help="step size of Adam")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the games, labels and weights")
+    parser.add_argument("--output", required=True, help="weight file to write")
+    args = parser.parse_args(argv)
+    samples = labelled_positions(args.board_size, args.win_length, args.games, args.workers or None,
+                                 args.chunk_size, args.seed, args.playouts)
+    model = MLP(feature_count(args.win_length), tuple(args.hidden), args.learning_rate, args.seed)
+
+    def report(count, loss):
+        if count % 50 == 0:
+            print(f"batch {count}: loss {loss:.4f}", file=sys.stderr)
+
+    result = train(batches(samples, args.batch_size, args.buffer_size, args.seed), model, report=report)
+    export_weights(model, args.board_size, args.win_length, args.output)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
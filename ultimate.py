@@ -0,0 +1,198 @@
+"""
+Headless rules of ultimate tic-tac-toe, with no Kivy dependency.
+The 9x9 board is made of nine 3x3 sub-boards, and the sub-boards form a 3x3
+meta-board: winning a sub-board (with the classic lines of engine.WIN_MASKS)
+takes its square of the meta-board, and three won sub-boards in a line win the
+game. A move in cell c of a sub-board sends the opponent to sub-board c; if
+that one is already won or full, the opponent may play in any open sub-board.
+The game is drawn when every sub-board is won or full without a meta line.
+
+Cells are numbered row by row on the whole 9x9 board (0 to 80), like the cells
+of an engine.Board of size 9. Each player's marks are stored as nine 9-bit
+sub-board sets, so a sub-board is checked with one lookup in a 512-entry
+table, and the meta-board is two more 9-bit sets updated only when a
+sub-board is decided. UltimateBoard has the interface mcts.MCTS searches on.
+"""
+
+from engine import PLAYER1, WIN_MASKS
+
+# Seconds of Monte Carlo search per computer move. The search overshoots its
+# limit by one clock interval and the odd garbage collection, which keeps
+# every move under 100 ms.
+MOVE_TIME_LIMIT = 0.07
+# All nine cells of a sub-board, or all nine sub-boards.
+ALL_NINE = (1 << 9) - 1
+# WINS[bits] is True when a set of cells of a 3x3 board holds one of its lines.
+WINS = [any(bits & mask == mask for mask in WIN_MASKS) for bits in range(ALL_NINE + 1)]
+# FREE_CELLS[taken] lists the cells of a 3x3 board that are not in 'taken'.
+FREE_CELLS = [[cell for cell in range(9) if not taken >> cell & 1] for taken in range(ALL_NINE + 1)]
+# The sub-board and the cell within it of every cell of the 9x9 board, and back.
+SUB_BOARD = [(cell // 27) * 3 + cell % 9 // 3 for cell in range(81)]
+LOCAL_CELL = [(cell // 9 % 3) * 3 + cell % 3 for cell in range(81)]
+GLOBAL_CELL = [[(sub // 3 * 3 + local // 3) * 9 + sub % 3 * 3 + local % 3 for local in range(9)] for sub in range(9)]
+
+
+class UltimateBoard:
+    """
+    The state of one ultimate game. Moves are applied with play() and taken back
+    with undo(); both update one sub-board and, when it is decided, the meta-board.
+    """
+    __slots__ = ("bits", "meta", "closed", "forced", "turn", "moves", "history", "winner", "win_mask")
+    # Shape of the board, as for an engine.Board.
+    size = 9
+    win_length = 3
+
+    def __init__(self, turn=PLAYER1):
+        self.reset(turn)
+
+    def reset(self, turn=PLAYER1):
+        """
+        Clears the board for a new game.
+        - turn: The index of the player who moves first.
+        """
+        # bits[player][sub] is the set of cells the player owns in a sub-board.
+        self.bits = [[0] * 9, [0] * 9]
+        # The sub-boards won by each player, and those won or full (where nobody can play).
+        self.meta = [0, 0]
+        self.closed = 0
+        # The sub-board the next move must be played in, or None for any open one.
+        self.forced = None
+        self.turn = turn
+        # The cells played so far, and the value of 'forced' before each of them. Needed by undo().
+        self.moves = []
+        self.history = []
+        # Index of the winning player and the sub-boards of their meta line, once decided.
+        self.winner = None
+        self.win_mask = 0
+
+    def copy(self):
+        """Returns an independent copy of the board, e.g. to search on another thread."""
+        board = UltimateBoard.__new__(UltimateBoard)
+        board.bits = [list(self.bits[0]), list(self.bits[1])]
+        board.meta = list(self.meta)
+        board.closed = self.closed
+        board.forced = self.forced
+        board.turn = self.turn
+        board.moves = list(self.moves)
+        board.history = list(self.history)
+        board.winner = self.winner
+        board.win_mask = self.win_mask
+        return board
+
+    def is_free(self, cell):
+        """Returns True if no player has taken the given cell yet."""
+        sub = SUB_BOARD[cell]
+        return not (self.bits[0][sub] | self.bits[1][sub]) >> LOCAL_CELL[cell] & 1
+
+    def open_sub_boards(self):
+        """Returns the sub-boards the player to move may play in."""
+        if self.winner is not None:
+            return []
+        if self.forced is not None:
+            return [self.forced]
+        return FREE_CELLS[self.closed]
+
+    def legal_moves(self):
+        """Returns the cells the player to move may play, or an empty list once the game is over."""
+        bits0, bits1 = self.bits
+        return [GLOBAL_CELL[sub][local] for sub in self.open_sub_boards()
+                for local in FREE_CELLS[bits0[sub] | bits1[sub]]]
+
+    def is_legal(self, cell):
+        """Returns True if the player to move may play the given cell."""
+        return self.is_free(cell) and SUB_BOARD[cell] in self.open_sub_boards()
+
+    def play(self, cell):
+        """
+        Places the current player's mark on a cell and passes the turn.
+        The caller is responsible for checking the move is legal.
+        - cell: The cell index, row * 9 + column.
+        """
+        player = self.turn
+        sub = SUB_BOARD[cell]
+        local = LOCAL_CELL[cell]
+        self.history.append(self.forced)
+        self.moves.append(cell)
+        mine = self.bits[player][sub] | 1 << local
+        self.bits[player][sub] = mine
+        # Only the sub-board played in can change, and the meta-board only when it is decided.
+        if WINS[mine]:
+            self.closed |= 1 << sub
+            meta = self.meta[player] | 1 << sub
+            self.meta[player] = meta
+            if WINS[meta]:
+                self.winner = player
+                self.win_mask = next(mask for mask in WIN_MASKS if meta & mask == mask and mask >> sub & 1)
+        elif mine | self.bits[player ^ 1][sub] == ALL_NINE:
+            self.closed |= 1 << sub
+        # The opponent plays in the sub-board matching this cell, unless it is closed.
+        self.forced = None if self.closed >> local & 1 else local
+        self.turn = player ^ 1
+
+    def undo(self):
+        """Takes back the last move and returns its cell index."""
+        cell = self.moves.pop()
+        self.turn ^= 1
+        sub = SUB_BOARD[cell]
+        # The sub-board was open before this move, so any result in it came from this move.
+        self.bits[self.turn][sub] ^= 1 << LOCAL_CELL[cell]
+        self.meta[self.turn] &= ~(1 << sub)
+        self.closed &= ~(1 << sub)
+        self.forced = self.history.pop()
+        self.winner = None
+        self.win_mask = 0
+        return cell
+
+    def playout(self, rng):
+        """
+        Plays uniformly random legal moves to the end of the game and returns the
+        winner's player index, or None for a draw. Used by Monte Carlo search.
+        The moves are played on local copies of the sets, so the board itself is left unchanged.
+        - rng: A random.Random instance.
+        """
+        if self.winner is not None:
+            return self.winner
+        bits = [list(self.bits[0]), list(self.bits[1])]
+        meta = list(self.meta)
+        closed = self.closed
+        forced = self.forced
+        player = self.turn
+        choice = rng.choice
+        while closed != ALL_NINE:
+            if forced is None:
+                sub, local = choice([(sub, local) for sub in FREE_CELLS[closed]
+                                     for local in FREE_CELLS[bits[0][sub] | bits[1][sub]]])
+            else:
+                sub = forced
+                local = choice(FREE_CELLS[bits[0][sub] | bits[1][sub]])
+            mine = bits[player][sub] | 1 << local
+            bits[player][sub] = mine
+            if WINS[mine]:
+                closed |= 1 << sub
+                meta[player] |= 1 << sub
+                if WINS[meta[player]]:
+                    return player
+            elif mine | bits[player ^ 1][sub] == ALL_NINE:
+                closed |= 1 << sub
+            forced = None if closed >> local & 1 else local
+            player ^= 1
+        return None
+
+    def is_full(self):
+        """Returns True if every sub-board is won or full, so nobody can move."""
+        return self.closed == ALL_NINE
+
+    def is_draw(self):
+        """Returns True if nobody can move and nobody has won."""
+        return self.winner is None and self.is_full()
+
+    def is_over(self):
+        """Returns True if the game has been won or drawn."""
+        return self.winner is not None or self.is_full()
+
+    def sub_board_winner(self, sub):
+        """Returns the index of the player who won a sub-board, or None."""
+        for player in (0, 1):
+            if self.meta[player] >> sub & 1:
+                return player
+        return None
@@ -0,0 +1,69 @@
+"""
+Batched evaluation of many positions at once with NumPy, for analysis and training.
+A batch is an (M, N*N) int8 array with one board per row, using the same cell
+indexing as engine.Board: 0 for an empty cell, 1 for PLAYER1 ('x') and
+2 for PLAYER2 ('o'). The winning lines are the ones from engine.geometry,
+which on the 3x3 board are exactly engine.WIN_CASES.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from engine import cells_of, geometry
+
+# Value of a cell in a batch row: empty, or the player index + 1.
+EMPTY = 0
+
+
+@lru_cache(maxsize=None)
+def line_indices(size=3, win_length=3):
+    """
+    Returns the winning lines of a board size as an (L, K) array of cell indices.
+    The array is cached and shared, so callers must not modify it.
+    - size, win_length: The board to use.
+    """
+    return np.array([cells_of(mask) for mask in geometry(size, win_length).lines], dtype=np.intp)
+
+
+def encode_boards(boards):
+    """
+    Packs engine.Board objects of the same size into an (M, N*N) int8 batch.
+    - boards: A sequence of engine.Board.
+    """
+    cells = boards[0].geometry.cells
+    batch = np.zeros((len(boards), cells), dtype=np.int8)
+    for row, board in enumerate(boards):
+        for player in (0, 1):
+            batch[row, cells_of(board.bits[player])] = player + 1
+    return batch
+
+
+def evaluate_boards(batch, size=3, win_length=3):
+    """
+    Scores every board of a batch in one vectorized pass.
+    Returns (winner, draw, legal):
+    - winner: (M,) int8 array, the index of the player owning a full line, or -1.
+      Positions where both players own a line cannot happen in a real game and
+      are reported as won by PLAYER1.
+    - draw: (M,) bool array, True if the board is full with no winner.
+    - legal: (M, N*N) bool array, True for the empty cells of games still going on.
+    - batch: The (M, N*N) int8 array of boards.
+    - size, win_length: The board the batch uses.
+    """
+    batch = np.asarray(batch, dtype=np.int8)
+    lines = line_indices(size, win_length)
+    if batch.ndim != 2 or batch.shape[1] != size * size:
+        raise ValueError(f"expected an (M, {size * size}) array of boards, got shape {batch.shape}")
+    # (M, L, K) view of every line of every board, then (M, L): does the player fill it?
+    on_lines = batch[:, lines]
+    x_wins = (on_lines == 1).all(axis=2).any(axis=1)
+    o_wins = (on_lines == 2).all(axis=2).any(axis=1)
+    winner = np.full(len(batch), -1, dtype=np.int8)
+    winner[o_wins] = 1
+    winner[x_wins] = 0
+    empty = batch == EMPTY
+    decided = winner >= 0
+    draw = ~decided & ~empty.any(axis=1)
+    legal = empty & ~decided[:, None]
+    return winner, draw, legal